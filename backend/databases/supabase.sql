@@ -139,4 +139,77 @@ VALUES
 (2, 'Family Pasta Feast', 'Package includes: 2 pasta mains, 2 sides, 4 drinks and dessert', 59.99),
 (2, 'Date Night Combo', 'Package includes: 2 premium pasta dishes, 2 glasses of wine, and tiramisu to share', 49.99),
 (2, 'Solo Pasta Delight', 'Package includes: 1 pasta main, 1 side salad, 1 drink', 24.99),
-(2, 'Party Platter Special', 'Package includes: 5 pasta mains, 3 sides, garlic bread, and dessert platter', 119.99);
\ No newline at end of file
+(2, 'Party Platter Special', 'Package includes: 5 pasta mains, 3 sides, garlic bread, and dessert platter', 119.99);
+-- Precomputed coordinates, written by the geo service when an address is created or changed
+alter table public.restaurant
+  add column if not exists latitude double precision null,
+  add column if not exists longitude double precision null,
+  add column if not exists geocoded_address text null,
+  add column if not exists geocoded_at timestamp with time zone null;
+
+alter table public.customer_profiles
+  add column if not exists latitude double precision null,
+  add column if not exists longitude double precision null,
+  add column if not exists geocoded_address text null,
+  add column if not exists geocoded_at timestamp with time zone null;
+
+-- Clear the coordinates whenever the address changes, so the geo service re-geocodes the row
+-- and the read path never uses coordinates that belong to an old address
+create or replace function public.clear_restaurant_coordinates()
+returns trigger as $$
+begin
+  if new.address is distinct from old.address then
+    new.latitude := null;
+    new.longitude := null;
+    new.geocoded_at := null;
+  end if;
+  return new;
+end;
+$$ language plpgsql;
+
+create or replace function public.clear_customer_coordinates()
+returns trigger as $$
+begin
+  if new.street_address is distinct from old.street_address then
+    new.latitude := null;
+    new.longitude := null;
+    new.geocoded_at := null;
+  end if;
+  return new;
+end;
+$$ language plpgsql;
+
+drop trigger if exists restaurant_address_changed on public.restaurant;
+create trigger restaurant_address_changed
+  before update of address on public.restaurant
+  for each row execute function public.clear_restaurant_coordinates();
+
+drop trigger if exists customer_address_changed on public.customer_profiles;
+create trigger customer_address_changed
+  before update of street_address on public.customer_profiles
+  for each row execute function public.clear_customer_coordinates();
+
+-- The geo service used to store the 30 Victoria St fallback point when an address could not be geocoded;
+-- clear those rows (except real 30 Victoria St addresses) so they are geocoded again
+update public.restaurant
+  set latitude = null, longitude = null, geocoded_at = null
+  where latitude = 1.29548985 and longitude = 103.8520116901307
+    and address not ilike '30 Victoria St%';
+
+update public.customer_profiles
+  set latitude = null, longitude = null, geocoded_at = null
+  where latitude = 1.29548985 and longitude = 103.8520116901307
+    and street_address not ilike '30 Victoria St%';
+
+-- One geospatial row per (driver, order) so the geo service can upsert instead of delete + insert
+delete from public.geospatial a
+  using public.geospatial b
+  where a.driver_id = b.driver_id and a.order_id = b.order_id and a.geo_id < b.geo_id;
+
+do $$
+begin
+  if not exists (select 1 from pg_constraint where conname = 'geospatial_driver_order_key') then
+    alter table public.geospatial
+      add constraint geospatial_driver_order_key unique (driver_id, order_id);
+  end if;
+end $$;
@@ -161,13 +161,25 @@ curl -s -X POST http://kong:8001/services/geo/routes \
 curl -s -X POST http://kong:8001/services/geo/routes \
   --data name=geo-nearby-route \
   --data paths=/api/nearby-restaurants \
-  --data strip_path=false > /dev/null
+  --data strip_path=false \
+  --data response_buffering=false > /dev/null
 
 curl -s -X POST http://kong:8001/services/geo/routes \
   --data name=geo-delete-route \
   --data paths=/api/delete-geospatial \
   --data strip_path=false > /dev/null
 
+# Capacity Ledger Service
+echo "Setting up Capacity Ledger Service..."
+curl -s -X POST http://kong:8001/services \
+  --data name=capacity-ledger \
+  --data url=http://capacity-ledger-service:5000 > /dev/null
+
+curl -s -X POST http://kong:8001/services/capacity-ledger/routes \
+  --data name=capacity-ledger-route \
+  --data paths=/api/capacity \
+  --data strip_path=false > /dev/null
+
 
 # Complex Services
 echo "Setting up complex services..."
@@ -261,7 +273,8 @@ curl -s -X POST http://kong:8001/services/dms/routes \
 curl -s -X POST http://kong:8001/services/dms/routes \
   --data name=dms-delivery-management \
   --data paths=/api/delivery-management \
-  --data strip_path=false > /dev/null
+  --data strip_path=false \
+  --data response_buffering=false > /dev/null
 
 
 # Verify all services and routes
@@ -104,6 +104,12 @@ else
   ((failed++))
 fi
 
+if test_health "Capacity Ledger Service" "/api/capacity/health"; then
+  ((passed++))
+else
+  ((failed++))
+fi
+
 echo -e "\n${YELLOW}COMPOSITE SERVICES${NC}"
 echo "------------------------------------------"
 
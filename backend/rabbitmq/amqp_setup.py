@@ -17,6 +17,13 @@ amqp_port = int(os.environ.get('RABBITMQ_PORT', 5672))
 exchange_name = "notification_topic"
 exchange_type = "topic"
 
+# Retry tiers (seconds) for notifications whose SMS failed, shared with notification.py. A message waits in
+# the tier's queue until its TTL expires and is then dead-lettered back to notification_topic with its
+# original routing key. Messages that run out of retries end up in the dead-letter queue
+retry_delays = [int(delay) for delay in os.environ.get('NOTIFICATION_RETRY_DELAYS', '5,20,80').split(',') if delay.strip()]
+dead_exchange_name = "notification_dead"
+dead_queue_name = "Notification_Dead"
+
 
 def create_exchange(hostname, port, exchange_name, exchange_type):
     print(f"Connecting to AMQP broker {hostname}:{port}...")
@@ -55,6 +62,28 @@ def create_queue(channel, exchange_name, queue_name, routing_key):
     )
 
 
+def create_retry_queues(channel, exchange_name, delays):
+    for delay in delays:
+        retry_exchange = f"notification_retry_{delay}s"
+        retry_queue = f"Notification_Retry_{delay}s"
+        print(f"Declare retry tier: {retry_exchange} -> {retry_queue}")
+        channel.exchange_declare(exchange=retry_exchange, exchange_type="fanout", durable=True)
+        channel.queue_declare(
+            queue=retry_queue,
+            durable=True,
+            arguments={
+                "x-message-ttl": delay * 1000,
+                "x-dead-letter-exchange": exchange_name,  # keeps the original routing key
+            },
+        )
+        channel.queue_bind(exchange=retry_exchange, queue=retry_queue)
+
+    print(f"Declare dead-letter queue: {dead_queue_name}")
+    channel.exchange_declare(exchange=dead_exchange_name, exchange_type="fanout", durable=True)
+    channel.queue_declare(queue=dead_queue_name, durable=True)
+    channel.queue_bind(exchange=dead_exchange_name, queue=dead_queue_name)
+
+
 channel = create_exchange(
     hostname=amqp_host,
     port=amqp_port,
@@ -122,4 +151,10 @@ create_queue(
     exchange_name=exchange_name,
     queue_name="Delivery_Order_Delivered",
     routing_key="delivery.order.delivered",
-)
\ No newline at end of file
+)
+
+create_retry_queues(
+    channel=channel,
+    exchange_name=exchange_name,
+    delays=retry_delays,
+)
@@ -0,0 +1,2 @@
+# Code shared by the FeastFinder services. Services that use it are built with backend/services
+# as their docker build context, and their Dockerfile copies this package next to the service.
@@ -0,0 +1,436 @@
+"""
+Long-lived RabbitMQ publisher shared by the composite services.
+
+Instead of a full AMQP handshake per message, each process keeps a small pool of open
+(connection, channel) pairs. A request thread checks one out, publishes and hands it back, so
+pika's non thread-safe connections are never used by two threads at once. Broken connections
+are reopened on the next publish, with jittered backoff while the broker stays unreachable, and
+the exchange is declared once per process rather than before every message.
+
+    from common.amqp_publisher import publish_to_rabbitmq
+
+    publish_to_rabbitmq("reservation.confirmation", {"reservation_id": 1, ...})
+
+With AMQP_PUBLISH_CONFIRMS=1 the process uses ConfirmingPublisher instead: persistent messages on a
+channel in confirm mode, with broker acks tracked asynchronously on an IO thread. With OUTBOX_ENABLED=1
+publish_to_rabbitmq only appends to the local outbox (see outbox.py), whose relay publishes later.
+
+Events (see events.py) and dicts are encoded as EVENT_ENCODING asks, with the matching content_type.
+"""
+
+import atexit
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import pika
+
+from common.events import JSON_CONTENT_TYPE, as_dict, encode_event
+
+RABBITMQ_EXCHANGE = "notification_topic"
+RABBITMQ_EXCHANGE_TYPE = "topic"
+
+def encode(routing_key, message):
+    """Returns (body, content_type). str/bytes bodies are sent as they are (JSON); events and dicts are encoded."""
+    if isinstance(message, (bytes, str)):
+        return message, JSON_CONTENT_TYPE
+    return encode_event(message, routing_key)
+
+
+@lru_cache(maxsize=None)
+def default_properties(content_type=JSON_CONTENT_TYPE, persistent=False):
+    """Properties for a message of content_type, built once per content type."""
+    return pika.BasicProperties(
+        content_type=content_type,
+        delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE if persistent else None,
+    )
+
+
+class BrokerUnavailable(Exception):
+    """The broker could not be reached recently; no new connection is attempted until the backoff expires."""
+
+
+class _Slot:
+    # One pooled connection and its channel, only ever used by the thread that checked it out
+    __slots__ = ("connection", "channel")
+
+    def __init__(self):
+        self.connection = None
+        self.channel = None
+
+
+class AmqpPublisher:
+
+    def __init__(self, host=None, port=None, exchange=RABBITMQ_EXCHANGE, exchange_type=RABBITMQ_EXCHANGE_TYPE,
+                 pool_size=None, checkout_timeout=None):
+        # Settings are read here rather than at import time so a service's load_dotenv() has already run
+        self.parameters = pika.ConnectionParameters(
+            host=host or os.environ.get("RABBITMQ_HOST", "localhost"),
+            port=port or int(os.environ.get("RABBITMQ_PORT", 5672)),
+            heartbeat=60,
+            blocked_connection_timeout=30,
+            connection_attempts=1,
+        )
+        self.exchange = exchange
+        self.exchange_type = exchange_type
+        pool_size = pool_size or int(os.environ.get("AMQP_PUBLISHER_POOL_SIZE", 4))
+        self.checkout_timeout = checkout_timeout or float(os.environ.get("AMQP_PUBLISHER_CHECKOUT_TIMEOUT", 5))
+        self.reconnect_backoff = float(os.environ.get("AMQP_RECONNECT_BACKOFF", 0.5))  # seconds, doubled per failed attempt
+        self.reconnect_backoff_max = float(os.environ.get("AMQP_RECONNECT_BACKOFF_MAX", 30))
+
+        self._available = threading.BoundedSemaphore(pool_size)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._declared = False
+        self._failures = 0
+        self._retry_at = 0.0
+
+    # --- pool -------------------------------------------------------------------------------
+
+    def _checkout(self):
+        if not self._available.acquire(timeout=self.checkout_timeout):
+            return None
+        with self._lock:
+            return self._idle.pop() if self._idle else _Slot()
+
+    def _checkin(self, slot):
+        with self._lock:
+            self._idle.append(slot)
+        self._available.release()
+
+    # --- connection management ---------------------------------------------------------------
+
+    def _close(self, slot):
+        connection, slot.connection, slot.channel = slot.connection, None, None
+        if connection is not None and connection.is_open:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _is_healthy(self, slot):
+        if slot.connection is None or not slot.connection.is_open or not slot.channel.is_open:
+            return False
+        try:
+            # Lets pika answer heartbeats on an idle pooled connection and notice if the broker dropped it
+            slot.connection.process_data_events(0)
+            return True
+        except Exception:
+            return False
+
+    def _connect(self, slot):
+        with self._lock:
+            if time.monotonic() < self._retry_at:
+                raise BrokerUnavailable(f"broker unavailable, next attempt in {self._retry_at - time.monotonic():.1f}s")
+        try:
+            slot.connection = pika.BlockingConnection(self.parameters)
+            slot.channel = slot.connection.channel()
+            self._declare(slot.channel)
+        except Exception:
+            self._close(slot)
+            with self._lock:
+                self._failures += 1
+                backoff = min(self.reconnect_backoff_max, self.reconnect_backoff * 2 ** (self._failures - 1))
+                self._retry_at = time.monotonic() + random.uniform(backoff / 2, backoff)
+            raise
+        with self._lock:
+            self._failures = 0
+            self._retry_at = 0.0
+
+    def _declare(self, channel):
+        # Topology is declared once per process, not before every message
+        if self._declared:
+            return
+        channel.exchange_declare(exchange=self.exchange, exchange_type=self.exchange_type, durable=True)
+        self._declared = True
+
+    # --- publishing ----------------------------------------------------------------------------
+
+    def publish(self, routing_key, message, properties=None):
+        """Publish one message (Event, dict, str or bytes). Returns True on success, False otherwise."""
+        body, content_type = encode(routing_key, message)
+        slot = self._checkout()
+        if slot is None:
+            print(f"Error publishing to RabbitMQ: no channel free within {self.checkout_timeout}s")
+            return False
+        try:
+            # A pooled connection may have died while idle: reconnect and try once more
+            for attempt in range(2):
+                try:
+                    if not self._is_healthy(slot):
+                        self._close(slot)
+                        self._connect(slot)
+                    slot.channel.basic_publish(
+                        exchange=self.exchange,
+                        routing_key=routing_key,
+                        body=body,
+                        properties=properties or default_properties(content_type)
+                    )
+                    return True
+                except BrokerUnavailable as e:
+                    print(f"Error publishing to RabbitMQ: {e}")
+                    return False
+                except Exception as e:
+                    print(f"Error publishing to RabbitMQ (attempt {attempt + 1}): {e}")
+                    self._close(slot)
+            return False
+        finally:
+            self._checkin(slot)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for slot in idle:
+            self._close(slot)
+
+
+class ConfirmingPublisher:
+    """
+    Publishes persistent messages on a channel in confirm mode, without a broker round trip per message.
+
+    One pika SelectConnection runs on a background IO thread. Request threads hand messages to it with
+    add_callback_threadsafe and get a Future back; the IO thread numbers the messages, and each broker
+    ack (often covering many messages at once via the `multiple` flag) resolves every future up to its
+    delivery tag. publish() waits for its own ack at most `confirm_budget` seconds, so a slow broker
+    adds a bounded delay to the request; an ack or nack arriving later is still tracked and logged.
+    """
+
+    def __init__(self, host=None, port=None, exchange=RABBITMQ_EXCHANGE, exchange_type=RABBITMQ_EXCHANGE_TYPE,
+                 confirm_budget=None):
+        self.parameters = pika.ConnectionParameters(
+            host=host or os.environ.get("RABBITMQ_HOST", "localhost"),
+            port=port or int(os.environ.get("RABBITMQ_PORT", 5672)),
+            heartbeat=60,
+            connection_attempts=1,
+        )
+        self.exchange = exchange
+        self.exchange_type = exchange_type
+        if confirm_budget is None:
+            confirm_budget = float(os.environ.get("AMQP_CONFIRM_BUDGET_MS", 50)) / 1000
+        self.confirm_budget = confirm_budget
+        self.reconnect_backoff = float(os.environ.get("AMQP_RECONNECT_BACKOFF", 0.5))
+        self.reconnect_backoff_max = float(os.environ.get("AMQP_RECONNECT_BACKOFF_MAX", 30))
+
+        # Only touched on the IO thread
+        self._connection = None
+        self._channel = None
+        self._opened = False
+        self._delivery_tag = 0
+        self._pending = OrderedDict()  # delivery tag -> Future, in publish order
+
+        # Shared with request threads
+        self._ready = threading.Event()
+        self._stopping = threading.Event()
+        self._outstanding = set()
+        self._outstanding_lock = threading.Lock()
+
+        self._thread = threading.Thread(target=self._run, name="amqp-confirms", daemon=True)
+        self._thread.start()
+
+    # --- IO thread -----------------------------------------------------------------------------
+
+    def _run(self):
+        failures = 0
+        while not self._stopping.is_set():
+            self._opened = False
+            self._connection = pika.SelectConnection(
+                self.parameters,
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_open_error,
+                on_close_callback=self._on_connection_closed,
+            )
+            self._connection.ioloop.start()  # returns once the connection has closed
+
+            self._ready.clear()
+            self._channel = None
+            self._fail_pending(BrokerUnavailable("connection to the broker was lost"))
+            if self._stopping.is_set():
+                break
+            failures = 1 if self._opened else failures + 1
+            backoff = min(self.reconnect_backoff_max, self.reconnect_backoff * 2 ** (failures - 1))
+            self._stopping.wait(random.uniform(backoff / 2, backoff))
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_open_error(self, connection, error):
+        print(f"Error connecting to RabbitMQ: {error}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        if not self._stopping.is_set():
+            print(f"RabbitMQ connection closed: {reason}")
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        self._channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        # Declared once per connection, before any message is accepted
+        channel.exchange_declare(
+            exchange=self.exchange,
+            exchange_type=self.exchange_type,
+            durable=True,
+            callback=lambda _frame: channel.confirm_delivery(self._on_delivery_confirmation, callback=self._on_confirm_selected),
+        )
+
+    def _on_confirm_selected(self, _frame):
+        self._delivery_tag = 0  # the broker numbers confirms per channel, starting at 1
+        self._opened = True
+        self._ready.set()
+
+    def _on_channel_closed(self, channel, reason):
+        print(f"RabbitMQ channel closed: {reason}")
+        self._ready.clear()
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+
+    def _on_delivery_confirmation(self, method_frame):
+        method = method_frame.method
+        if method.multiple:
+            # One frame confirms every message up to and including delivery_tag
+            tags = []
+            for tag in self._pending:
+                if tag > method.delivery_tag:
+                    break
+                tags.append(tag)
+        else:
+            tags = [method.delivery_tag] if method.delivery_tag in self._pending else []
+
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        for tag in tags:
+            future = self._pending.pop(tag)
+            if acked:
+                future.set_result(True)
+            else:
+                future.set_exception(BrokerUnavailable("message was nacked by the broker"))
+
+    def _fail_pending(self, error):
+        pending, self._pending = self._pending, OrderedDict()
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def _publish_on_io_thread(self, routing_key, body, properties, future):
+        if self._channel is None or not self._channel.is_open or not self._ready.is_set():
+            future.set_exception(BrokerUnavailable("channel is not open"))
+            return
+        try:
+            self._channel.basic_publish(exchange=self.exchange, routing_key=routing_key, body=body, properties=properties)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        self._delivery_tag += 1
+        self._pending[self._delivery_tag] = future
+
+    # --- request threads ------------------------------------------------------------------------
+
+    def publish_async(self, routing_key, message, properties=None):
+        """Hand a message to the IO thread. The returned Future resolves when the broker confirms it."""
+        body, content_type = encode(routing_key, message)
+        future = Future()
+        with self._outstanding_lock:
+            self._outstanding.add(future)
+        future.add_done_callback(self._forget)
+
+        if not self._ready.wait(self.confirm_budget):
+            future.set_exception(BrokerUnavailable("not connected to the broker"))
+            return future
+        try:
+            self._connection.ioloop.add_callback_threadsafe(
+                lambda: self._publish_on_io_thread(routing_key, body, properties or default_properties(content_type, persistent=True), future)
+            )
+        except Exception as e:
+            future.set_exception(BrokerUnavailable(f"connection is closing: {e}"))
+        return future
+
+    def _forget(self, future):
+        with self._outstanding_lock:
+            self._outstanding.discard(future)
+
+    def publish(self, routing_key, message, properties=None):
+        """
+        Publish and wait for the broker's confirm for at most the latency budget.
+        Returns False if the message was nacked or could not be sent. A confirm still outstanding when
+        the budget runs out counts as sent; a late nack is logged.
+        """
+        start = time.monotonic()
+        future = self.publish_async(routing_key, message, properties)
+        try:
+            return future.result(timeout=max(0.0, self.confirm_budget - (time.monotonic() - start)))
+        except FutureTimeoutError:
+            future.add_done_callback(lambda f: f.exception() and print(f"Error publishing to RabbitMQ ({routing_key}, confirmed late): {f.exception()}"))
+            return True
+        except Exception as e:
+            print(f"Error publishing to RabbitMQ: {e}")
+            return False
+
+    def flush(self, timeout=5):
+        """Wait until every outstanding message is confirmed (or timeout). Returns the number still unconfirmed."""
+        deadline = time.monotonic() + timeout
+        with self._outstanding_lock:
+            outstanding = list(self._outstanding)
+        for future in outstanding:
+            try:
+                future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception:
+                pass
+        return sum(1 for future in outstanding if not future.done())
+
+    def close(self, timeout=5):
+        self.flush(timeout)
+        self._stopping.set()
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(lambda: connection.is_open and connection.close())
+            except Exception:
+                pass
+        self._thread.join(timeout)
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher():
+    """The process-wide publisher, created on first use."""
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                confirms = os.environ.get("AMQP_PUBLISH_CONFIRMS", "0").lower() in ("1", "true", "yes")
+                _publisher = ConfirmingPublisher() if confirms else AmqpPublisher()
+                atexit.register(_publisher.close)
+    return _publisher
+
+
+def outbox_enabled():
+    return os.environ.get("OUTBOX_ENABLED", "0").lower() in ("1", "true", "yes")
+
+
+def start_outbox_relay():
+    """
+    Start the outbox relay when OUTBOX_ENABLED=1. Services call this at startup, so events left pending
+    by a crash or restart are relayed without waiting for the next publish.
+    """
+    if outbox_enabled():
+        from common.outbox import get_outbox
+        get_outbox()
+
+
+def publish_to_rabbitmq(routing_key, message):
+    """Publish a message to the notification exchange over a pooled connection, or via the outbox when OUTBOX_ENABLED=1"""
+    if outbox_enabled():
+        from common.outbox import get_outbox  # the outbox relays through get_publisher() below
+        message_id = get_outbox().append(routing_key, message)
+        print(f"Queued message {message_id} for {routing_key}: {json.dumps(as_dict(message))}")
+        return True
+    published = get_publisher().publish(routing_key, message)
+    if published:
+        print(f"Published message to {routing_key}: {json.dumps(as_dict(message))}")
+    return published
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+"""
+Encode/decode throughput and payload size of every notification event, per encoding.
+
+"dict+json" is what the services published before events.py (json.dumps of a plain dict, json.loads
+into a dict); "json" and "msgpack" are encode_event/decode_event with each content type, decoding into
+the typed event classes.
+
+Usage (from backend/services):
+    python -m common.bench_events --number 20000
+"""
+
+import argparse
+import json
+import timeit
+
+from common.events import (
+    JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE, EVENT_TYPES, decode_event, encode_event, msgpack,
+)
+
+# Representative values; ids are UUIDs or ints as in the services
+SAMPLE_VALUES = {
+    "reservation_id": 48213,
+    "order_id": 90211,
+    "user_id": "4f0c2b8e-5d3a-4a8e-9a57-0c1d2e3f4a5b",
+    "customer_id": "4f0c2b8e-5d3a-4a8e-9a57-0c1d2e3f4a5b",
+    "driver_id": "9b7d6c5e-4f3a-4b2c-8d1e-0f9a8b7c6d5e",
+    "user_name": "Tan Wei Ming",
+    "customer_name": "Tan Wei Ming",
+    "driver_name": "Muhammad Hafiz",
+    "user_phone": "+6591234567",
+    "table_no": 12,
+    "booking_time": "2025-03-28T19:30:00",
+    "time": "2025-03-28T19:30:00",
+    "count": 4,
+    "restaurant_id": 7,
+    "restaurant_name": "Hawker Heritage Kitchen",
+    "refund_amount": 25.5,
+    "payment_id": "pi_3NxY2bL8cD9eF0gH1iJ2kL3m",
+}
+
+
+def sample_event(cls):
+    return cls(**{name: SAMPLE_VALUES[name] for name in cls.fields})
+
+
+def ops_per_second(fn, number):
+    return number / timeit.timeit(fn, number=number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark notification event encodings.")
+    parser.add_argument("--number", type=int, default=20000, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    if msgpack is None:
+        print("msgpack is not installed; only JSON is measured")
+
+    print(f"{'message type':<30} {'encoding':<10} {'bytes':>6} {'encode/s':>10} {'decode/s':>10}")
+    for message_type, cls in EVENT_TYPES.items():
+        event = sample_event(cls)
+        legacy = dict(event.to_dict(), message_type=message_type)
+        del legacy["v"]
+        legacy_body = json.dumps(legacy)
+
+        rows = [("dict+json", len(legacy_body.encode()),
+                 ops_per_second(lambda: json.dumps(legacy), args.number),
+                 ops_per_second(lambda: json.loads(legacy_body), args.number))]
+        for name, content_type in (("json", JSON_CONTENT_TYPE), ("msgpack", MSGPACK_CONTENT_TYPE)):
+            if content_type == MSGPACK_CONTENT_TYPE and msgpack is None:
+                continue
+            body, _ = encode_event(event, content_type=content_type)
+            assert decode_event(body, content_type) == event
+            size = len(body.encode()) if isinstance(body, str) else len(body)
+            rows.append((name, size,
+                         ops_per_second(lambda: encode_event(event, content_type=content_type), args.number),
+                         ops_per_second(lambda: decode_event(body, content_type), args.number)))
+
+        for name, size, encode_rate, decode_rate in rows:
+            print(f"{message_type:<30} {name:<10} {size:>6} {encode_rate:>10.0f} {decode_rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+"""
+Compare connect-per-message publishing (the old publish_to_rabbitmq) with the pooled AmqpPublisher.
+
+Threads stand in for concurrent request handlers; each one publishes --messages messages and the
+script reports throughput and the per-publish latency a request would pay (p50 / p99).
+
+Usage (needs a running broker, e.g. `docker compose up rabbitmq`, from backend/services):
+    python -m common.bench_publisher --host localhost --threads 8 --messages 200
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+
+import pika
+
+from common.amqp_publisher import RABBITMQ_EXCHANGE, RABBITMQ_EXCHANGE_TYPE, AmqpPublisher
+
+ROUTING_KEY = "bench.publisher"  # not bound to any queue, so the broker simply drops the messages
+
+
+def connect_per_message(host, port):
+    # The publish path every composite service used before the shared publisher
+    def publish(routing_key, message):
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=host, port=port))
+        channel = connection.channel()
+        channel.exchange_declare(exchange=RABBITMQ_EXCHANGE, exchange_type=RABBITMQ_EXCHANGE_TYPE, durable=True)
+        channel.basic_publish(exchange=RABBITMQ_EXCHANGE, routing_key=routing_key, body=json.dumps(message))
+        connection.close()
+        return True
+    return publish
+
+
+def run(name, publish, threads, messages):
+    latencies = []
+    lock = threading.Lock()
+    message = {"order_id": "bench", "user_phone": "+6500000000", "message_type": ROUTING_KEY}
+
+    def worker():
+        local = []
+        for _ in range(messages):
+            start = time.perf_counter()
+            publish(ROUTING_KEY, message)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:>20}: {len(latencies) / elapsed:8.0f} msg/s   "
+          f"p50 {statistics.median(latencies) * 1000:7.2f} ms   p99 {p99 * 1000:7.2f} ms")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RabbitMQ publishing strategies.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5672)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=200, help="Messages per thread")
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    run("connect-per-message", connect_per_message(args.host, args.port), args.threads, args.messages)
+
+    publisher = AmqpPublisher(host=args.host, port=args.port, pool_size=args.pool_size)
+    publisher.publish(ROUTING_KEY, {"warmup": True})  # open the first connection outside the measurement
+    run(f"pooled (size {args.pool_size})", publisher.publish, args.threads, args.messages)
+    publisher.close()
+
+
+if __name__ == "__main__":
+    main()
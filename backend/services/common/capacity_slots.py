@@ -0,0 +1,30 @@
+"""
+Time slots that restaurant capacity is counted in, shared by the capacity ledger and create_booking's
+fallback check so both count the same window. Both read CAPACITY_SLOT_MINUTES; docker-compose sets it
+for each of them.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+
+def parse_time(value):
+    """
+    Parse an ISO booking time ("2025-03-28T19:30:00", optionally with "Z" or an offset).
+    Times with an offset are converted to naive UTC, so "...Z" and naive UTC times land in the same slot.
+    """
+    if not isinstance(value, datetime):
+        if not value:
+            raise ValueError("A booking time is required")
+        value = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def slot_bounds(booking_time, slot_minutes):
+    """[start, end) of the slot_minutes-long slot booking_time falls in, as naive UTC."""
+    booking_time = parse_time(booking_time)
+    minutes = booking_time.hour * 60 + booking_time.minute
+    start = booking_time.replace(hour=0, minute=0, second=0, microsecond=0) \
+        + timedelta(minutes=minutes - minutes % slot_minutes)
+    return start, start + timedelta(minutes=slot_minutes)
@@ -0,0 +1,228 @@
+"""
+Versioned schema for the notification events the composite services publish.
+
+Each message type is a small __slots__ class with a fixed field order. Publishers build an event and
+publish_to_rabbitmq encodes it; the notification consumer decodes the body back into the same class,
+choosing the decoder from the AMQP content_type:
+
+    application/msgpack   [version, message_type, value, value, ...]   (fields in schema order)
+    application/json      {"v": version, "message_type": ..., "field": value, ...}
+
+MessagePack drops the field names from every message, so it is the compact encoding; JSON stays the
+fallback (EVENT_ENCODING=json, msgpack not installed, or a consumer that predates this module), and
+plain dicts without a "v" decode as version 1.
+
+Schema evolution: only ever append fields to a class and bump SCHEMA_VERSION. A decoder fills fields a
+shorter (older) message does not have with None and ignores values a newer message appends.
+
+    from common.events import ReservationConfirmation
+
+    publish_to_rabbitmq("reservation.confirmation", ReservationConfirmation(reservation_id=1, ...))
+"""
+
+import json
+import os
+
+try:
+    import msgpack
+except ImportError:  # JSON only
+    msgpack = None
+
+SCHEMA_VERSION = 1
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+MSGPACK_CONTENT_TYPES = (MSGPACK_CONTENT_TYPE, "application/x-msgpack")
+
+
+class Event:
+    """Base class for notification events. Subclasses set message_type and fields (never reorder fields)."""
+    __slots__ = ()
+    message_type = None
+    fields = ()
+
+    def __init__(self, **values):
+        for name in self.fields:
+            setattr(self, name, values.pop(name, None))
+        if values:
+            raise TypeError(f"{type(self).__name__} has no fields {', '.join(sorted(values))}")
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.fields)
+        return f"{type(self).__name__}({values})"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values() == other.values()
+
+    def __hash__(self):
+        # Same identity as __eq__; raises TypeError like a tuple if a decoded field holds a list or dict
+        return hash((type(self), *self.values()))
+
+    def values(self):
+        return [getattr(self, name) for name in self.fields]
+
+    def to_dict(self):
+        data = {"v": SCHEMA_VERSION, "message_type": self.message_type}
+        for name in self.fields:
+            data[name] = getattr(self, name)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        event = cls.__new__(cls)
+        for name in cls.fields:
+            setattr(event, name, data.get(name))
+        return event
+
+    @classmethod
+    def from_values(cls, values):
+        event = cls.__new__(cls)
+        count = len(values)
+        for i, name in enumerate(cls.fields):
+            setattr(event, name, values[i] if i < count else None)
+        return event
+
+
+class UnknownEvent:
+    """An event whose message_type has no schema here; fields are looked up in the decoded dict."""
+    __slots__ = ("message_type", "data")
+
+    def __init__(self, message_type, data):
+        self.message_type = message_type
+        self.data = data
+
+    def __getattr__(self, name):
+        return self.data.get(name)
+
+    def to_dict(self):
+        return dict(self.data, message_type=self.message_type)
+
+
+# --- US1: bookings ----------------------------------------------------------------------------
+
+class ReservationConfirmation(Event):
+    __slots__ = ("reservation_id", "user_id", "user_name", "user_phone", "table_no", "booking_time", "restaurant_name")
+    message_type = "reservation.confirmation"
+    fields = __slots__
+
+
+class WaitlistNotification(Event):
+    __slots__ = ("user_id", "user_name", "user_phone", "restaurant_id", "restaurant_name", "time", "count",
+                 "payment_id", "order_id")
+    message_type = "waitlist.notification"
+    fields = __slots__
+
+
+# --- US2: cancellations and reallocation ------------------------------------------------------
+
+class ReservationCancellation(Event):
+    __slots__ = ("reservation_id", "user_id", "user_name", "user_phone", "table_no", "refund_amount", "payment_id")
+    message_type = "reservation.cancellation"
+    fields = __slots__
+
+
+class ReallocationNotice(Event):
+    __slots__ = ("user_id", "user_name", "user_phone", "table_no")
+    message_type = "reallocation.notice"
+    fields = __slots__
+
+
+class ReallocationConfirmation(Event):
+    __slots__ = ("user_name", "user_phone", "table_no", "booking_time", "reservation_id")
+    message_type = "reallocation.confirmation"
+    fields = __slots__
+
+
+# --- US3: deliveries --------------------------------------------------------------------------
+
+class DeliveryOrderConfirmation(Event):
+    __slots__ = ("order_id", "user_id", "user_name", "user_phone", "restaurant_id", "restaurant_name", "payment_id")
+    message_type = "delivery.order.confirmation"
+    fields = __slots__
+
+
+class DeliveryStatusEvent(Event):
+    """A driver changed the state of a delivery order."""
+    __slots__ = ("order_id", "customer_id", "user_phone", "driver_id", "driver_name", "customer_name")
+    fields = __slots__
+
+
+class DeliveryOrderAccepted(DeliveryStatusEvent):
+    __slots__ = ()
+    message_type = "delivery.order.accepted"
+
+
+class DeliveryOrderPickedUp(DeliveryStatusEvent):
+    __slots__ = ()
+    message_type = "delivery.order.pickedup"
+
+
+class DeliveryOrderDelivered(DeliveryStatusEvent):
+    __slots__ = ()
+    message_type = "delivery.order.delivered"
+
+
+EVENT_TYPES = {
+    cls.message_type: cls
+    for cls in (
+        ReservationConfirmation,
+        WaitlistNotification,
+        ReservationCancellation,
+        ReallocationNotice,
+        ReallocationConfirmation,
+        DeliveryOrderConfirmation,
+        DeliveryOrderAccepted,
+        DeliveryOrderPickedUp,
+        DeliveryOrderDelivered,
+    )
+}
+
+
+def as_event(message, routing_key=None):
+    """Turn a plain dict (e.g. an event stored before this schema) into its Event class, if it has one."""
+    if isinstance(message, (Event, UnknownEvent)):
+        return message
+    message_type = message.get("message_type") or routing_key
+    cls = EVENT_TYPES.get(message_type)
+    if cls is None:
+        return UnknownEvent(message_type, message)
+    return cls.from_dict(message)
+
+
+def as_dict(message):
+    return message.to_dict() if isinstance(message, (Event, UnknownEvent)) else message
+
+
+def preferred_content_type():
+    # Read per call so a service's load_dotenv() has run; falls back to JSON without msgpack
+    if msgpack is not None and os.environ.get("EVENT_ENCODING", "json").lower() == "msgpack":
+        return MSGPACK_CONTENT_TYPE
+    return JSON_CONTENT_TYPE
+
+
+def encode_event(message, routing_key=None, content_type=None):
+    """Encode an Event (or dict). Returns (body, content_type)."""
+    event = as_event(message, routing_key)
+    content_type = content_type or preferred_content_type()
+    if content_type in MSGPACK_CONTENT_TYPES and isinstance(event, Event):
+        return msgpack.packb([SCHEMA_VERSION, event.message_type, *event.values()]), MSGPACK_CONTENT_TYPE
+    return json.dumps(event.to_dict()), JSON_CONTENT_TYPE
+
+
+def decode_event(body, content_type=None):
+    """Decode a message body into its Event class, using the content_type it was published with."""
+    if content_type in MSGPACK_CONTENT_TYPES:
+        if msgpack is None:
+            raise ValueError(f"Cannot decode {content_type} without the msgpack package")
+        values = msgpack.unpackb(body)
+        version, message_type, values = values[0], values[1], values[2:]
+        cls = EVENT_TYPES.get(message_type)
+        if cls is None:
+            # Without a schema the values cannot be named; keep them so the consumer can log and settle it
+            return UnknownEvent(message_type, {"v": version, "values": values})
+        return cls.from_values(values)
+
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError("Event body is not a JSON object")
+    return as_event(data)
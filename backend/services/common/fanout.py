@@ -0,0 +1,97 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time before all of its upstream calls finished."""
+
+
+class FanOut:
+    """
+    Runs the independent upstream calls of one request concurrently on a shared, bounded thread pool.
+
+    Every call is a function taking the timeout (seconds) it should pass to its HTTP client: the per-call
+    timeout, capped by whatever is left of the request's total deadline. Stages and calls are timed so
+    the endpoint can report where its latency went (see server_timing()).
+    """
+
+    def __init__(self, executor, deadline, call_timeout):
+        self.executor = executor
+        self.deadline = time.monotonic() + deadline
+        self.call_timeout = call_timeout
+        self.started = time.monotonic()
+        self.timings = []  # (name, seconds) in the order they finished
+
+    def remaining(self):
+        """Seconds left before the deadline, or None once the deadline has been lifted."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def lift_deadline(self):
+        """
+        Stop enforcing the request deadline, e.g. once the request's main write has committed and the
+        remaining calls must finish rather than fail the request. Calls keep their per-call timeouts.
+        """
+        self.deadline = None
+
+    def timeout(self, call_timeout=None):
+        """Timeout for the next call: the per-call limit, capped by the time left before the deadline."""
+        remaining = self.remaining()
+        if remaining is None:
+            return call_timeout or self.call_timeout
+        if remaining <= 0:
+            raise DeadlineExceeded("request deadline exceeded")
+        return min(call_timeout or self.call_timeout, remaining)
+
+    def _timed(self, name, fn, timeout):
+        start = time.monotonic()
+        try:
+            return fn(timeout)
+        finally:
+            self.timings.append((name, time.monotonic() - start))
+
+    def call(self, stage, fn, call_timeout=None):
+        """Run a single call in the request thread, timed as its own stage."""
+        return self._timed(stage, fn, self.timeout(call_timeout))
+
+    def submit(self, name, fn, call_timeout=None):
+        """
+        Start a call on the pool without waiting for it (e.g. a lookup speculatively started before a write).
+        Its timeout is fixed now (DeadlineExceeded here if the deadline has already passed), so a call left
+        waiting in the pool's queue is never failed by the deadline after the request has lifted it.
+        """
+        return self.executor.submit(self._timed, name, fn, self.timeout(call_timeout))
+
+    def gather(self, stage, futures):
+        """
+        Wait for {name: future} and return {name: result}; the wait is timed as stage.
+        The first exception raised by a call is re-raised; DeadlineExceeded if the deadline passes first.
+        """
+        start = time.monotonic()
+        done, not_done = wait(futures.values(), timeout=self.remaining())
+        self.timings.append((stage, time.monotonic() - start))
+        if not_done:
+            for future in not_done:
+                future.cancel()
+            raise DeadlineExceeded(f"stage {stage} did not finish before the request deadline")
+        return {name: future.result() for name, future in futures.items()}
+
+    def run(self, stage, calls, call_timeout=None):
+        """
+        Run {name: fn} concurrently and return {name: result}.
+        The first exception raised by a call is re-raised; DeadlineExceeded if the deadline passes first.
+        """
+        futures = {name: self.submit(f"{stage}.{name}", fn, call_timeout) for name, fn in calls.items()}
+        return self.gather(stage, futures)
+
+    def server_timing(self):
+        """Server-Timing header value, e.g. 'upstream;dur=41.2, upstream.driver;dur=12.0, ..., total;dur=95.3'."""
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.timings]
+        entries.append(f"total;dur={(time.monotonic() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def create_executor(max_workers):
+    # One pool per process, shared by every request, so concurrent requests cannot spawn unbounded threads
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fanout")
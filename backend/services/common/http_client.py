@@ -0,0 +1,142 @@
+"""
+Pooled HTTP client for calls between FeastFinder services.
+
+Every call in a process goes through one requests.Session, so connections to each upstream host are
+kept alive and reused instead of paying TCP setup on every hop. Calls get default connect/read
+timeouts, idempotent methods are retried with jittered backoff, and every call is reported to the
+registered latency hooks. The per-upstream totals kept by latency_stats are served under "upstreams" on
+each composite service's health endpoint.
+
+    from common import http_client
+
+    response = http_client.get(f"{ORDER_SERVICE_URL}/api/orders/{order_id}")
+    response = http_client.post(url, json=payload, timeout=3)   # per-call timeout override
+"""
+
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 10))  # upstream hosts with a pool of their own
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 20))  # keep-alive connections kept per host
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 2))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10))
+RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", 0.2))  # seconds, doubled on every attempt
+RETRY_BACKOFF_MAX = float(os.getenv("HTTP_RETRY_BACKOFF_MAX", 2))
+SLOW_CALL_SECONDS = float(os.getenv("HTTP_SLOW_CALL_SECONDS", 1))
+
+
+class JitteredRetry(Retry):
+    """Retry with "full jitter" backoff, so callers that failed together do not retry in lockstep."""
+
+    def get_backoff_time(self):
+        attempts = len(self.history)
+        if attempts == 0:
+            return 0
+        return random.uniform(0, min(RETRY_BACKOFF_MAX, self.backoff_factor * 2 ** (attempts - 1)))
+
+
+def create_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, retries=RETRIES):
+    # Retry.DEFAULT_ALLOWED_METHODS only holds idempotent methods (GET, PUT, DELETE, ...), so a POST or
+    # PATCH is only retried when the connection could not be opened and nothing was sent
+    retry = JitteredRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class LatencyStats:
+    """Per-upstream call counts and latencies, fed by the latency hook registered below."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def __call__(self, upstream, method, status, seconds):
+        with self._lock:
+            entry = self._stats.setdefault(upstream, {"calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            entry["calls"] += 1
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            if status is None or status >= 500:
+                entry["errors"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                upstream: dict(entry, avg_seconds=entry["total_seconds"] / entry["calls"])
+                for upstream, entry in self._stats.items()
+            }
+
+
+def log_slow_call(upstream, method, status, seconds):
+    if seconds >= SLOW_CALL_SECONDS:
+        print(f"Slow upstream call: {method} {upstream} -> {status} in {seconds * 1000:.0f} ms")
+
+
+session = create_session()
+latency_stats = LatencyStats()
+_latency_hooks = [latency_stats, log_slow_call]
+
+
+def add_latency_hook(hook):
+    """Register hook(upstream, method, status, seconds); status is None when the call raised."""
+    _latency_hooks.append(hook)
+
+
+def request(method, url, **kwargs):
+    if kwargs.get("timeout") is None:
+        # Also when a helper passes its own timeout=None through: never wait on an upstream forever
+        kwargs["timeout"] = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    upstream = urlsplit(url).netloc
+    status = None
+    start = time.monotonic()
+    try:
+        response = session.request(method, url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.monotonic() - start
+        for hook in _latency_hooks:
+            try:
+                hook(upstream, method, status, elapsed)
+            except Exception as e:
+                print(f"Latency hook failed: {str(e)}")
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request("PATCH", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
@@ -0,0 +1,44 @@
+"""
+Batch lookups against the user and restaurant services, shared by the composite services.
+
+Each call fetches every id it is given in one request to the service's batch endpoint, and only the
+columns asked for.
+
+    from common.lookups import CONTACT_FIELDS, get_users
+
+    user = get_users([user_id], CONTACT_FIELDS).get(user_id, {})
+"""
+
+import os
+
+from common import http_client
+
+# The customer columns notifications are addressed with
+CONTACT_FIELDS = ["customer_name", "phone_number"]
+
+
+def service_url(name, default):
+    # Read per call so the importing service's load_dotenv() has run
+    return os.environ.get(name, default)
+
+
+def get_users(user_ids, fields=None, timeout=None):
+    """
+    Fetch several customer profiles with one call to the user service's batch endpoint.
+    fields: columns to return (None for all). Returns {user_id: profile}; ids that do not exist are left out.
+    """
+    url = service_url("USER_SERVICE_URL", "http://user-service:5000")
+    response = http_client.post(f"{url}/api/user/batch", json={"ids": list(dict.fromkeys(user_ids)), "fields": fields}, timeout=timeout)
+    response.raise_for_status()
+    return response.json().get("data", {}).get("users", {})
+
+
+def get_restaurants(restaurant_ids, fields=None, timeout=None):
+    """
+    Fetch several restaurants with one call to the restaurant service's batch endpoint.
+    fields: columns to return (None for all). Returns {str(restaurant_id): restaurant}; ids that do not exist are left out.
+    """
+    url = service_url("RESTAURANT_SERVICE_URL", "http://restaurant-service:5000")
+    response = http_client.post(f"{url}/api/restaurants/batch", json={"ids": list(dict.fromkeys(restaurant_ids)), "fields": fields}, timeout=timeout)
+    response.raise_for_status()
+    return response.json().get("data", {}).get("restaurants", {})
@@ -0,0 +1,217 @@
+"""
+Durable outbox for notification events.
+
+The request path only appends the event to a local SQLite log (WAL mode, one file per service) and
+returns. A background relay thread drains the log to RabbitMQ in batches, so request latency no
+longer depends on the broker, and events survive a broker outage or a service restart.
+
+Every event gets a message_id when it is appended. The relay publishes it as the AMQP message_id,
+so a consumer can drop the duplicates that at-least-once relaying produces. For example, the relay
+may crash after publishing a batch but before recording its progress.
+
+The log is append-only. The relay's progress is a single cursor row (the last relayed seq), and
+rows behind the cursor are pruned once they are older than the retention period. Replicas of a
+service may share one outbox file: a lease row makes sure only one of their relays drains it.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import pika
+
+from common.amqp_publisher import get_publisher
+from common.events import as_dict, encode_event
+
+
+class Outbox:
+
+    def __init__(self, path=None, publisher=None, batch_size=None, retention=None):
+        # Settings are read here rather than at import time so a service's load_dotenv() has already run
+        self.path = path or os.environ.get("OUTBOX_PATH", "/app/data/outbox.db")
+        self.publisher = publisher
+        self.batch_size = batch_size or int(os.environ.get("OUTBOX_BATCH_SIZE", 100))
+        self.retention = retention or float(os.environ.get("OUTBOX_RETENTION", 24 * 3600))  # seconds
+        self.poll_interval = float(os.environ.get("OUTBOX_POLL_INTERVAL", 1))
+        self.retry_interval = float(os.environ.get("OUTBOX_RETRY_INTERVAL", 5))
+        self.lease_ttl = float(os.environ.get("OUTBOX_LEASE_TTL", 30))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._relay = None
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = self._db()
+        db.execute("""
+            create table if not exists outbox (
+                seq integer primary key autoincrement,
+                message_id text not null,
+                routing_key text not null,
+                body text not null,
+                created_at real not null
+            )
+        """)
+        db.execute("create table if not exists outbox_cursor (id integer primary key check (id = 1), seq integer not null)")
+        db.execute("insert or ignore into outbox_cursor (id, seq) values (1, 0)")
+        db.execute("create table if not exists outbox_lease (id integer primary key check (id = 1), owner text, expires_at real not null)")
+        db.execute("insert or ignore into outbox_lease (id, owner, expires_at) values (1, null, 0)")
+        db.commit()
+
+    def _db(self):
+        # One connection per thread; WAL lets the request threads append while the relay reads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("pragma journal_mode=wal")
+            db.execute("pragma synchronous=normal")
+            self._local.db = db
+        return db
+
+    # --- request path ------------------------------------------------------------------------
+
+    def append(self, routing_key, message):
+        """Durably record an event for publishing. Returns its message_id."""
+        message_id = uuid.uuid4().hex
+        db = self._db()
+        with db:
+            db.execute(
+                "insert into outbox (message_id, routing_key, body, created_at) values (?, ?, ?, ?)",
+                (message_id, routing_key, json.dumps(as_dict(message)), time.time())
+            )
+        self._wakeup.set()
+        return message_id
+
+    # --- relay ---------------------------------------------------------------------------------
+
+    def pending(self):
+        db = self._db()
+        return db.execute("select count(*) from outbox where seq > (select seq from outbox_cursor where id = 1)").fetchone()[0]
+
+    def relay_once(self):
+        """Publish the next batch after the cursor. Returns how many events were relayed."""
+        db = self._db()
+        rows = db.execute(
+            "select seq, message_id, routing_key, body from outbox "
+            "where seq > (select seq from outbox_cursor where id = 1) order by seq limit ?",
+            (self.batch_size,)
+        ).fetchall()
+        if not rows:
+            return 0
+
+        publisher = self.publisher or get_publisher()
+        relayed_seq = None
+        if hasattr(publisher, "publish_async"):
+            # Confirm mode: send the whole batch, then wait for the broker's (batched) acks
+            futures = [
+                (seq, publisher.publish_async(routing_key, *self._encode(routing_key, message_id, body)))
+                for seq, message_id, routing_key, body in rows
+            ]
+            for seq, future in futures:
+                try:
+                    future.result(timeout=30)
+                except Exception as e:
+                    print(f"Outbox relay stopped at seq {seq}: {e}")
+                    break
+                relayed_seq = seq
+        else:
+            for seq, message_id, routing_key, body in rows:
+                if not publisher.publish(routing_key, *self._encode(routing_key, message_id, body)):
+                    print(f"Outbox relay stopped at seq {seq}")
+                    break
+                relayed_seq = seq
+
+        if relayed_seq is None:
+            return 0
+        with db:
+            db.execute("update outbox_cursor set seq = ? where id = 1", (relayed_seq,))
+        return sum(1 for row in rows if row[0] <= relayed_seq)
+
+    def _encode(self, routing_key, message_id, stored):
+        # The log keeps events as JSON; they are encoded as EVENT_ENCODING asks when relayed
+        body, content_type = encode_event(json.loads(stored), routing_key)
+        return body, self._properties(message_id, content_type)
+
+    def _properties(self, message_id, content_type):
+        return pika.BasicProperties(
+            content_type=content_type,
+            delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
+            message_id=message_id,
+        )
+
+    def prune(self):
+        db = self._db()
+        with db:
+            db.execute(
+                "delete from outbox where seq <= (select seq from outbox_cursor where id = 1) and created_at < ?",
+                (time.time() - self.retention,)
+            )
+
+    def _hold_lease(self):
+        # Take over the lease if it is free or expired, or renew it if it is already ours
+        now = time.time()
+        db = self._db()
+        with db:
+            updated = db.execute(
+                "update outbox_lease set owner = ?, expires_at = ? where id = 1 and (owner = ? or expires_at < ?)",
+                (self.owner, now + self.lease_ttl, self.owner, now)
+            ).rowcount
+        return updated == 1
+
+    def _run(self):
+        last_prune = 0.0
+        while not self._stopping.is_set():
+            try:
+                if not self._hold_lease():
+                    # Another replica is relaying this outbox
+                    self._stopping.wait(self.lease_ttl / 3)
+                    continue
+                relayed = self.relay_once()
+                if relayed and relayed == self.batch_size:
+                    continue  # more waiting, keep draining
+                if not relayed and self.pending():
+                    # Broker unavailable: back off instead of spinning on the same batch
+                    self._stopping.wait(self.retry_interval)
+                    continue
+                if time.monotonic() - last_prune > 3600:
+                    self.prune()
+                    last_prune = time.monotonic()
+            except Exception as e:
+                print(f"Outbox relay error: {e}")
+                self._stopping.wait(self.retry_interval)
+                continue
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        if self._relay is None:
+            self._relay = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+            self._relay.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._relay is not None:
+            self._relay.join(timeout)
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    """The process-wide outbox with its relay thread running, created on first use."""
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = Outbox().start()
+    return _outbox
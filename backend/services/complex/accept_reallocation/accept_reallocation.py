@@ -1,7 +1,9 @@
-import json
 import requests
+from common import http_client
+from common.lookups import CONTACT_FIELDS, get_users
+from common.amqp_publisher import publish_to_rabbitmq, start_outbox_relay
+from common.events import ReallocationConfirmation
 from flask import Flask, request, jsonify
-import pika
 import time
 import uuid
 import random
@@ -13,18 +15,12 @@ from datetime import datetime
 # Load environment variables
 load_dotenv()
 
-# RabbitMQ configuration
-RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", "localhost")
-RABBITMQ_PORT = int(os.environ.get("RABBITMQ_PORT", 5672))
-RABBITMQ_EXCHANGE = "notification_topic"
-RABBITMQ_EXCHANGE_TYPE = "topic"
-
 # Service URLs
-USER_SERVICE_URL = os.environ.get("USER_SERVICE_URL", "http://user-service:5000")
 RESERVATION_SERVICE_URL = os.environ.get("RESERVATION_SERVICE_URL", "http://reservation-service:5000")
 ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://order-service:5000")
 PAYMENT_SERVICE_URL = os.environ.get("PAYMENT_SERVICE_URL", "http://payment-service:5000")
 REALLOCATE_RESERVATION_SERVICE_URL = os.environ.get("REALLOCATE_RESERVATION_SERVICE_URL", "http://reallocate-reservation-service:5000")
+CAPACITY_LEDGER_URL = os.environ.get("CAPACITY_LEDGER_URL", "http://capacity-ledger-service:5000")
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
@@ -34,43 +30,23 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "service": "accept-reallocation-service",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "upstreams": http_client.latency_stats.snapshot()
     }), 200
     
-# Publish message to RabbitMQ
-def publish_to_rabbitmq(routing_key, message):
-    """Publish a message to RabbitMQ"""
+def commit_seat(restaurant_id, booking_time):
+    # The reallocated table is booked again: count its seat in the slot on the capacity ledger
     try:
-        # Connect to RabbitMQ
-        connection = pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=RABBITMQ_HOST,
-                port=RABBITMQ_PORT
-            )
-        )
-        channel = connection.channel()
-        
-        # Ensure exchange exists
-        channel.exchange_declare(
-            exchange=RABBITMQ_EXCHANGE,
-            exchange_type=RABBITMQ_EXCHANGE_TYPE,
-            durable=True
+        response = http_client.post(
+            f"{CAPACITY_LEDGER_URL}/api/capacity/commit",
+            json={"restaurant_id": restaurant_id, "time": booking_time, "units": 1}
         )
-        
-        # Publish message
-        channel.basic_publish(
-            exchange=RABBITMQ_EXCHANGE,
-            routing_key=routing_key,
-            body=json.dumps(message)
-        )
-        
-        # Close connection
-        connection.close()
-        print(f"Published message to {routing_key}: {json.dumps(message)}")
-        return True
-    except Exception as e:
-        print(f"Error publishing to RabbitMQ: {e}")
-        return False
+        response.raise_for_status()
+        slot = response.json().get("data", {}).get("slot", {})
+        if slot.get("committed", 0) > slot.get("capacity", 0):
+            print(f"Warning: Restaurant {restaurant_id} is over capacity at {slot.get('slot_start')}: {slot}")
+    except requests.exceptions.RequestException as e:
+        print(f"Warning: Failed to commit seat for restaurant {restaurant_id} at {booking_time}: {str(e)}")
 
 @app.route('/api/accept-reallocation', methods=['POST'])
 def accept_reallocation():
@@ -117,7 +93,7 @@ def accept_reallocation():
                 print(f"Including booking_time in update: {booking_time}")
                 
             # Update the reservation by calling the reservation.py service
-            update_response = requests.patch(
+            update_response = http_client.patch(
                 f"{RESERVATION_SERVICE_URL}/api/reservation/reallocate_confirm_booking/{reservation_id}",
                 json=update_payload
             )
@@ -136,6 +112,9 @@ def accept_reallocation():
             print(f"Error updating reservation: {str(e)}")
             return jsonify({"error": f"Failed to update reservation: {str(e)}"}), 500
 
+        if updated_data.get("restaurant_id") and booking_time:
+            commit_seat(updated_data.get("restaurant_id"), booking_time)
+
         # Update Order Type from "dine_in(pending)" to "dine_in"
         try:
             if order_id:
@@ -143,7 +122,7 @@ def accept_reallocation():
                 order_update_payload = {
                     "order_type": "dine_in"
                 }
-                order_update_response = requests.patch(
+                order_update_response = http_client.patch(
                     f"{ORDER_SERVICE_URL}/api/orders/{order_id}/type",
                     json=order_update_payload
                 )
@@ -163,16 +142,14 @@ def accept_reallocation():
         if not username or not phone_number:
             try:
                 print(f"Fetching user details for user ID: {user_id}")
-                user_response = requests.get(f"{USER_SERVICE_URL}/api/user/{user_id}")
-                user_response.raise_for_status()
-                user_data = user_response.json()
+                user_data = get_users([user_id], CONTACT_FIELDS).get(user_id)
 
-                if user_data.get("code") != 200:
-                    print(f"Error getting user data: {user_data}")
+                if not user_data:
+                    print(f"User {user_id} not found")
                     return jsonify({"error": "Failed to get user details"}), 500
 
-                username = user_data.get("data", {}).get("customer_name", "Customer")
-                phone_number = user_data.get("data", {}).get("phone_number", "")
+                username = user_data.get("customer_name", "Customer")
+                phone_number = user_data.get("phone_number", "")
             except requests.exceptions.RequestException as e:
                 print(f"Error fetching user details: {str(e)}")
                 return jsonify({"error": f"Failed to fetch user details: {str(e)}"}), 500
@@ -180,14 +157,13 @@ def accept_reallocation():
         # Queue Notification Message to RabbitMQ
         try:
             print(f"Queueing notification for user: {username}")
-            notification_data = {
-                "user_name": username,
-                "user_phone": phone_number,
-                "table_no": table_no,
-                "booking_time": booking_time,
-                "reservation_id": new_reservation_id,
-                "message_type": "reallocation.confirmation"
-            }
+            notification_data = ReallocationConfirmation(
+                user_name=username,
+                user_phone=phone_number,
+                table_no=table_no,
+                booking_time=booking_time,
+                reservation_id=new_reservation_id,
+            )
             publish_to_rabbitmq("reallocation.confirmation", notification_data)
             print("Notification queued successfully")
             
@@ -214,6 +190,8 @@ def accept_reallocation():
         return jsonify({"error": f"Error processing reallocation acceptance: {str(e)}"}), 500
 
 if __name__ == "__main__":
+    # Relay events a previous run left in the outbox
+    start_outbox_relay()
     port = int(os.environ.get('PORT', 5010))
     print(f"Starting accept_reallocation service on port {port}...")
     app.run(host="0.0.0.0", port=port, debug=True)
\ No newline at end of file
@@ -1,28 +1,24 @@
-import json
 import time
 import requests
+from common import http_client
+from common.lookups import CONTACT_FIELDS, get_users
+from common.amqp_publisher import publish_to_rabbitmq, start_outbox_relay
+from common.events import ReservationCancellation
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import pika
 import os
 from dotenv import load_dotenv
 from datetime import datetime
 # Load environment variables
 load_dotenv()
 
-# RabbitMQ configuration
-RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", "localhost")
-RABBITMQ_PORT = int(os.environ.get("RABBITMQ_PORT", 5672))
-RABBITMQ_EXCHANGE = "notification_topic"
-RABBITMQ_EXCHANGE_TYPE = "topic"
-
 # Service URLs
-USER_SERVICE_URL = os.environ.get("USER_SERVICE_URL", "http://user-service:5000")
 RESERVATION_SERVICE_URL = os.environ.get("RESERVATION_SERVICE_URL", "http://reservation-service:5000")
 ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://order-service:5000")
 PAYMENT_SERVICE_URL = os.environ.get("PAYMENT_SERVICE_URL", "http://payment-service:5000")
 NOTIFICATION_SERVICE_URL = os.environ.get("NOTIFICATION_SERVICE_URL", "http://notification-service:5000")
 REALLOCATE_RESERVATION_SERVICE_URL = os.environ.get("REALLOCATE_RESERVATION_SERVICE_URL", "http://reallocate-reservation-service:5000")
+CAPACITY_LEDGER_URL = os.environ.get("CAPACITY_LEDGER_URL", "http://capacity-ledger-service:5000")
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
@@ -32,43 +28,20 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "service": "cancel-booking-service",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "upstreams": http_client.latency_stats.snapshot()
     }), 200
 
-# Publish message to RabbitMQ
-def publish_to_rabbitmq(routing_key, message):
-    """Publish a message to RabbitMQ"""
+def release_seat(restaurant_id, booking_time):
+    # Give the cancelled booking's seat back to its slot on the capacity ledger
     try:
-        # Connect to RabbitMQ
-        connection = pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=RABBITMQ_HOST,
-                port=RABBITMQ_PORT
-            )
-        )
-        channel = connection.channel()
-        
-        # Ensure exchange exists
-        channel.exchange_declare(
-            exchange=RABBITMQ_EXCHANGE,
-            exchange_type=RABBITMQ_EXCHANGE_TYPE,
-            durable=True
-        )
-        
-        # Publish message
-        channel.basic_publish(
-            exchange=RABBITMQ_EXCHANGE,
-            routing_key=routing_key,
-            body=json.dumps(message)
+        response = http_client.post(
+            f"{CAPACITY_LEDGER_URL}/api/capacity/release",
+            json={"restaurant_id": restaurant_id, "time": booking_time, "units": 1}
         )
-        
-        # Close connection
-        connection.close()
-        print(f"Published message to {routing_key}: {json.dumps(message)}")
-        return True
-    except Exception as e:
-        print(f"Error publishing to RabbitMQ: {e}")
-        return False
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"Warning: Failed to release seat for restaurant {restaurant_id} at {booking_time}: {str(e)}")
 
 @app.route('/api/cancel/<int:reservation_id>', methods=['POST'])
 def process_cancellation(reservation_id):
@@ -76,7 +49,7 @@ def process_cancellation(reservation_id):
     # this clears the reservation fields, nullify fields
     try:
         # Use the reservation API endpoint in your application
-        reservation_response = requests.patch(
+        reservation_response = http_client.patch(
             f"{RESERVATION_SERVICE_URL}/api/reservation/cancel/{reservation_id}"
         )
         reservation_response.raise_for_status()
@@ -93,21 +66,24 @@ def process_cancellation(reservation_id):
     refund_amount = reservation_data.get("refund_amount")
     payment_id = reservation_data.get("payment_id")
     order_id = reservation_data.get("order_id")  
+    booking_time = reservation_data.get("time")
 
     if not user_id:
         return jsonify({"error": "No user associated with this reservation"}), 404
 
+    # Only a booked reservation holds a seat on the ledger
+    if restaurant_id and booking_time and reservation_data.get("status") == "Booked":
+        release_seat(restaurant_id, booking_time)
+
     # Get user details from customer_profiles table
     try:
         # Using our user service
-        user_response = requests.get(f"{USER_SERVICE_URL}/api/user/{user_id}")
-        user_response.raise_for_status()
-        user_data = user_response.json()
+        user_data = get_users([user_id], CONTACT_FIELDS).get(user_id, {})
         print(f"User data received: {user_data}")
         
         # Extract the user details we need
-        user_name = user_data.get("data", {}).get("customer_name", "Customer")
-        user_phone = user_data.get("data", {}).get("phone_number", "")
+        user_name = user_data.get("customer_name", "Customer")
+        user_phone = user_data.get("phone_number", "")
         
     except requests.exceptions.RequestException as e:
         print(f"Failed to fetch user details: {str(e)}")
@@ -117,7 +93,7 @@ def process_cancellation(reservation_id):
     if payment_id:
         try:
             # Call the payment service to process the refund
-            refund_response = requests.post(
+            refund_response = http_client.post(
                 f"{PAYMENT_SERVICE_URL}/api/payment/refund",
                 json={"payment_id": payment_id}
             )
@@ -128,7 +104,7 @@ def process_cancellation(reservation_id):
             # Delete the order associated with this order_id
             if order_id:
                 # Delete by order_id if available (new method)
-                delete_order_response = requests.delete(
+                delete_order_response = http_client.delete(
                     f"{ORDER_SERVICE_URL}/api/orders/{order_id}"
                 )
                 if delete_order_response.status_code == 200:
@@ -142,22 +118,21 @@ def process_cancellation(reservation_id):
     
     # Queue a notification message to RabbitMQ and trigger reallocation
     try:
-        notification_data = {
-            "reservation_id": reservation_id,
-            "user_id": user_id,
-            "user_name": user_name,
-            "user_phone": user_phone,
-            "table_no": table_no,
-            "refund_amount": refund_amount,
-            "payment_id": payment_id,
-            "message_type": "reservation.cancellation"
-        }
+        notification_data = ReservationCancellation(
+            reservation_id=reservation_id,
+            user_id=user_id,
+            user_name=user_name,
+            user_phone=user_phone,
+            table_no=table_no,
+            refund_amount=refund_amount,
+            payment_id=payment_id,
+        )
         
         publish_to_rabbitmq("reservation.cancellation", notification_data)
         
         # Trigger reallocation (call reallocation service)
         reallocation_data = {"reservation_id": reservation_id, "restaurant_id": restaurant_id}
-        requests.post(f"{REALLOCATE_RESERVATION_SERVICE_URL}/api/reallocate", json=reallocation_data)
+        http_client.post(f"{REALLOCATE_RESERVATION_SERVICE_URL}/api/reallocate", json=reallocation_data)
         
         return jsonify({
             "message": "Reservation cancelled and notification sent, and reallocation triggered.",
@@ -176,6 +151,8 @@ def process_cancellation(reservation_id):
 #     return process_cancellation(reservation_id)
 
 if __name__ == '__main__':
+    # Relay events a previous run left in the outbox
+    start_outbox_relay()
     port = int(os.environ.get('PORT', 5008))
     print(f"Starting cancel_booking service on port {port}...")
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
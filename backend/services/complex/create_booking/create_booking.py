@@ -1,27 +1,36 @@
-import json
 import time
 import requests
+from common import http_client
+from common.lookups import CONTACT_FIELDS, get_users, get_restaurants
+from common.amqp_publisher import publish_to_rabbitmq, start_outbox_relay
+from common.events import DeliveryOrderConfirmation, WaitlistNotification, ReservationConfirmation
+from common.fanout import DeadlineExceeded, FanOut, create_executor
+from common.capacity_slots import slot_bounds
 import os
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import pika
 from datetime import datetime
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# RabbitMQ configuration
-RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", "localhost")
-RABBITMQ_PORT = int(os.environ.get("RABBITMQ_PORT", 5672))
-RABBITMQ_EXCHANGE = "notification_topic"
-RABBITMQ_EXCHANGE_TYPE = "topic"
-
 # Service URLs
-USER_SERVICE_URL = os.environ.get("USER_SERVICE_URL", "http://user-service:5000")
-RESTAURANT_SERVICE_URL = os.environ.get("RESTAURANT_SERVICE_URL", "http://restaurant-service:5000")
 ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://order-service:5000")
 RESERVATION_SERVICE_URL = os.environ.get("RESERVATION_SERVICE_URL", "http://reservation-service:5000")
+RESTAURANT_SERVICE_URL = os.environ.get("RESTAURANT_SERVICE_URL", "http://restaurant-service:5000")
+CAPACITY_LEDGER_URL = os.environ.get("CAPACITY_LEDGER_URL", "http://capacity-ledger-service:5000")
+WAITLIST_URL = "https://qks.outsystemscloud.com/Waitlist_Service/rest/waitlist/addUser"
+
+# Upstream calls that do not depend on each other run concurrently on this shared pool
+FANOUT_WORKERS = int(os.getenv('CREATE_BOOKING_FANOUT_WORKERS', 16))
+CALL_TIMEOUT = float(os.getenv('CREATE_BOOKING_CALL_TIMEOUT', 5))  # seconds per upstream call
+WAITLIST_TIMEOUT = float(os.getenv('CREATE_BOOKING_WAITLIST_TIMEOUT', 10))  # the waitlist is an external API
+REQUEST_DEADLINE = float(os.getenv('CREATE_BOOKING_REQUEST_DEADLINE', 20))  # seconds for the whole request
+# The capacity ledger's slot length (docker-compose sets the same value for both); used for the capacity
+# check while the ledger is down
+CAPACITY_SLOT_MINUTES = int(os.getenv('CAPACITY_SLOT_MINUTES', 60))
+fanout_executor = create_executor(FANOUT_WORKERS)
 
 app = Flask(__name__)
 # Allow CORS for all origins
@@ -32,47 +41,90 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "service": "create-booking-service",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "upstreams": http_client.latency_stats.snapshot()
     }), 200
 
-# Publish message to RabbitMQ
-def publish_to_rabbitmq(routing_key, message):
-    """Publish a message to RabbitMQ"""
+# Only the restaurant columns bookings need
+RESTAURANT_FIELDS = ["name", "capacity"]
+
+def fetch_user(user_id, timeout):
+    # (name, phone) for the notifications; a failed lookup falls back to placeholders
     try:
-        # Connect to RabbitMQ
-        connection = pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=RABBITMQ_HOST,
-                port=RABBITMQ_PORT
-            )
-        )
-        channel = connection.channel()
-        
-        # Ensure exchange exists
-        channel.exchange_declare(
-            exchange=RABBITMQ_EXCHANGE,
-            exchange_type=RABBITMQ_EXCHANGE_TYPE,
-            durable=True
-        )
-        
-        # Publish message
-        channel.basic_publish(
-            exchange=RABBITMQ_EXCHANGE,
-            routing_key=routing_key,
-            body=json.dumps(message)
+        user_data = get_users([user_id], CONTACT_FIELDS, timeout=timeout).get(user_id, {})
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to fetch user details: {str(e)}")
+        user_data = {}
+    return user_data.get("customer_name", "Customer"), user_data.get("phone_number", "")
+
+def fetch_restaurant(restaurant_id, timeout):
+    # (restaurant or None if it does not exist, error message if the lookup failed)
+    try:
+        return get_restaurants([restaurant_id], RESTAURANT_FIELDS, timeout=timeout).get(str(restaurant_id)), None
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to fetch restaurant details: {str(e)}")
+        return None, str(e)
+
+def hold_seat(restaurant_id, booking_time, capacity, timeout=None):
+    #Hold one seat in the restaurant's slot for booking_time on the capacity ledger.
+    #The capacity check and the hold are one atomic step there, so concurrent bookings cannot oversubscribe.
+    #:return: the hold id, or None if the slot is full.
+    response = http_client.post(
+        f"{CAPACITY_LEDGER_URL}/api/capacity/hold",
+        json={"restaurant_id": restaurant_id, "time": booking_time, "units": 1, "capacity": capacity},
+        timeout=timeout
+    )
+    if response.status_code == 409:
+        return None
+    response.raise_for_status()
+    return response.json()["data"]["hold_id"]
+
+def commit_seat(hold_id, restaurant_id, booking_time, timeout=None):
+    # The ledger commits the seat directly if the hold expired in the meantime, or if there was no hold
+    # because the ledger was unreachable when the booking was checked
+    try:
+        response = http_client.post(
+            f"{CAPACITY_LEDGER_URL}/api/capacity/commit",
+            json={"hold_id": hold_id, "restaurant_id": restaurant_id, "time": booking_time, "units": 1},
+            timeout=timeout
         )
-        
-        # Close connection
-        connection.close()
-        print(f"Published message to {routing_key}: {json.dumps(message)}")
-        return True
-    except Exception as e:
-        print(f"Error publishing to RabbitMQ: {e}")
-        return False
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"Warning: Failed to commit seat (hold {hold_id}) for restaurant {restaurant_id} at {booking_time}: {str(e)}")
+
+def release_seat(hold_id, timeout=None):
+    # Best effort: a hold that is not released expires on its own
+    try:
+        http_client.post(f"{CAPACITY_LEDGER_URL}/api/capacity/release", json={"hold_id": hold_id}, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        print(f"Warning: Failed to release seat hold {hold_id}: {str(e)}")
+
+def count_slot_reservations(restaurant_id, booking_time, timeout=None):
+    # Fallback capacity check while the ledger is unavailable (a read, then a write: not atomic).
+    # Counts the 'Booked' reservations in the booking's slot, the same figure the ledger seeds a slot with
+    start, end = slot_bounds(booking_time, CAPACITY_SLOT_MINUTES)
+    response = http_client.get(
+        f"{RESTAURANT_SERVICE_URL}/api/restaurants/{restaurant_id}/reservations/count",
+        params={"status": "Booked", "since": start.isoformat(), "until": end.isoformat()},
+        timeout=timeout
+    )
+    if not response.ok:
+        print(f"Warning: Failed to count reservations: {response.text}")
+        return 0
+    return response.json().get("data", {}).get("count", 0)
+
+def timed_response(body, fanout, status=200):
+    # Attach the per-step timings so clients (and browser dev tools) can see where the latency went
+    response = jsonify(body)
+    response.status_code = status
+    response.headers["Server-Timing"] = fanout.server_timing()
+    print(f"Create booking timings: {response.headers['Server-Timing']}")
+    return response
 
 # order create first, once success 200 then call reservation
 @app.route('/api/create', methods=['POST'])
 def create_booking():
+    fanout = FanOut(fanout_executor, REQUEST_DEADLINE, CALL_TIMEOUT)
     try:
         # Get request data
         data = request.json
@@ -92,10 +144,18 @@ def create_booking():
             if field not in data:
                 return jsonify({"error": f"Missing required field: {field}"}), 400
         
+        user_id = data['user_id']
+        restaurant_id = data['restaurant_id']
+        
+        # The user and restaurant lookups only depend on the request, so they are started now and run
+        # while the order is inserted; if the insert fails their results are simply not used
+        user_lookup = fanout.submit("lookup.user", lambda timeout: fetch_user(user_id, timeout))
+        restaurant_lookup = fanout.submit("lookup.restaurant", lambda timeout: fetch_restaurant(restaurant_id, timeout))
+        
         # Create the order with the appropriate order_type (dine_in or delivery)
         order_data = {
-            "user_id": data['user_id'],
-            "restaurant_id": data['restaurant_id'],
+            "user_id": user_id,
+            "restaurant_id": restaurant_id,
             "item_name": data['item_name'],
             "quantity": data['quantity'],
             "order_price": data['order_price'],
@@ -105,16 +165,17 @@ def create_booking():
         
         # Call order service to create the order
         print(f"Creating order with data: {order_data}")
-        order_response = requests.post(
+        order_response = fanout.call("order", lambda timeout: http_client.post(
             f"{ORDER_SERVICE_URL}/api/orders",
-            json=order_data
-        )
+            json=order_data,
+            timeout=timeout
+        ))
         
         if not order_response.ok:
             error_data = order_response.json()
-            return jsonify({
+            return timed_response({
                 "error": f"Failed to create order: {error_data.get('message', order_response.status_code)}"
-            }), order_response.status_code
+            }, fanout, order_response.status_code)
         
         # Get the created order details
         order_data = order_response.json()
@@ -123,53 +184,32 @@ def create_booking():
         # Get the order ID from the response
         order_id = order_data.get("data", {}).get("order_id")
         if not order_id:
-            return jsonify({"error": "Order ID not found in response"}), 500
+            return timed_response({"error": "Order ID not found in response"}, fanout, 500)
         
         # Handle delivery order vs. dine-in order
         if order_type == 'delivery':
             # For delivery orders, we're done - no reservation needed
+            # The order is committed, so the notification steps run to completion instead of ending in a 504
+            fanout.lift_deadline()
             # Queue a delivery confirmation message to RabbitMQ
             try:
-                # Get user details for notifications
-                user_id = data.get("user_id")
-                try:
-                    user_response = requests.get(f"{USER_SERVICE_URL}/api/user/{user_id}")
-                    user_response.raise_for_status()
-                    user_data = user_response.json()
-                    
-                    # Extract the user details we need
-                    user_name = user_data.get("data", {}).get("customer_name", "Customer")
-                    user_phone = user_data.get("data", {}).get("phone_number", "")
-                except requests.exceptions.RequestException as e:
-                    print(f"Failed to fetch user details: {str(e)}")
-                    user_name = "Customer"
-                    user_phone = ""
-                    
-                # Get restaurant details
-                restaurant_id = data['restaurant_id']
-                try:
-                    restaurant_response = requests.get(f"{RESTAURANT_SERVICE_URL}/api/restaurants/{restaurant_id}")
-                    restaurant_response.raise_for_status()
-                    restaurant_data = restaurant_response.json()
-                    
-                    # Extract restaurant name
-                    restaurant_name = restaurant_data.get("data", {}).get("name", f"Restaurant #{restaurant_id}")
-                except requests.exceptions.RequestException as e:
-                    print(f"Failed to fetch restaurant details: {str(e)}")
-                    restaurant_name = f"Restaurant #{restaurant_id}"
+                # User and restaurant details for the notification (usually finished during the order insert)
+                lookups = fanout.gather("wait.lookups", {"user": user_lookup, "restaurant": restaurant_lookup})
+                user_name, user_phone = lookups["user"]
+                restaurant_data, _ = lookups["restaurant"]
+                restaurant_name = (restaurant_data or {}).get("name", f"Restaurant #{restaurant_id}")
                 
-                notification_data = {
-                    "order_id": order_id,
-                    "user_id": user_id,
-                    "user_name": user_name,
-                    "user_phone": user_phone,
-                    "restaurant_id": restaurant_id,
-                    "restaurant_name": restaurant_name,
-                    "payment_id": data.get("payment_id"),
-                    "message_type": "delivery.order.confirmation"
-                }
+                notification_data = DeliveryOrderConfirmation(
+                    order_id=order_id,
+                    user_id=user_id,
+                    user_name=user_name,
+                    user_phone=user_phone,
+                    restaurant_id=restaurant_id,
+                    restaurant_name=restaurant_name,
+                    payment_id=data.get("payment_id"),
+                )
                 
-                notification_sent = publish_to_rabbitmq("delivery.order.confirmation", notification_data)
+                notification_sent = fanout.call("publish", lambda timeout: publish_to_rabbitmq("delivery.order.confirmation", notification_data))
                 
                 status_message = "Delivery order created and confirmation notification sent."
                 status_code = 201
@@ -179,93 +219,56 @@ def create_booking():
                     status_code = 207  # Partial success
                 
                 # Return response with appropriate message
-                return jsonify({
+                return timed_response({
                     "message": status_message,
                     "status": "booked",
                     "order_id": order_id,
                     "data": {
                         "order": order_data.get("data", {})
                     }
-                }), status_code
+                }, fanout, status_code)
                 
             except Exception as e:
                 print(f"Error in notification handling: {str(e)}")
                 # Return partial success since the order was created
-                return jsonify({
+                return timed_response({
                     "message": "Delivery order created but notification could not be sent.",
                     "status": "booked",
                     "order_id": order_id,
                     "data": {
                         "order": order_data.get("data", {})
                     }
-                }), 207
+                }, fanout, 207)
         
         # here, means is a dine-in order alr
-        # Get restaurant capacity and current reservations
-        restaurant_id = data['restaurant_id']
+        # The restaurant lookup gives both the capacity and the name used in the notifications
         print(f"Checking capacity for restaurant {restaurant_id}")
-        capacity_response = requests.get(
-            f"{RESTAURANT_SERVICE_URL}/api/restaurants/capacity/{restaurant_id}"
-        )
-        
-        if not capacity_response.ok:
-            error_data = capacity_response.json()
-            return jsonify({
-                "error": f"Failed to check restaurant capacity: {error_data.get('message', capacity_response.status_code)}"
-            }), capacity_response.status_code
-            
-        capacity_data = capacity_response.json()
-        restaurant_capacity = capacity_data.get("data", {}).get("capacity", 0)
-        
-        # We need to count only dine-in orders against capacity
-        # First, get all orders with order_type = "dine_in" for this restaurant
-        dine_in_orders_response = requests.get(
-            f"{ORDER_SERVICE_URL}/api/orders/restaurant/{restaurant_id}/type/dine_in"
-        )
-        
-        dine_in_count = 0
-        if dine_in_orders_response.ok:
-            orders_data = dine_in_orders_response.json()
-            dine_in_orders = orders_data.get("data", {}).get("orders", [])
-            dine_in_count = len(dine_in_orders)
-        else:
-            print(f"Warning: Failed to retrieve dine-in orders: {dine_in_orders_response.text}")
-        
-        # Use dine_in_count instead of current_reservations
-        current_reservations = dine_in_count
-        available_slots = max(0, restaurant_capacity - current_reservations)
-        
-        print(f"Restaurant capacity: {restaurant_capacity}, Current dine-in reservations: {current_reservations}")
+        restaurant_data, restaurant_error = fanout.gather("wait.restaurant", {"restaurant": restaurant_lookup})["restaurant"]
+        if restaurant_error:
+            return timed_response({
+                "error": f"Failed to check restaurant capacity: {restaurant_error}"
+            }, fanout, 500)
+        if not restaurant_data:
+            return timed_response({
+                "error": "Failed to check restaurant capacity: Restaurant not found."
+            }, fanout, 404)
+
+        restaurant_capacity = restaurant_data.get("capacity") or 0
+        restaurant_name = restaurant_data.get("name", f"Restaurant #{restaurant_id}")
         
-        # Get user details for notifications
-        user_id = data.get("user_id")
+        # Hold a seat in the booking's time slot; the hold is committed once the reservation exists
         try:
-            user_response = requests.get(f"{USER_SERVICE_URL}/api/user/{user_id}")
-            user_response.raise_for_status()
-            user_data = user_response.json()
-            
-            # Extract the user details we need
-            user_name = user_data.get("data", {}).get("customer_name", "Customer")
-            user_phone = user_data.get("data", {}).get("phone_number", "")
+            hold_id = fanout.call("capacity", lambda timeout: hold_seat(restaurant_id, data['time'], restaurant_capacity, timeout))
+            at_capacity = hold_id is None
         except requests.exceptions.RequestException as e:
-            print(f"Failed to fetch user details: {str(e)}")
-            user_name = "Customer"
-            user_phone = ""
-            
-        # Get restaurant details
-        try:
-            restaurant_response = requests.get(f"{RESTAURANT_SERVICE_URL}/api/restaurants/{restaurant_id}")
-            restaurant_response.raise_for_status()
-            restaurant_data = restaurant_response.json()
-            
-            # Extract restaurant name
-            restaurant_name = restaurant_data.get("data", {}).get("name", f"Restaurant #{restaurant_id}")
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to fetch restaurant details: {str(e)}")
-            restaurant_name = f"Restaurant #{restaurant_id}"
+            print(f"Warning: Capacity ledger unavailable, counting the slot's reservations instead: {str(e)}")
+            hold_id = None
+            at_capacity = fanout.call("capacity_count", lambda timeout: count_slot_reservations(restaurant_id, data['time'], timeout)) >= restaurant_capacity
+        
+        print(f"Restaurant capacity: {restaurant_capacity}, At capacity: {at_capacity}")
             
         # Check if restaurant is at capacity
-        if current_reservations >= restaurant_capacity:
+        if at_capacity:
             print(f"Restaurant at capacity. Adding user to waitlist.")
             
             # Add user to waitlist via OutSystems API
@@ -277,50 +280,55 @@ def create_booking():
             }
             
             try:
-                waitlist_response = requests.post(
-                    "https://qks.outsystemscloud.com/Waitlist_Service/rest/waitlist/addUser",
-                    json=waitlist_data
-                )
+                waitlist_response = fanout.call("waitlist", lambda timeout: http_client.post(
+                    WAITLIST_URL,
+                    json=waitlist_data,
+                    timeout=timeout
+                ), call_timeout=WAITLIST_TIMEOUT)
+                # The user is on the waitlist now; the notification steps must not turn that into an error
+                fanout.lift_deadline()
+                
+                # User details for the notification (started before the order insert)
+                user_name, user_phone = fanout.gather("wait.user", {"user": user_lookup})["user"]
                 
                 # Queue waitlist notification to RabbitMQ
-                notification_data = {
-                    "user_id": user_id,
-                    "user_name": user_name,
-                    "user_phone": user_phone,
-                    "restaurant_id": restaurant_id,
-                    "restaurant_name": restaurant_name,
-                    "time": data.get("time"),
-                    "count": data.get("count"),
-                    "payment_id": data.get("payment_id"),
-                    "order_id": order_id,
-                    "message_type": "waitlist.notification"
-                }
+                notification_data = WaitlistNotification(
+                    user_id=user_id,
+                    user_name=user_name,
+                    user_phone=user_phone,
+                    restaurant_id=restaurant_id,
+                    restaurant_name=restaurant_name,
+                    time=data.get("time"),
+                    count=data.get("count"),
+                    payment_id=data.get("payment_id"),
+                    order_id=order_id,
+                )
                 
-                notification_sent = publish_to_rabbitmq("waitlist.notification", notification_data)
+                notification_sent = fanout.call("publish", lambda timeout: publish_to_rabbitmq("waitlist.notification", notification_data))
                 
                 if not notification_sent:
                     print("Warning: Could not send waitlist notification (RabbitMQ issue).")
                 
                 # Return response indicating waitlist status
-                return jsonify({
+                return timed_response({
                     "message": "Restaurant is at capacity. You have been added to the waitlist.",
                     "status": "waitlisted",
                     "order_id": order_id,
                     "data": {
                         "order": order_data.get("data", {})
                     }
-                }), 200
+                }, fanout, 200)
                 
             except Exception as e:
                 print(f"Error adding to waitlist: {str(e)}")
-                return jsonify({
+                return timed_response({
                     "error": f"Failed to add to waitlist: {str(e)}"
-                }), 500
+                }, fanout, 500)
         
         # If we reach here, there's capacity available, create the reservation
         reservation_data = {
-            "restaurant_id": data['restaurant_id'],
-            "user_id": data['user_id'],
+            "restaurant_id": restaurant_id,
+            "user_id": user_id,
             "table_no": data.get('table_no'),
             "status": data.get('status', 'Booked'),
             "count": data['count'],
@@ -332,55 +340,88 @@ def create_booking():
         
         # Call reservation service
         print(f"Creating reservation with data: {reservation_data}")
-        reservation_response = requests.post(
-            f"{RESERVATION_SERVICE_URL}/api/reservations",
-            json=reservation_data
-        )
+        try:
+            reservation_response = fanout.call("reservation", lambda timeout: http_client.post(
+                f"{RESERVATION_SERVICE_URL}/api/reservations",
+                json=reservation_data,
+                timeout=timeout
+            ))
+        except Exception:
+            # Timed out (or failed) before the reservation was confirmed: give the held seat back
+            if hold_id:
+                release_seat(hold_id)
+            raise
         
         if not reservation_response.ok:
+            if hold_id:
+                release_seat(hold_id)
             error_data = reservation_response.json()
-            return jsonify({
+            return timed_response({
                 "error": f"Failed to create reservation: {error_data.get('message', reservation_response.status_code)}"
-            }), reservation_response.status_code
+            }, fanout, reservation_response.status_code)
         
         # Get the created reservation details
         reservation_data = reservation_response.json()
         print(f"Reservation created: {reservation_data}")
         
-        # Update order type to "dine_in"
-        order_update_response = requests.patch(
-            f"{ORDER_SERVICE_URL}/api/orders/{order_id}/type",
-            json={"order_type": "dine_in"}
-        )
+        # The booking is committed: from here on the deadline no longer applies and failures are only
+        # reported, so the client never gets a 504 for a booking that exists
+        fanout.lift_deadline()
         
-        if not order_update_response.ok:
-            print(f"Warning: Failed to update order type: {order_update_response.text}")
+        # Update order type to "dine_in" and commit the seat on the ledger; neither depends on the other.
+        # A booking checked by the fallback count (no hold) is committed too, so a slot the ledger already
+        # holds in memory does not undercount it (a slot it has not loaded is seeded with it included)
+        finalize = {
+            "order_type": lambda timeout: http_client.patch(
+                f"{ORDER_SERVICE_URL}/api/orders/{order_id}/type",
+                json={"order_type": "dine_in"},
+                timeout=timeout
+            ),
+            "seat": lambda timeout: commit_seat(hold_id, restaurant_id, data['time'], timeout),
+        }
+        try:
+            order_update_response = fanout.run("finalize", finalize)["order_type"]
+            if not order_update_response.ok:
+                print(f"Warning: Failed to update order type: {order_update_response.text}")
+        except requests.exceptions.RequestException as e:
+            print(f"Warning: Failed to update order type: {str(e)}")
         
         # Get the reservation ID from the response
         reservation_id = reservation_data.get("data", {}).get("reservation_id")
         if not reservation_id:
-            return jsonify({"error": "Reservation ID not found in response"}), 500
+            return timed_response({"error": "Reservation ID not found in response"}, fanout, 500)
+        
+        # User details for the notification (started before the order insert)
+        user_name, user_phone = fanout.gather("wait.user", {"user": user_lookup})["user"]
         
         # Once the reservation is created, send a confirmation notification
-        notification_data = {
-            "reservation_id": reservation_id,
-            "user_id": user_id,
-            "user_name": user_name,
-            "user_phone": user_phone,
-            "table_no": reservation_data.get("table_no", ""),
-            "booking_time": data.get("time"),
-            "restaurant_name": restaurant_name,
-            "message_type": "reservation.confirmation"
-        }
+        notification_data = ReservationConfirmation(
+            reservation_id=reservation_id,
+            user_id=user_id,
+            user_name=user_name,
+            user_phone=user_phone,
+            table_no=reservation_data.get("table_no", ""),
+            booking_time=data.get("time"),
+            restaurant_name=restaurant_name,
+        )
+        
+        try:
+            notification_sent = fanout.call("publish", lambda timeout: publish_to_rabbitmq("reservation.confirmation", notification_data))
+        except Exception as e:
+            print(f"Error in notification handling: {str(e)}")
+            notification_sent = False
         
-        notification_sent = publish_to_rabbitmq("reservation.confirmation", notification_data)
+        status_message = "Booking created and confirmation notification sent."
+        status_code = 201
         
         if not notification_sent:
             print("Warning: Could not send notification (RabbitMQ issue).")
+            status_message = "Booking created but notification could not be sent (RabbitMQ issue)."
+            status_code = 207  # Partial success
         
         # Return response with appropriate message
-        return jsonify({
-            "message": "Booking created and confirmation notification sent.",
+        return timed_response({
+            "message": status_message,
             "status": "booked",
             "order_id": order_id,
             "reservation_id": reservation_id,
@@ -388,13 +429,18 @@ def create_booking():
                 "order": order_data.get("data", {}),
                 "reservation": reservation_data.get("data", {})
             }
-        }), 201
+        }, fanout, status_code)
     
+    except (DeadlineExceeded, requests.exceptions.Timeout) as e:
+        print(f"Timed out in create_booking: {str(e)}")
+        return timed_response({"error": "Timed out while creating the booking."}, fanout, 504)
     except Exception as e:
         print(f"Error in create_booking: {str(e)}")
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
 if __name__ == '__main__':
+    # Relay events a previous run left in the outbox
+    start_outbox_relay()
     port = int(os.environ.get('PORT', 5007))
     print("Starting create_booking service...")
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=True)
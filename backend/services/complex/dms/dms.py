@@ -1,9 +1,12 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
 import requests
+from common import http_client
+from common.lookups import get_users, get_restaurants
 from dotenv import load_dotenv
 from datetime import datetime
+from common.fanout import DeadlineExceeded, FanOut, create_executor
 load_dotenv()
 
 app = Flask(__name__)
@@ -12,68 +15,114 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 # Base URLs for the services
 ORDER_SERVICE_URL = os.getenv('ORDER_SERVICE_URL', 'http://order-service:5000')
 DRIVER_SERVICE_URL = os.getenv('DRIVER_SERVICE_URL', 'http://driver-service:5000')
-USER_SERVICE_URL = os.getenv('USER_SERVICE_URL', 'http://user-service:5000')
-RESTAURANT_SERVICE_URL = os.getenv('RESTAURANT_SERVICE_URL', 'http://restaurant-service:5000')
 DRIVERDETAIL_SERVICE_URL = os.getenv('DRIVERDETAIL_SERVICE_URL', 'http://driver-details-service:5000')
 GEOCODING_SERVICE_URL = os.getenv('GEOCODING_SERVICE_URL', 'http://geo-service:5000')
 
-def get_driver_address(driver_id):
-    #Fetch the driver's address from the DRIVER_SERVICE_URL.
-    #:param driver_id: The ID of the driver.
-    #:return: The driver's address (string) or None if not found.
-    try:
-        driver_response = requests.get(f"{DRIVER_SERVICE_URL}/api/driver/{driver_id}")
-        if driver_response.status_code == 200:
-            driver_data = driver_response.json().get("data", {})
-            return driver_data.get("street_address", None)  # key for the driver's address
-        else:
-            print(f"Failed to fetch driver address for driver_id: {driver_id}. Status code: {driver_response.status_code}")
-            return None
-    except Exception as e:
-        print(f"Error fetching driver address: {str(e)}")
+# Upstream calls that do not depend on each other run concurrently on this shared pool
+FANOUT_WORKERS = int(os.getenv('DMS_FANOUT_WORKERS', 16))
+CALL_TIMEOUT = float(os.getenv('DMS_CALL_TIMEOUT', 5))  # seconds per upstream call
+GEO_TIMEOUT = float(os.getenv('DMS_GEO_TIMEOUT', 25))  # the geo service may have to geocode new addresses
+REQUEST_DEADLINE = float(os.getenv('DMS_REQUEST_DEADLINE', 30))  # seconds for the whole request
+fanout_executor = create_executor(FANOUT_WORKERS)
+
+def stored_coordinates(row):
+    #"latitude,longitude" from the coordinates stored on a restaurant / customer row (None if not geocoded yet),
+    #so the geo service does not have to geocode the address text.
+    if not row or row.get("latitude") is None or row.get("longitude") is None:
         return None
+    return f"{row['latitude']},{row['longitude']}"
+
+def fetch_customers(delivery_orders, timeout):
+    # Every customer referenced by the orders in one call, only the columns the dispatch view needs
+    try:
+        return get_users(
+            [order.get("user_id") for order in delivery_orders if order.get("user_id")],
+            ["customer_name", "street_address", "latitude", "longitude"],
+            timeout=timeout
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching customer details: {str(e)}")
+        return {}
+
+def fetch_restaurants(delivery_orders, timeout):
+    # Same for the restaurants the orders belong to
+    try:
+        return get_restaurants(
+            [order.get("restaurant_id") for order in delivery_orders if order.get("restaurant_id") is not None],
+            ["name", "address", "latitude", "longitude"],
+            timeout=timeout
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching restaurant details: {str(e)}")
+        return {}
+
+def timed_response(body, fanout, status=200):
+    # Attach the per-stage timings so clients (and browser dev tools) can see where the latency went
+    response = body if isinstance(body, Response) else jsonify(body)
+    response.status_code = status
+    response.headers["Server-Timing"] = fanout.server_timing()
+    print(f"Delivery management timings: {response.headers['Server-Timing']}")
+    return response
 
 @app.route("/api/dms/health", methods=['GET'])
 def health_check():
     return jsonify({
         "status": "healthy",
         "service": "dms-service",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "upstreams": http_client.latency_stats.snapshot()
     }), 200
     
 @app.route("/api/delivery-management", methods=['GET'])
 def get_delivery_management_data():
+    fanout = FanOut(fanout_executor, REQUEST_DEADLINE, CALL_TIMEOUT)
     try:
         # Get driver_id from query parameter (required)
         driver_id = request.args.get("driver_id")
         if not driver_id:
             return jsonify({"code": 400, "message": "Missing driver_id."}), 400
 
+        # Stage 1: the driver, their live details and all delivery orders only depend on driver_id
+        upstream = fanout.run("upstream", {
+            "driver": lambda timeout: http_client.get(f"{DRIVER_SERVICE_URL}/api/driver/{driver_id}", timeout=timeout),
+            "orders": lambda timeout: http_client.get(f"{ORDER_SERVICE_URL}/api/orders/type/delivery", timeout=timeout),
+            "driver_details": lambda timeout: http_client.get(f"{DRIVERDETAIL_SERVICE_URL}/api/driverdetails/{driver_id}", timeout=timeout),
+        })
+
         # Fetch the logged-in driver's details
-        driver_response = requests.get(f"{DRIVER_SERVICE_URL}/api/driver/{driver_id}")
+        driver_response = upstream["driver"]
         if driver_response.status_code != 200:
-            return jsonify({"code": 404, "message": "Driver not found."}), 404
+            return timed_response({"code": 404, "message": "Driver not found."}, fanout, 404)
         driver_data = driver_response.json().get("data", {})
+        driver_address = driver_data.get("street_address")  # key for the driver's address
 
         # Fetch all delivery orders (regardless of driver assignment)
-        order_response = requests.get(f"{ORDER_SERVICE_URL}/api/orders/type/delivery")
+        order_response = upstream["orders"]
         if order_response.status_code != 200:
-            return jsonify({"code": 500, "message": "Failed to fetch delivery orders."}), 500
+            return timed_response({"code": 500, "message": "Failed to fetch delivery orders."}, fanout, 500)
         delivery_orders = order_response.json().get("data", {}).get("orders", [])
         if not delivery_orders:
             # Return empty restaurants list with 200 status code instead of 404 error
-            return jsonify({
+            return timed_response({
                 "code": 200,
                 "data": {
                     "driver": {
                         "id": driver_id,
                         "name": driver_data.get("driver_name", "Unknown"),
-                        "location": get_driver_address(driver_id) or "Unknown",
+                        "location": driver_address or "Unknown",
                         "availability": True
                     },
                     "restaurants": []
                 }
-            }), 200
+            }, fanout)
+
+        # Stage 2: customers and restaurants of the orders, one batch call each, in parallel
+        enrich = fanout.run("enrich", {
+            "customers": lambda timeout: fetch_customers(delivery_orders, timeout),
+            "restaurants": lambda timeout: fetch_restaurants(delivery_orders, timeout),
+        })
+        customers = enrich["customers"]
+        restaurant_details = enrich["restaurants"]
 
         # Group orders by restaurant
         restaurants = {}  # Key: restaurant_id, Value: {restaurant details + orders}
@@ -82,10 +131,9 @@ def get_delivery_management_data():
             restaurant_id = order.get("restaurant_id")
             customer_id = order.get("user_id")
 
-            # Fetch restaurant details if not already cached
+            # Start a group the first time a restaurant is seen
             if restaurant_id not in restaurants:
-                restaurant_resp = requests.get(f"{RESTAURANT_SERVICE_URL}/api/restaurants/{restaurant_id}")
-                restaurant_data = restaurant_resp.json().get("data") if restaurant_resp.status_code == 200 else None
+                restaurant_data = restaurant_details.get(str(restaurant_id))
                 if not restaurant_data:
                     continue  # Skip invalid restaurants
 
@@ -93,12 +141,11 @@ def get_delivery_management_data():
                     "restaurant_id": restaurant_id,
                     "name": restaurant_data.get("name", "Unknown"),
                     "location": restaurant_data.get("address", "Unknown"),
+                    "coordinates": stored_coordinates(restaurant_data),
                     "orders": []
                 }
 
-            # Fetch customer details
-            customer_resp = requests.get(f"{USER_SERVICE_URL}/api/user/{customer_id}")
-            customer_data = customer_resp.json().get("data") if customer_resp.status_code == 200 else None
+            customer_data = customers.get(customer_id)
 
             # Build order details 
             order_details = {
@@ -107,7 +154,8 @@ def get_delivery_management_data():
                 "customer": {
                     "id": customer_id,
                     "name": customer_data.get("customer_name", "Unknown") if customer_data else "Unknown",
-                    "location": customer_data.get("street_address", "Unknown") if customer_data else "Unknown"
+                    "location": customer_data.get("street_address", "Unknown") if customer_data else "Unknown",
+                    "coordinates": stored_coordinates(customer_data)
                 }
             }
 
@@ -117,15 +165,14 @@ def get_delivery_management_data():
         # Convert restaurants dictionary to list
         restaurant_list = list(restaurants.values())
 
-        # Fetch detailed driver details from the driverdetails service
-        detailed_driver_response = requests.get(f"{DRIVERDETAIL_SERVICE_URL}/api/driverdetails/{driver_id}")
+        # Detailed driver details from the driverdetails service (fetched in stage 1)
+        detailed_driver_response = upstream["driver_details"]
         if detailed_driver_response.status_code == 404:  # Driver details not found, create a new record
             print(f"No driver details found for driver_id: {driver_id}. Creating a new record.")
 
-            # Fetch the driver's address
-            driver_address = get_driver_address(driver_id)
+            # The driver's address comes from the profile fetched in stage 1
             if not driver_address:
-                return jsonify({"code": 404, "message": "Driver's address not found."}), 404
+                return timed_response({"code": 404, "message": "Driver's address not found."}, fanout, 404)
 
             # Create a new driver details record with the address as the default live_location
             new_driver_payload = {
@@ -133,10 +180,13 @@ def get_delivery_management_data():
                 "live_location": driver_address,
                 "availability": True
             }
-            create_response = requests.post(f"{DRIVERDETAIL_SERVICE_URL}/api/driverdetails", json=new_driver_payload)
+            create_response = fanout.call(
+                "driver_details_create",
+                lambda timeout: http_client.post(f"{DRIVERDETAIL_SERVICE_URL}/api/driverdetails", json=new_driver_payload, timeout=timeout)
+            )
             if create_response.status_code not in [200, 201]:
                 print(f"Error creating driver details: {create_response.status_code}, {create_response.text}")
-                return jsonify({"code": 500, "message": "Failed to create driver details."}), 500
+                return timed_response({"code": 500, "message": "Failed to create driver details."}, fanout, 500)
 
             # Extract the newly created driver details
             detailed_driver_data = create_response.json().get("data", {})
@@ -144,10 +194,7 @@ def get_delivery_management_data():
             detailed_driver_data = detailed_driver_response.json().get("data", {})
         else:
             print(f"Error fetching driver details: {detailed_driver_response.status_code}, {detailed_driver_response.text}")
-            return jsonify({"code": 500, "message": "Failed to fetch driver details."}), 500
-        
-        # Extract data from the response
-        detailed_driver_data = detailed_driver_response.json().get("data", {})
+            return timed_response({"code": 500, "message": "Failed to fetch driver details."}, fanout, 500)
 
         # Combine driver details (basic + detailed)
 
@@ -158,31 +205,54 @@ def get_delivery_management_data():
             "availability": detailed_driver_data.get("availability", True)  # From driverdetails service
         }
 
-        # If live_location is None, fetch the driver's address as fallback
+        # If live_location is None, fall back to the driver's address
         if not driver_details["location"]:
-            driver_address = get_driver_address(driver_id)
             if driver_address:
                 driver_details["location"] = driver_address  # Pass the raw address
                 print(f"Default live_location set to driver's address: {driver_address}")
             else:
-                return jsonify({"code": 404, "message": "Driver's address not found."}), 404
+                return timed_response({"code": 404, "message": "Driver's address not found."}, fanout, 404)
             
         
-        # Call the geocoding service to filter nearby restaurants
+        # Stage 3: call the geocoding service to filter nearby restaurants
         geo_payload = {
             "data": {
                 "driver": driver_details,
                 "restaurants": restaurant_list
             }
         }
-        geo_response = requests.post(f"{GEOCODING_SERVICE_URL}/api/nearby-restaurants", json=geo_payload)
+        # With ?stream=1 the geo service's NDJSON lines are relayed to the client as each restaurant resolves
+        stream = request.args.get("stream", "").lower() in ("1", "true", "yes")
+        geo_url = f"{GEOCODING_SERVICE_URL}/api/nearby-restaurants"
+        geo_response = fanout.call(
+            "geo",
+            lambda timeout: http_client.post(f"{geo_url}?stream=1" if stream else geo_url, json=geo_payload, stream=stream, timeout=timeout),
+            GEO_TIMEOUT
+        )
         if geo_response.status_code != 200:
             print(f"Error calling geocoding service: {geo_response.status_code}, {geo_response.text}")
-            return jsonify({"code": 500, "message": "Failed to fetch nearby restaurants."}), 500
+            return timed_response({"code": 500, "message": "Failed to fetch nearby restaurants."}, fanout, 500)
+
+        if stream:
+            def relay():
+                try:
+                    for line in geo_response.iter_lines():
+                        if line:
+                            yield line + b"\n"
+                finally:
+                    geo_response.close()
+
+            response = Response(stream_with_context(relay()), mimetype="application/x-ndjson")
+            response.headers["Cache-Control"] = "no-cache"
+            response.headers["X-Accel-Buffering"] = "no"
+            return timed_response(response, fanout)  # timings up to the first byte from the geo service
 
         # Return the response from the geocoding service
-        return geo_response.json()
+        return timed_response(geo_response.json(), fanout)
 
+    except (DeadlineExceeded, requests.exceptions.Timeout) as e:
+        print(f"Timed out fetching delivery management data: {str(e)}")
+        return timed_response({"code": 504, "message": "Timed out while fetching data."}, fanout, 504)
     except Exception as e:
         print(f"Error fetching delivery management data: {str(e)}")
         return jsonify({"code": 500, "message": "An error occurred while fetching data."}), 500
@@ -1,9 +1,10 @@
-import json
 import time
-import requests
+from common import http_client
+from common.lookups import CONTACT_FIELDS, get_users
+from common.amqp_publisher import publish_to_rabbitmq, start_outbox_relay
+from common.events import DeliveryOrderAccepted, DeliveryOrderPickedUp, DeliveryOrderDelivered
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import pika
 import os
 from dotenv import load_dotenv
 from datetime import datetime
@@ -11,14 +12,7 @@ from datetime import datetime
 # Load environment variables
 load_dotenv()
 
-# RabbitMQ configuration
-RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", "localhost")
-RABBITMQ_PORT = int(os.environ.get("RABBITMQ_PORT", 5672))
-RABBITMQ_EXCHANGE = "notification_topic"
-RABBITMQ_EXCHANGE_TYPE = "topic"
-
 # Service URLs
-USER_SERVICE_URL = os.environ.get("USER_SERVICE_URL", "http://user-service:5000")
 ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://order-service:5004")
 DRIVER_SERVICE_URL = os.environ.get("DRIVER_SERVICE_URL", "http://driver-service:5011")
 DRIVER_DETAILS_SERVICE_URL = os.environ.get("DRIVER_DETAILS_SERVICE_URL", "http://driver-details-service:5012")
@@ -31,45 +25,11 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "service": "driver-status-service",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "upstreams": http_client.latency_stats.snapshot()
     }), 200
     
     
-# Publish message to RabbitMQ
-def publish_to_rabbitmq(routing_key, message):
-    """Publish a message to RabbitMQ"""
-    try:
-        # Connect to RabbitMQ
-        connection = pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=RABBITMQ_HOST,
-                port=RABBITMQ_PORT
-            )
-        )
-        channel = connection.channel()
-        
-        # Ensure exchange exists
-        channel.exchange_declare(
-            exchange=RABBITMQ_EXCHANGE,
-            exchange_type=RABBITMQ_EXCHANGE_TYPE,
-            durable=True
-        )
-        
-        # Publish message
-        channel.basic_publish(
-            exchange=RABBITMQ_EXCHANGE,
-            routing_key=routing_key,
-            body=json.dumps(message)
-        )
-        
-        # Close connection
-        connection.close()
-        print(f"Published message to {routing_key}: {json.dumps(message)}")
-        return True
-    except Exception as e:
-        print(f"Error publishing to RabbitMQ: {e}")
-        return False
-
 @app.route("/api/accept-order", methods=['POST'])
 def accept_order():
     try:
@@ -82,7 +42,7 @@ def accept_order():
             return jsonify({"code": 400, "message": "Missing driver_id or order_id."}), 400
 
         # Update Driver Availability
-        driver_response = requests.patch(
+        driver_response = http_client.patch(
             f"{DRIVER_DETAILS_SERVICE_URL}/api/driverdetails/{driver_id}",
             json={"availability": False}
         )
@@ -90,7 +50,7 @@ def accept_order():
             return jsonify({"code": 500, "message": "Failed to update driver availability."}), 500
         
         # Fetch driver profile to get driver information
-        driver_profile_response = requests.get(f"{DRIVER_SERVICE_URL}/api/driver/{driver_id}")
+        driver_profile_response = http_client.get(f"{DRIVER_SERVICE_URL}/api/driver/{driver_id}")
         if driver_profile_response.status_code != 200:
             return jsonify({"code": 500, "message": "Failed to fetch driver profile."}), 500
 
@@ -98,7 +58,7 @@ def accept_order():
         driver_name = driver_data.get("driver_name", "Driver")  # Use the correct key for driver name
 
         # Fetch Order Details
-        order_response = requests.get(f"{ORDER_SERVICE_URL}/api/orders/{order_id}")
+        order_response = http_client.get(f"{ORDER_SERVICE_URL}/api/orders/{order_id}")
         if order_response.status_code != 200:
             return jsonify({"code": 404, "message": "Order not found."}), 404
 
@@ -107,24 +67,22 @@ def accept_order():
      
 
         # Fetch Customer Details
-        customer_response = requests.get(f"{USER_SERVICE_URL}/api/user/{customer_id}")
-        if customer_response.status_code != 200:
+        customer_data = get_users([customer_id], CONTACT_FIELDS).get(customer_id)
+        if not customer_data:
             return jsonify({"code": 500, "message": "Failed to fetch customer details."}), 500
 
-        customer_data = customer_response.json().get("data", {})
         customer_phone = customer_data.get("phone_number", None)
         customer_name = customer_data.get("customer_name", "Customer")  # Use the correct key for customer name
 
         # Publish Message to RabbitMQ
-        message = {
-            "order_id": order_id,
-            "customer_id": customer_id,
-            "user_phone": customer_phone,
-            "driver_id": driver_id,
-            "driver_name": driver_name,
-            "customer_name": customer_name,
-            "message_type": "delivery.order.accepted",
-        }
+        message = DeliveryOrderAccepted(
+            order_id=order_id,
+            customer_id=customer_id,
+            user_phone=customer_phone,
+            driver_id=driver_id,
+            driver_name=driver_name,
+            customer_name=customer_name,
+        )
         publish_to_rabbitmq("delivery.order.accepted", message)
 
         # Return success response
@@ -147,7 +105,7 @@ def pick_up_order():
             return jsonify({"code": 400, "message": "Missing driver_id or order_id."}), 400
         
         # Fetch driver profile to get driver information
-        driver_profile_response = requests.get(f"{DRIVER_SERVICE_URL}/api/driver/{driver_id}")
+        driver_profile_response = http_client.get(f"{DRIVER_SERVICE_URL}/api/driver/{driver_id}")
         if driver_profile_response.status_code != 200:
             return jsonify({"code": 500, "message": "Failed to fetch driver profile."}), 500
 
@@ -155,7 +113,7 @@ def pick_up_order():
         driver_name = driver_data.get("driver_name", "Driver")  # Use the correct key for driver name
 
         # Fetch Order Details
-        order_response = requests.get(f"{ORDER_SERVICE_URL}/api/orders/{order_id}")
+        order_response = http_client.get(f"{ORDER_SERVICE_URL}/api/orders/{order_id}")
         if order_response.status_code != 200:
             return jsonify({"code": 404, "message": "Order not found."}), 404
 
@@ -164,24 +122,22 @@ def pick_up_order():
      
 
         # Fetch Customer Details
-        customer_response = requests.get(f"{USER_SERVICE_URL}/api/user/{customer_id}")
-        if customer_response.status_code != 200:
+        customer_data = get_users([customer_id], CONTACT_FIELDS).get(customer_id)
+        if not customer_data:
             return jsonify({"code": 500, "message": "Failed to fetch customer details."}), 500
 
-        customer_data = customer_response.json().get("data", {})
         customer_phone = customer_data.get("phone_number", None)
         customer_name = customer_data.get("customer_name", "Customer")  # Use the correct key for customer name
 
         # Publish Message to RabbitMQ
-        message = {
-            "order_id": order_id,
-            "customer_id": customer_id,
-            "user_phone": customer_phone,
-            "driver_id": driver_id,
-            "driver_name": driver_name,
-            "customer_name": customer_name,
-            "message_type": "delivery.order.pickedup",
-        }
+        message = DeliveryOrderPickedUp(
+            order_id=order_id,
+            customer_id=customer_id,
+            user_phone=customer_phone,
+            driver_id=driver_id,
+            driver_name=driver_name,
+            customer_name=customer_name,
+        )
         publish_to_rabbitmq("delivery.order.pickedup", message)
 
         # Return success response
@@ -205,7 +161,7 @@ def deliver_order():
             return jsonify({"code": 400, "message": "Missing driver_id or order_id."}), 400
 
         # Step 1: Update Driver Availability
-        driver_response = requests.patch(
+        driver_response = http_client.patch(
             f"{DRIVER_DETAILS_SERVICE_URL}/api/driverdetails/{driver_id}",
             json={"availability": True}
         )
@@ -213,7 +169,7 @@ def deliver_order():
             return jsonify({"code": 500, "message": "Failed to update driver availability."}), 500
             
         # Step 1.5: Update driver's delivery counts and earnings
-        delivery_stats_response = requests.patch(
+        delivery_stats_response = http_client.patch(
             f"{DRIVER_DETAILS_SERVICE_URL}/api/driverdetails/{driver_id}/complete-delivery"
         )
         if delivery_stats_response.status_code != 200:
@@ -223,7 +179,7 @@ def deliver_order():
             print("Successfully updated driver delivery stats")
         
         # step 2 Fetch driver profile to get driver information
-        driver_profile_response = requests.get(f"{DRIVER_SERVICE_URL}/api/driver/{driver_id}")
+        driver_profile_response = http_client.get(f"{DRIVER_SERVICE_URL}/api/driver/{driver_id}")
         if driver_profile_response.status_code != 200:
             return jsonify({"code": 500, "message": "Failed to fetch driver profile."}), 500
 
@@ -231,7 +187,7 @@ def deliver_order():
         driver_name = driver_data.get("driver_name", "Driver")  # Use the correct key for driver name
 
         # Step 3: Fetch Order Details
-        order_response = requests.get(f"{ORDER_SERVICE_URL}/api/orders/{order_id}")
+        order_response = http_client.get(f"{ORDER_SERVICE_URL}/api/orders/{order_id}")
         if order_response.status_code != 200:
             return jsonify({"code": 404, "message": "Order not found."}), 404
 
@@ -240,24 +196,22 @@ def deliver_order():
      
 
         # Step 4: Fetch Customer Details
-        customer_response = requests.get(f"{USER_SERVICE_URL}/api/user/{customer_id}")
-        if customer_response.status_code != 200:
+        customer_data = get_users([customer_id], CONTACT_FIELDS).get(customer_id)
+        if not customer_data:
             return jsonify({"code": 500, "message": "Failed to fetch customer details."}), 500
 
-        customer_data = customer_response.json().get("data", {})
         customer_phone = customer_data.get("phone_number", None)
         customer_name = customer_data.get("customer_name", "Customer")  # Use the correct key for customer name
 
         # Publish Message to RabbitMQ
-        message = {
-            "order_id": order_id,
-            "customer_id": customer_id,
-            "user_phone": customer_phone,
-            "driver_id": driver_id,
-            "driver_name": driver_name,
-            "customer_name": customer_name,
-            "message_type": "delivery.order.delivered",
-        }
+        message = DeliveryOrderDelivered(
+            order_id=order_id,
+            customer_id=customer_id,
+            user_phone=customer_phone,
+            driver_id=driver_id,
+            driver_name=driver_name,
+            customer_name=customer_name,
+        )
         publish_to_rabbitmq("delivery.order.delivered", message)
 
         # Return success response
@@ -300,6 +254,8 @@ def deliver_order():
 #         }), 500
 
 if __name__ == '__main__':
+    # Relay events a previous run left in the outbox
+    start_outbox_relay()
     port = int(os.environ.get("PORT", 5015))
     print(f"Starting driver status service on port {port}...")
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
@@ -1,23 +1,18 @@
-import json
 import time
 import requests
+from common import http_client
+from common.lookups import CONTACT_FIELDS, get_users
+from common.amqp_publisher import publish_to_rabbitmq, start_outbox_relay
+from common.events import ReallocationNotice
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import pika
 import os
 from dotenv import load_dotenv
 from datetime import datetime
 
 load_dotenv()
 
-# RabbitMQ configuration
-RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", "localhost")
-RABBITMQ_PORT = int(os.environ.get("RABBITMQ_PORT", 5672))
-RABBITMQ_EXCHANGE = "notification_topic"
-RABBITMQ_EXCHANGE_TYPE = "topic"
-
 # Service URLs
-USER_SERVICE_URL = os.environ.get("USER_SERVICE_URL", "http://user-service:5000")
 RESERVATION_SERVICE_URL = os.environ.get("RESERVATION_SERVICE_URL", "http://reservation-service:5000")
 ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://order-service:5000")
 
@@ -30,44 +25,10 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "service": "reallocate-reservation-service",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "upstreams": http_client.latency_stats.snapshot()
     }), 200
     
-# Publish message to RabbitMQ
-def publish_to_rabbitmq(routing_key, message):
-    """Publish a message to RabbitMQ"""
-    try:
-        # Connect to RabbitMQ
-        connection = pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=RABBITMQ_HOST,
-                port=RABBITMQ_PORT
-            )
-        )
-        channel = connection.channel()
-        
-        # Ensure exchange exists
-        channel.exchange_declare(
-            exchange=RABBITMQ_EXCHANGE,
-            exchange_type=RABBITMQ_EXCHANGE_TYPE,
-            durable=True
-        )
-        
-        # Publish message
-        channel.basic_publish(
-            exchange=RABBITMQ_EXCHANGE,
-            routing_key=routing_key,
-            body=json.dumps(message)
-        )
-        
-        # Close connection
-        connection.close()
-        print(f"Published message to {routing_key}: {json.dumps(message)}")
-        return True
-    except Exception as e:
-        print(f"Error publishing to RabbitMQ: {e}")
-        return False
-
 @app.route('/api/reallocate', methods=['POST'])
 def reallocate_reservation():
     try:
@@ -83,14 +44,14 @@ def reallocate_reservation():
         # Call OutSystems waitlist service to get the next user in the waitlist
         try:
             print("Calling OutSystems Waitlist API to get next user...")
-            waitlist_response = requests.get(f"https://qks.outsystemscloud.com/Waitlist_Service/rest/waitlist/Get_nextUser?restaurant_id={restaurant_id}")
+            waitlist_response = http_client.get(f"https://qks.outsystemscloud.com/Waitlist_Service/rest/waitlist/Get_nextUser?restaurant_id={restaurant_id}")
             waitlist_response.raise_for_status()
             waitlist_data = waitlist_response.json()
             user_id = waitlist_data.get("user_id")
             
             if not user_id or user_id=="0":
                 try: 
-                    delete_response = requests.delete(f"{RESERVATION_SERVICE_URL}/api/reservations/delete/{reservation_id}")
+                    delete_response = http_client.delete(f"{RESERVATION_SERVICE_URL}/api/reservations/delete/{reservation_id}")
                     delete_response.raise_for_status()
                     print(f"Reservation {reservation_id} successfully deleted.")
                 except requests.exceptions.RequestException as e:
@@ -107,15 +68,12 @@ def reallocate_reservation():
         # Get user details from user service by submitting user_id
         try:
             print(f"Getting user details for user ID: {user_id}")
-            user_response = requests.get(f"{USER_SERVICE_URL}/api/user/{user_id}")
-            user_response.raise_for_status()
-            user_data = user_response.json()
+            user_details = get_users([user_id], CONTACT_FIELDS).get(user_id)
             
-            if user_data.get("code") != 200:
-                print(f"Error getting user data: {user_data}")
+            if not user_details:
+                print(f"User {user_id} not found")
                 return jsonify({"error": "Failed to get user details"}), 500
                 
-            user_details = user_data.get("data", {})
             user_name = user_details.get("customer_name", "Customer")
             user_phone = user_details.get("phone_number", "")
             
@@ -135,7 +93,7 @@ def reallocate_reservation():
             # Get the most recent order for this user
             try:
                 print(f"Getting orders for user ID: {user_id}")
-                orders_response = requests.get(f"{ORDER_SERVICE_URL}/api/orders/user/{user_id}")
+                orders_response = http_client.get(f"{ORDER_SERVICE_URL}/api/orders/user/{user_id}")
                 orders_response.raise_for_status()
                 orders_data = orders_response.json()
                 
@@ -175,7 +133,7 @@ def reallocate_reservation():
             if price:
                 reservation_update_data["price"] = price
             
-            reservation_response = requests.patch(
+            reservation_response = http_client.patch(
                 f"{RESERVATION_SERVICE_URL}/api/reservations/reallocate/{reservation_id}", 
                 json=reservation_update_data
             )
@@ -195,13 +153,12 @@ def reallocate_reservation():
         # Queue notification message to RabbitMQ
         try:
             print(f"Sending reallocation notice to user: {user_name}")
-            notification_data = {
-                "user_id": user_id,
-                "user_name": user_name,
-                "user_phone": user_phone,
-                "table_no": table_no,
-                "message_type": "reallocation.notice"
-            }
+            notification_data = ReallocationNotice(
+                user_id=user_id,
+                user_name=user_name,
+                user_phone=user_phone,
+                table_no=table_no,
+            )
             
             publish_to_rabbitmq("reallocation.notice", notification_data)
         
@@ -221,6 +178,8 @@ def reallocate_reservation():
         return jsonify({"error": f"Reallocation failed: {str(e)}"}), 500
 
 if __name__ == '__main__':
+    # Relay events a previous run left in the outbox
+    start_outbox_relay()
     port = int(os.environ.get('PORT', 5009))
     print(f"Starting reallocate_reservation service on port {port}...")
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,180 @@
+from flask import Flask, request, jsonify
+from flask_cors import CORS
+import os
+import requests
+from dotenv import load_dotenv
+from datetime import datetime
+from ledger import CapacityLedger
+
+load_dotenv()
+
+app = Flask(__name__)
+
+CORS(app, resources={r"/*": {"origins": "*"}})
+
+RESTAURANT_SERVICE_URL = os.environ.get("RESTAURANT_SERVICE_URL", "http://restaurant-service:5000")
+
+# Bookings are counted per restaurant per slot of this many minutes; one booking takes one unit
+CAPACITY_SLOT_MINUTES = int(os.getenv('CAPACITY_SLOT_MINUTES', 60))
+CAPACITY_HOLD_TTL = float(os.getenv('CAPACITY_HOLD_TTL', 30))  # seconds an uncommitted hold lasts
+CAPACITY_RETAIN_HOURS = float(os.getenv('CAPACITY_RETAIN_HOURS', 24))  # keep past slots this long
+
+http = requests.Session()
+
+@app.route("/api/capacity/health", methods=['GET'])
+def health_check():
+    return jsonify({
+        "status": "healthy",
+        "service": "capacity-ledger-service",
+        "timestamp": datetime.now().isoformat()
+    }), 200
+
+def seed_slot(restaurant_id, start, end):
+    # Capacity and the 'Booked' reservations already in the slot, for a slot the ledger has not seen yet
+    response = http.post(
+        f"{RESTAURANT_SERVICE_URL}/api/restaurants/batch",
+        json={"ids": [restaurant_id], "fields": ["capacity"]},
+        timeout=5
+    )
+    response.raise_for_status()
+    restaurant = response.json().get("data", {}).get("restaurants", {}).get(str(restaurant_id))
+    if not restaurant:
+        raise LookupError(f"Restaurant {restaurant_id} not found")
+
+    response = http.get(
+        f"{RESTAURANT_SERVICE_URL}/api/restaurants/{restaurant_id}/reservations/count",
+        params={"status": "Booked", "since": start.isoformat(), "until": end.isoformat()},
+        timeout=5
+    )
+    response.raise_for_status()
+    committed = response.json().get("data", {}).get("count", 0)
+    print(f"Seeded capacity slot {restaurant_id} @ {start.isoformat()}: capacity {restaurant.get('capacity')}, booked {committed}")
+    return restaurant.get("capacity") or 0, committed
+
+ledger = CapacityLedger(
+    seed_slot,
+    slot_minutes=CAPACITY_SLOT_MINUTES,
+    hold_ttl=CAPACITY_HOLD_TTL,
+    retain_hours=CAPACITY_RETAIN_HOURS,
+)
+
+def read_units(data):
+    # Seats a request holds, commits or releases; negative or zero counts would corrupt the slot
+    units = int(data.get("units", 1))
+    if units < 1:
+        raise ValueError("units must be at least 1")
+    return units
+
+def ledger_error(e):
+    # Maps errors raised while reading a request or seeding a slot to a response
+    if isinstance(e, (KeyError, TypeError, ValueError)):
+        return jsonify({
+            "code": 400,
+            "message": f"Invalid request: {str(e)}"
+        }), 400
+    if isinstance(e, LookupError):
+        return jsonify({
+            "code": 404,
+            "message": str(e)
+        }), 404
+    if isinstance(e, requests.exceptions.RequestException):
+        return jsonify({
+            "code": 502,
+            "message": f"Failed to load restaurant capacity: {str(e)}"
+        }), 502
+    return jsonify({
+        "code": 500,
+        "message": f"An error occurred: {str(e)}"
+    }), 500
+
+# Hold seats in the slot of a booking time; 409 if the slot has no room left
+# Body: {"restaurant_id", "time", "units" (default 1), "capacity" (optional, the restaurant's current capacity), "ttl" (optional)}
+@app.route("/api/capacity/hold", methods=['POST'])
+def hold_seats():
+    try:
+        data = request.get_json() or {}
+        capacity = data.get("capacity")
+        hold, slot = ledger.hold(
+            int(data["restaurant_id"]),
+            data["time"],
+            units=read_units(data),
+            capacity=int(capacity) if capacity is not None else None,
+            ttl=float(data["ttl"]) if data.get("ttl") is not None else None,
+        )
+        if hold is None:
+            return jsonify({
+                "code": 409,
+                "message": "No seats left in this slot.",
+                "data": {"slot": slot}
+            }), 409
+        return jsonify({
+            "code": 201,
+            "data": dict(hold, slot=slot)
+        }), 201
+    except Exception as e:
+        return ledger_error(e)
+
+# Commit a hold: {"hold_id"}. Seats booked without a hold (e.g. an accepted reallocation) are committed
+# with {"restaurant_id", "time", "units"}; with both, the seats are committed directly if the hold expired.
+@app.route("/api/capacity/commit", methods=['POST'])
+def commit_seats():
+    try:
+        data = request.get_json() or {}
+        hold_id = data.get("hold_id")
+        if hold_id:
+            slot = ledger.commit(hold_id)
+            if slot is not None:
+                return jsonify({"code": 200, "data": {"slot": slot, "expired": False}})
+            if not data.get("restaurant_id"):
+                return jsonify({
+                    "code": 404,
+                    "message": "Hold not found or expired."
+                }), 404
+        slot = ledger.adjust(int(data["restaurant_id"]), data["time"], read_units(data))
+        return jsonify({"code": 200, "data": {"slot": slot, "expired": bool(hold_id)}})
+    except Exception as e:
+        return ledger_error(e)
+
+# Release a hold that will not be committed: {"hold_id"}, or return committed seats of a cancelled
+# booking: {"restaurant_id", "time", "units"}
+@app.route("/api/capacity/release", methods=['POST'])
+def release_seats():
+    try:
+        data = request.get_json() or {}
+        hold_id = data.get("hold_id")
+        if hold_id:
+            slot = ledger.release(hold_id)
+            if slot is None:
+                return jsonify({
+                    "code": 404,
+                    "message": "Hold not found or expired."
+                }), 404
+            return jsonify({"code": 200, "data": {"slot": slot}})
+        slot = ledger.adjust(int(data["restaurant_id"]), data["time"], -read_units(data))
+        return jsonify({"code": 200, "data": {"slot": slot}})
+    except Exception as e:
+        return ledger_error(e)
+
+# Seats of the slot that ?time= falls in
+@app.route("/api/capacity/<int:restaurant_id>", methods=['GET'])
+def get_slot(restaurant_id):
+    try:
+        return jsonify({"code": 200, "data": {"slot": ledger.status(restaurant_id, request.args["time"])}})
+    except Exception as e:
+        return ledger_error(e)
+
+# Drop the slot that ?time= falls in, so it is re-seeded from the database on next use
+@app.route("/api/capacity/<int:restaurant_id>", methods=['DELETE'])
+def resync_slot(restaurant_id):
+    try:
+        forgotten = ledger.forget(restaurant_id, request.args["time"])
+        return jsonify({"code": 200, "data": {"forgotten": forgotten}})
+    except Exception as e:
+        return ledger_error(e)
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 5016))
+    print(f"Starting capacity ledger service on port {port}...")
+    # Counters live in this process (seeded from the database on first use): a single process (no
+    # reloader) and a single replica
+    app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False)
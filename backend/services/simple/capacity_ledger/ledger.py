@@ -0,0 +1,199 @@
+import threading
+import time
+import uuid
+from datetime import timedelta, timezone
+
+from common.capacity_slots import slot_bounds
+
+
+class Slot:
+    """Seats of one restaurant in one time slot: capacity, committed bookings and unexpired holds."""
+    __slots__ = ("restaurant_id", "start", "end", "capacity", "committed", "holds")
+
+    def __init__(self, restaurant_id, start, end, capacity, committed=0, holds=None):
+        self.restaurant_id = restaurant_id
+        self.start = start
+        self.end = end
+        self.capacity = capacity
+        self.committed = committed
+        self.holds = holds or {}  # hold_id -> [units, expires_at]
+
+    def held(self):
+        return sum(units for units, _ in self.holds.values())
+
+    def available(self):
+        return max(0, self.capacity - self.committed - self.held())
+
+    def expire_holds(self, now):
+        expired = [hold_id for hold_id, (_, expires_at) in self.holds.items() if expires_at <= now]
+        for hold_id in expired:
+            del self.holds[hold_id]
+        return expired
+
+    def to_dict(self):
+        return {
+            "restaurant_id": self.restaurant_id,
+            "slot_start": self.start.isoformat(),
+            "slot_end": self.end.isoformat(),
+            "capacity": self.capacity,
+            "committed": self.committed,
+            "held": self.held(),
+            "available": self.available(),
+        }
+
+
+class CapacityLedger:
+    """
+    Seat counters per (restaurant, time slot), kept in memory only.
+
+    hold() reserves seats for a short TTL only while committed + held seats stay within capacity, and
+    commit() turns a hold into a booking; both run under one lock, so concurrent bookings can never
+    oversubscribe a slot. Holds that are never committed or released simply expire.
+    The first time a slot is touched, seed(restaurant_id, start, end) returns its capacity and the seats
+    already booked in the database; the call runs outside the lock. The database stays the source of
+    truth: after a restart every slot is simply seeded again, and forget() re-seeds a slot on demand.
+    """
+
+    def __init__(self, seed, slot_minutes=60, hold_ttl=30, retain_hours=24):
+        self.seed = seed
+        self.slot_minutes = slot_minutes
+        self.hold_ttl = hold_ttl
+        self.retain = timedelta(hours=retain_hours)
+
+        self._slots = {}  # (restaurant_id, slot start isoformat) -> Slot
+        self._hold_slots = {}  # hold_id -> slot key
+        self._lock = threading.Lock()
+        self._seed_locks = {}  # slot key -> lock held while that slot is seeded
+
+    def slot_bounds(self, booking_time):
+        return slot_bounds(booking_time, self.slot_minutes)
+
+    def _slot(self, restaurant_id, booking_time):
+        # Returns (key, slot, seeded), seeding the slot first if the ledger has not seen it yet;
+        # seeded is True when this call loaded the slot's counts from the database
+        start, end = self.slot_bounds(booking_time)
+        key = (restaurant_id, start.isoformat())
+        with self._lock:
+            slot = self._slots.get(key)
+        if slot is not None:
+            return key, slot, False
+
+        # One seed per slot: concurrent first bookings wait for it instead of all querying the database
+        with self._lock:
+            seed_lock = self._seed_locks.setdefault(key, threading.Lock())
+        with seed_lock:
+            with self._lock:
+                slot = self._slots.get(key)
+            seeded = slot is None
+            if seeded:
+                capacity, committed = self.seed(restaurant_id, start, end)
+                with self._lock:
+                    self._prune()
+                    slot = self._slots.setdefault(key, Slot(restaurant_id, start, end, capacity, committed))
+        with self._lock:
+            self._seed_locks.pop(key, None)
+        return key, slot, seeded
+
+    def _expire(self, slot, now):
+        # Caller holds the lock
+        for hold_id in slot.expire_holds(now):
+            self._hold_slots.pop(hold_id, None)
+
+    def hold(self, restaurant_id, booking_time, units=1, capacity=None, ttl=None):
+        """Hold units seats. Returns (hold, slot info); hold is None when the slot is full."""
+        if units < 1:
+            raise ValueError("units must be at least 1")
+        if capacity is not None and capacity < 0:
+            raise ValueError("capacity cannot be negative")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        key, slot, _ = self._slot(restaurant_id, booking_time)
+        now = time.time()
+        with self._lock:
+            self._expire(slot, now)
+            if capacity is not None:
+                slot.capacity = capacity  # callers pass the restaurant's current capacity
+            if slot.available() < units:
+                return None, slot.to_dict()
+            hold_id = uuid.uuid4().hex
+            expires_at = now + (ttl if ttl is not None else self.hold_ttl)
+            slot.holds[hold_id] = [units, expires_at]
+            self._hold_slots[hold_id] = key
+            return {"hold_id": hold_id, "units": units, "expires_at": expires_at}, slot.to_dict()
+
+    def commit(self, hold_id):
+        """Turn a hold into committed seats. Returns the slot info, or None if the hold is unknown or expired."""
+        now = time.time()
+        with self._lock:
+            slot = self._held_slot(hold_id, now)
+            if slot is None:
+                return None
+            units, _ = slot.holds.pop(hold_id)
+            del self._hold_slots[hold_id]
+            slot.committed += units
+            return slot.to_dict()
+
+    def release(self, hold_id):
+        """Drop a hold before it expires. Returns the slot info, or None if the hold is unknown or expired."""
+        now = time.time()
+        with self._lock:
+            slot = self._held_slot(hold_id, now)
+            if slot is None:
+                return None
+            slot.holds.pop(hold_id)
+            del self._hold_slots[hold_id]
+            return slot.to_dict()
+
+    def _held_slot(self, hold_id, now):
+        # Caller holds the lock
+        key = self._hold_slots.get(hold_id)
+        if key is None:
+            return None
+        slot = self._slots.get(key)
+        if slot is None:
+            self._hold_slots.pop(hold_id)
+            return None
+        self._expire(slot, now)
+        return slot if hold_id in slot.holds else None
+
+    def adjust(self, restaurant_id, booking_time, units):
+        """
+        Add (or, with negative units, return) committed seats that were booked or cancelled without a hold.
+        Callers adjust after writing the reservation, so a slot seeded by this call already counts the change
+        and is left as seeded.
+        """
+        if not units:
+            raise ValueError("units cannot be 0")
+        _, slot, seeded = self._slot(restaurant_id, booking_time)
+        with self._lock:
+            if seeded:
+                return slot.to_dict()
+            slot.committed = max(0, slot.committed + units)
+            return slot.to_dict()
+
+    def status(self, restaurant_id, booking_time):
+        _, slot, _ = self._slot(restaurant_id, booking_time)
+        with self._lock:
+            self._expire(slot, time.time())
+            return slot.to_dict()
+
+    def forget(self, restaurant_id, booking_time):
+        """Drop a slot so the next call re-seeds it from the database."""
+        start, _ = self.slot_bounds(booking_time)
+        with self._lock:
+            slot = self._slots.pop((restaurant_id, start.isoformat()), None)
+            if slot is None:
+                return False
+            for hold_id in slot.holds:
+                self._hold_slots.pop(hold_id, None)
+            return True
+
+    def _prune(self):
+        # Caller holds the lock; drops slots that ended more than retain ago
+        now = time.time()
+        for key, slot in list(self._slots.items()):
+            self._expire(slot, now)
+            end = slot.end.replace(tzinfo=timezone.utc).timestamp()
+            if end < now - self.retain.total_seconds():
+                for hold_id in self._slots.pop(key).holds:
+                    self._hold_slots.pop(hold_id, None)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+Backfill and check the stored latitude/longitude of restaurants and customer profiles.
+
+Usage (inside the geo-service container):
+    python backfill_coordinates.py                    # geocode every missing or stale row
+    python backfill_coordinates.py --check            # only report missing / stale rows
+    python backfill_coordinates.py --table restaurant --batch-size 20
+"""
+
+import argparse
+from geo import COORDINATE_TABLES, is_stale, store_coordinates, supabase
+
+PAGE_SIZE = 1000
+
+
+def fetch_rows(table):
+    # Page through the whole table, only pulling the columns the check needs
+    key_column, address_column = COORDINATE_TABLES[table]
+    columns = f"{key_column},{address_column},latitude,longitude,geocoded_address"
+    start = 0
+    while True:
+        response = supabase.table(table).select(columns).order(key_column).range(start, start + PAGE_SIZE - 1).execute()
+        rows = response.data or []
+        yield from rows
+        if len(rows) < PAGE_SIZE:
+            break
+        start += PAGE_SIZE
+
+
+def check(table):
+    key_column, address_column = COORDINATE_TABLES[table]
+    total = 0
+    missing = []
+    stale = []
+    for row in fetch_rows(table):
+        total += 1
+        if row.get("latitude") is None or row.get("longitude") is None:
+            missing.append(row[key_column])
+        elif is_stale(row, address_column):
+            stale.append(row[key_column])
+
+    print(f"{table}: {total} rows, {len(missing)} missing coordinates, {len(stale)} stale coordinates")
+    for row_id in missing:
+        print(f"  missing  {row_id}")
+    for row_id in stale:
+        print(f"  stale    {row_id}")
+    return missing + stale
+
+
+def backfill(table, batch_size, force=False):
+    key_column, address_column = COORDINATE_TABLES[table]
+    rows = [row for row in fetch_rows(table) if force or is_stale(row, address_column)]
+    print(f"{table}: {len(rows)} rows to geocode")
+
+    stored = 0
+    failed = []
+    # One row at a time: remote lookups all wait on the same 1 request/s Nominatim token bucket, so
+    # running them concurrently would not finish any sooner. Progress is reported once per batch
+    for start in range(0, len(rows), batch_size):
+        for row in rows[start:start + batch_size]:
+            if store_coordinates(table, row[key_column], row.get(address_column)):
+                stored += 1
+            else:
+                failed.append(row[key_column])
+        print(f"{table}: {min(start + batch_size, len(rows))}/{len(rows)} processed")
+
+    print(f"{table}: stored {stored}, failed {len(failed)}")
+    for row_id in failed:
+        print(f"  failed   {row_id}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill stored coordinates for restaurants and customers.")
+    parser.add_argument("--table", choices=list(COORDINATE_TABLES), action="append",
+                        help="Table to process (repeatable, defaults to all)")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--check", action="store_true", help="Only report missing and stale rows")
+    parser.add_argument("--force", action="store_true", help="Re-geocode every row, not just missing or stale ones")
+    args = parser.parse_args()
+
+    tables = args.table or list(COORDINATE_TABLES)
+    problems = 0
+    for table in tables:
+        if args.check:
+            problems += len(check(table))
+        else:
+            problems += len(backfill(table, args.batch_size, args.force))
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark: scalar calculate_distance loop vs vectorised haversine_many.
+Usage: python bench_distance.py [n ...]   (defaults to 10k and 1M points)
+"""
+
+import sys
+import time
+import numpy as np
+from distance import calculate_distance, haversine_many, haversine_matrix
+
+# Driver somewhere in Hougang, restaurants spread over Singapore's bounding box
+DRIVER_LAT, DRIVER_LON = 1.3614, 103.8875
+LAT_RANGE = (1.22, 1.47)
+LON_RANGE = (103.60, 104.05)
+
+
+def random_points(n, seed=42):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(*LAT_RANGE, n), rng.uniform(*LON_RANGE, n)])
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench(n):
+    points = random_points(n)
+    # The endpoint used to receive coordinates as strings, so the scalar baseline parses them too
+    as_strings = [(f"{lat}", f"{lon}") for lat, lon in points]
+
+    scalar_time, scalar = timed(
+        lambda: [calculate_distance(DRIVER_LAT, DRIVER_LON, lat, lon) for lat, lon in as_strings],
+        repeat=1 if n > 100_000 else 3
+    )
+    vector_time, vector = timed(lambda: haversine_many(DRIVER_LAT, DRIVER_LON, points))
+    mask_time, _ = timed(lambda: vector[vector <= 5.0])
+
+    max_error = float(np.max(np.abs(np.asarray(scalar) - vector)))
+    print(f"n={n:>9,}  scalar loop {scalar_time * 1000:10.1f} ms   "
+          f"numpy {vector_time * 1000:8.2f} ms   radius mask {mask_time * 1000:6.2f} ms   "
+          f"speedup {scalar_time / vector_time:6.1f}x   max |diff| {max_error:.2e} km")
+
+
+def bench_matrix(drivers=100, restaurants=10_000):
+    origins = random_points(drivers, seed=1)
+    destinations = random_points(restaurants, seed=2)
+    matrix_time, _ = timed(lambda: haversine_matrix(origins, destinations))
+    print(f"matrix {drivers} drivers x {restaurants:,} restaurants: {matrix_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 1_000_000]
+    for n in sizes:
+        bench(n)
+    bench_matrix()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""
+Build gazetteer_sg.csv, the offline geocoder's index of Singapore postal codes and street names, from
+OpenStreetMap data (© OpenStreetMap contributors, ODbL) fetched through the Overpass API.
+
+Two kinds of rows are written:
+  - every address in Singapore tagged with addr:postcode and addr:street:
+    postal_code, "<housenumber> <street>", latitude, longitude
+  - with --streets (the default), every named road: "", "<road name>", latitude, longitude of one segment,
+    so lookups by street name alone still resolve offline
+Rows of the existing file are kept (they win over downloaded rows with the same postal code or street),
+so the addresses seeded in supabase.sql always resolve.
+
+Usage (needs network access; run it once and commit or mount the result, GAZETTEER_PATH in geo.py):
+    python build_gazetteer.py                           # rewrite gazetteer_sg.csv in place
+    python build_gazetteer.py --output /app/data/gazetteer_sg.csv --no-streets
+    python build_gazetteer.py --overpass-url https://overpass.kumi.systems/api/interpreter
+"""
+
+import argparse
+import csv
+import os
+import re
+import requests
+
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer_sg.csv")
+FIELDS = ["postal_code", "street", "latitude", "longitude"]
+POSTAL_CODE = re.compile(r"^\d{6}$")
+
+ADDRESS_QUERY = """
+[out:json][timeout:600];
+area["ISO3166-1"="SG"][admin_level=2]->.sg;
+nwr["addr:postcode"]["addr:street"](area.sg);
+out center tags;
+"""
+
+STREET_QUERY = """
+[out:json][timeout:600];
+area["ISO3166-1"="SG"][admin_level=2]->.sg;
+way["highway"]["name"](area.sg);
+out center tags;
+"""
+
+
+def overpass(url, query):
+    response = requests.post(url, data={"data": query}, headers={"User-Agent": "FeastFinder/1.0 gazetteer build"}, timeout=900)
+    response.raise_for_status()
+    return response.json().get("elements", [])
+
+
+def position(element):
+    # Nodes carry lat/lon themselves; ways and relations carry the center Overpass computed
+    if "lat" in element:
+        return element["lat"], element["lon"]
+    center = element.get("center")
+    if center:
+        return center["lat"], center["lon"]
+    return None
+
+
+def address_rows(elements):
+    for element in elements:
+        tags = element.get("tags", {})
+        postal_code = tags.get("addr:postcode", "").strip()
+        point = position(element)
+        if not POSTAL_CODE.match(postal_code) or point is None:
+            continue
+        street = " ".join(part for part in (tags.get("addr:housenumber", "").strip(), tags["addr:street"].strip()) if part)
+        yield {"postal_code": postal_code, "street": street, "latitude": point[0], "longitude": point[1]}
+
+
+def street_rows(elements):
+    for element in elements:
+        point = position(element)
+        if point is None:
+            continue
+        yield {"postal_code": "", "street": element["tags"]["name"].strip(), "latitude": point[0], "longitude": point[1]}
+
+
+def read_existing(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def merge(*sources):
+    # First row wins per postal code and per street; earlier sources take precedence
+    rows, postal_codes, streets = [], set(), set()
+    for source in sources:
+        for row in source:
+            postal_code = (row.get("postal_code") or "").strip()
+            street = (row.get("street") or "").strip().lower()
+            if (postal_code and postal_code in postal_codes) or (not postal_code and street in streets):
+                continue
+            if postal_code:
+                postal_codes.add(postal_code)
+            if street:
+                streets.add(street)
+            rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--overpass-url", default=OVERPASS_URL)
+    parser.add_argument("--no-streets", dest="streets", action="store_false", help="only addresses with a postal code")
+    args = parser.parse_args()
+
+    existing = read_existing(args.output)
+    print(f"Fetching Singapore addresses from {args.overpass_url}...")
+    addresses = list(address_rows(overpass(args.overpass_url, ADDRESS_QUERY)))
+    print(f"  {len(addresses)} addresses with a postal code")
+    streets = []
+    if args.streets:
+        print("Fetching Singapore street names...")
+        streets = list(street_rows(overpass(args.overpass_url, STREET_QUERY)))
+        print(f"  {len(streets)} named road segments")
+
+    rows = merge(existing, addresses, streets)
+    tmp_path = f"{args.output}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, args.output)
+    print(f"Wrote {len(rows)} gazetteer entries to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+from math import radians, sin, cos, sqrt, atan2
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0  # Earth radius in kilometers
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    #Calculate the distance between two GPS coordinates using the Haversine formula.
+    #Returns the distance in kilometers.
+    lat1, lon1, lat2, lon2 = map(radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+
+def to_points(coordinates):
+    """Convert "lat,lon" strings (or (lat, lon) pairs) into an N x 2 float array."""
+    rows = [c.split(",") if isinstance(c, str) else c for c in coordinates]
+    return np.asarray(rows, dtype=np.float64).reshape(-1, 2)
+
+
+def haversine_many(lat, lon, points):
+    """
+    Distances in km from one point to every row of an N x 2 (lat, lon) array, in a single NumPy pass.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    lat1, lon1 = np.radians(float(lat)), np.radians(float(lon))
+    lat2 = np.radians(points[:, 0])
+    lon2 = np.radians(points[:, 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(origins, destinations):
+    """
+    Many-to-many distances in km. Returns an M x N array where [i, j] is origins[i] -> destinations[j].
+    """
+    origins = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+    destinations = np.radians(np.asarray(destinations, dtype=np.float64).reshape(-1, 2))
+    lat1 = origins[:, 0][:, np.newaxis]
+    lon1 = origins[:, 1][:, np.newaxis]
+    lat2 = destinations[:, 0][np.newaxis, :]
+    lon2 = destinations[:, 1][np.newaxis, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def within_radius(lat, lon, points, max_distance_km):
+    """Return (distances, mask) where mask marks the rows within max_distance_km."""
+    distances = haversine_many(lat, lon, points)
+    return distances, distances <= max_distance_km
@@ -1,12 +1,18 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 from supabase import create_client
-from math import radians, sin, cos, sqrt, atan2
-import requests
+import json
 import time
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from geocode_cache import GeocodeCache, MISS, normalize_address
+from distance import calculate_distance, haversine_matrix, to_points, within_radius
+from spatial_index import SpatialIndex
+from common.rate_limit import TokenBucket
+from geocoders import CachingGeocoder, ChainGeocoder, GazetteerGeocoder, NominatimGeocoder
 
 load_dotenv()
 
@@ -27,85 +33,590 @@ def health_check():
         "timestamp": datetime.now().isoformat()
     }), 200
     
+# Geocode cache shared by every request (in-memory LRU backed by SQLite on disk)
+geocode_cache = GeocodeCache()
+
+# Nominatim allows 1 request per second; every lookup (from any thread) takes a token from this bucket
+NOMINATIM_RATE = float(os.getenv('NOMINATIM_RATE', 1.0))
+NOMINATIM_BURST = int(os.getenv('NOMINATIM_BURST', 1))
+nominatim_bucket = TokenBucket(NOMINATIM_RATE, NOMINATIM_BURST)
+
+# Thread pool that resolves uncached addresses concurrently
+GEOCODE_WORKERS = int(os.getenv('GEOCODE_WORKERS', 4))
+geocode_executor = ThreadPoolExecutor(max_workers=GEOCODE_WORKERS)
+
+# Geocoder backends: "chain" (local gazetteer, remote Nominatim only on a miss),
+# "gazetteer" (offline only, e.g. for load tests) or "nominatim" (remote only)
+GEOCODER_BACKEND = os.getenv('GEOCODER_BACKEND', 'chain')
+# The repo's gazetteer_sg.csv only covers the seeded addresses; build_gazetteer.py fills it with every
+# Singapore postal code and street name in OpenStreetMap (run it once, with network access)
+GAZETTEER_PATH = os.getenv('GAZETTEER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer_sg.csv'))
+
+def create_geocoder(backend):
+    remote = CachingGeocoder(NominatimGeocoder(nominatim_bucket), geocode_cache)
+    if backend == 'nominatim':
+        return remote
+    local = GazetteerGeocoder(GAZETTEER_PATH)
+    if backend == 'gazetteer':
+        return local
+    return ChainGeocoder(local, remote)
+
+geocoder = create_geocoder(GEOCODER_BACKEND)
+
 # Geocoding function
 def geocode_address(address):
 
-    #Converts an address into a coordinate string "(latitude,longitude)" using OpenStreetMap Nominatim API.
+    #Converts an address into a coordinate string "(latitude,longitude)" using the configured geocoder.
+    #Remote results (including failed lookups) are cached, so repeated addresses never hit the network.
     #:param address: The address to geocode (e.g., "123 Test St").
     #:return: A string in the format "(latitude,longitude)", or None if geocoding fails.
-    
-    # Hardcoded coordinates for common addresses in Singapore if API fails. (fallback)
-    hardcoded_locations = {
-        "30 Victoria St": "1.29548985,103.8520116901307",
-        "973 Upper Serangoon Rd": "1.3738,103.8783",
-        "313 Orchard Road": "1.3010188,103.83850574470645",
-        "145 Syed Alwi Road": "1.3101174,103.8553229",
-        "Tampines Central 5": "1.3531766,103.9449275",
-    }
-    
-    # Restrict results to Singapore only (this stupid thing is having seizures every time ffs)
+    if not address:
+        return None
+
+    coordinates = geocoder.geocode(address)
+    if coordinates:
+        print(f"Coordinates for {address}: {coordinates}")
+    else:
+        # No silent fallback location: a wrong point would corrupt every distance computed from it
+        print(f"Geocoding failed for address: {address}")
+    return coordinates
+
+def geocode_many(addresses):
+    #Geocode a batch of addresses, yielding (address, coordinates) as each one resolves.
+    #Addresses are deduplicated up front, cached ones are yielded straight away and the rest
+    #are resolved concurrently, sharing the Nominatim token bucket.
+    groups = {}  # normalised address -> every raw spelling of it in the batch
+    for address in addresses:
+        if address:
+            groups.setdefault(normalize_address(address), []).append(address)
+
+    pending = {}
+    for spellings in groups.values():
+        address = spellings[0]
+        if geocoder.peek(address) is not MISS:
+            coordinates = geocode_address(address)
+            for spelling in dict.fromkeys(spellings):
+                yield spelling, coordinates
+        else:
+            pending[geocode_executor.submit(geocode_address, address)] = spellings
+
+    for future in as_completed(pending):
+        coordinates = future.result()
+        for spelling in dict.fromkeys(pending[future]):
+            yield spelling, coordinates
+
+@app.route("/api/geo/geocode", methods=['POST'])
+def geocode_batch():
+    #Geocode many addresses at once, streaming one NDJSON line per address as it resolves.
+    #Body: {"addresses": ["313 Orchard Road", ...]}
+    data = request.get_json() or {}
+    addresses = data.get("addresses")
+    if not isinstance(addresses, list) or not addresses:
+        return jsonify({"code": 400, "message": "Missing addresses."}), 400
+
+    def generate():
+        for address, coordinates in geocode_many(addresses):
+            yield json.dumps({"address": address, "coordinates": coordinates}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+def resolve_location(location):
+    #Turn a "latitude,longitude" string (or, failing that, an address) into a (lat, lon) float pair.
+    #:return: (lat, lon), or None if the location cannot be resolved.
     try:
-        print(f"Geocoding address: {address}")
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            "q": address,
-            "format": "json",
-            "limit": 1,
-            "countrycodes": "sg"  
-        }
-        headers = {
-            "User-Agent": "FeastFinder/1.0 (your-delivery@example.com)"
-        }
-        response = requests.get(url, params=params, headers=headers)
-        data = response.json()
-
-        if data:
-            lat = float(data[0]["lat"])
-            lon = float(data[0]["lon"])
-            coordinates = f"{lat},{lon}"
-            print(f"Coordinates for {address}: {coordinates}")
-            return coordinates
+        # Attempt to split into latitude and longitude
+        lat, lon = location.split(",")
+        return float(lat), float(lon)
+    except (ValueError, AttributeError):
+        # If not in "latitude,longitude" format, assume it's an address and geocode it
+        print(f"Location is not in coordinates format. Geocoding address: {location}")
+        geocoded_location = geocode_address(location)
+        if not geocoded_location:
+            return None
+        lat, lon = geocoded_location.split(",")
+        return float(lat), float(lon)
+
+# Tables that store precomputed coordinates: table -> (primary key column, address column)
+COORDINATE_TABLES = {
+    "restaurant": ("restaurant_id", "address"),
+    "customer_profiles": ("id", "street_address"),
+}
+GEO_COORDINATE_SYNC_SECONDS = int(os.getenv('GEO_COORDINATE_SYNC_SECONDS', 60))
+GEO_COORDINATE_SYNC_BATCH = int(os.getenv('GEO_COORDINATE_SYNC_BATCH', 50))
+# Rows whose address could not be geocoded are retried after this long instead of on every cycle
+GEO_COORDINATE_RETRY_HOURS = float(os.getenv('GEO_COORDINATE_RETRY_HOURS', 24))
+
+def stored_coordinates(row):
+    #"latitude,longitude" from a row's stored latitude/longitude columns, or None if not geocoded yet.
+    if row.get("latitude") is None or row.get("longitude") is None:
+        return None
+    return f"{row['latitude']},{row['longitude']}"
+
+def is_stale(row, address_column):
+    #A row is stale if it was never geocoded or its address changed since it was geocoded.
+    return (
+        stored_coordinates(row) is None
+        or normalize_address(row.get("geocoded_address")) != normalize_address(row.get(address_column))
+    )
+
+def store_coordinates(table, row_id, address):
+    #Geocode an address and write the result into the row's latitude/longitude columns.
+    #A failed lookup only records geocoded_at (coordinates stay null), so the sync retries the row
+    #after GEO_COORDINATE_RETRY_HOURS instead of on every cycle.
+    #:return: The coordinate string written, or None if the address could not be geocoded.
+    key_column, _ = COORDINATE_TABLES[table]
+    coordinates = geocode_address(address) if address else None
+    if not coordinates:
+        print(f"Could not geocode {table} {row_id}: {address}")
+        supabase.table(table).update({
+            "geocoded_address": address,
+            "geocoded_at": datetime.now().isoformat()
+        }).eq(key_column, row_id).execute()
+        return None
+
+    lat, lon = coordinates.split(",")
+    supabase.table(table).update({
+        "latitude": float(lat),
+        "longitude": float(lon),
+        "geocoded_address": address,
+        "geocoded_at": datetime.now().isoformat()
+    }).eq(key_column, row_id).execute()
+    return coordinates
+
+def geocode_missing_coordinates(table, limit=GEO_COORDINATE_SYNC_BATCH):
+    #Geocoding stage for new and changed rows: the database trigger clears latitude/longitude and
+    #geocoded_at whenever the address is written, so rows with neither are the ones to (re)geocode.
+    #Rows that failed before come after them, and only once GEO_COORDINATE_RETRY_HOURS have passed,
+    #so a batch of ungeocodable addresses cannot starve newer rows.
+    key_column, address_column = COORDINATE_TABLES[table]
+    columns = f"{key_column},{address_column}"
+    rows = supabase.table(table).select(columns)\
+        .is_("latitude", "null")\
+        .is_("geocoded_at", "null")\
+        .order(key_column)\
+        .limit(limit)\
+        .execute().data or []
+    if len(rows) < limit:
+        retry_before = (datetime.now() - timedelta(hours=GEO_COORDINATE_RETRY_HOURS)).isoformat()
+        rows += supabase.table(table).select(columns)\
+            .is_("latitude", "null")\
+            .lt("geocoded_at", retry_before)\
+            .order("geocoded_at")\
+            .limit(limit - len(rows))\
+            .execute().data or []
+    stored = 0
+    for row in rows:
+        if store_coordinates(table, row[key_column], row.get(address_column)):
+            stored += 1
+    return stored
+
+def run_coordinate_sync():
+    while True:
+        for table in COORDINATE_TABLES:
+            try:
+                stored = geocode_missing_coordinates(table)
+                if stored:
+                    print(f"Stored coordinates for {stored} {table} rows")
+            except Exception as e:
+                print(f"Error geocoding {table} rows: {str(e)}")
+        time.sleep(GEO_COORDINATE_SYNC_SECONDS)
+
+@app.route("/api/geo/coordinates/<string:table>/<string:row_id>", methods=['POST'])
+def refresh_coordinates(table, row_id):
+    #Geocode one restaurant or customer profile right after it was created or changed.
+    #:param table: "restaurant" or "customer_profiles"
+    try:
+        if table not in COORDINATE_TABLES:
+            return jsonify({"code": 400, "message": f"Unsupported table: {table}"}), 400
+        key_column, address_column = COORDINATE_TABLES[table]
+
+        response = supabase.table(table).select(f"{key_column},{address_column}").eq(key_column, row_id).execute()
+        if not response.data:
+            return jsonify({"code": 404, "message": f"No {table} row found with ID: {row_id}"}), 404
+
+        coordinates = store_coordinates(table, row_id, response.data[0].get(address_column))
+        if not coordinates:
+            return jsonify({"code": 422, "message": "Address could not be geocoded."}), 422
+        return jsonify({"code": 200, "data": {"id": row_id, "coordinates": coordinates}}), 200
+    except Exception as e:
+        print(f"Error refreshing coordinates for {table} {row_id}: {str(e)}")
+        return jsonify({"code": 500, "message": f"An error occurred: {str(e)}"}), 500
+
+# Spatial index of restaurant coordinates, built at startup from the restaurant table
+restaurant_index = SpatialIndex()
+GEO_INDEX_REFRESH_SECONDS = int(os.getenv('GEO_INDEX_REFRESH_SECONDS', 300))
+
+def index_restaurant(restaurant_id, name, address, coordinates=None):
+    #Add or move a restaurant in the spatial index. Geocodes only when the address changed.
+    #:return: True if the index changed, False otherwise.
+    if restaurant_id is None:
+        return False
+    indexed = restaurant_index.get(restaurant_id)
+    if indexed and indexed[2].get("address") == address and coordinates in (None, indexed[2].get("coordinates")):
+        if indexed[2].get("name") != name:
+            restaurant_index.upsert(restaurant_id, indexed[0], indexed[1], dict(indexed[2], name=name))
+        return False
+
+    coordinates = coordinates or geocode_address(address)
+    if not coordinates:
+        print(f"Could not index restaurant {restaurant_id}: no coordinates for {address}")
+        return False
+    lat, lon = coordinates.split(",")
+    restaurant_index.upsert(restaurant_id, lat, lon, {"name": name, "address": address, "coordinates": coordinates})
+    return True
+
+def sync_restaurant_index():
+    #Bring the spatial index in line with the restaurant table.
+    #Stored coordinates are used when present; otherwise only new or changed addresses are geocoded.
+    #Deleted restaurants are dropped.
+    response = supabase.table('restaurant').select('restaurant_id,name,address,latitude,longitude').execute()
+    rows = response.data or []
+
+    changed = 0
+    for row in rows:
+        if index_restaurant(row.get("restaurant_id"), row.get("name"), row.get("address"), stored_coordinates(row)):
+            changed += 1
+
+    current_ids = {row.get("restaurant_id") for row in rows}
+    removed = 0
+    for restaurant_id in restaurant_index.ids():
+        if restaurant_id not in current_ids:
+            restaurant_index.remove(restaurant_id)
+            removed += 1
+
+    print(f"Restaurant index synced: {len(restaurant_index)} indexed, {changed} updated, {removed} removed")
+    return {"indexed": len(restaurant_index), "updated": changed, "removed": removed}
+
+def run_restaurant_index_sync():
+    # Build the index once at startup, then pick up restaurant changes incrementally
+    while True:
+        try:
+            sync_restaurant_index()
+        except Exception as e:
+            print(f"Error syncing restaurant index: {str(e)}")
+        time.sleep(GEO_INDEX_REFRESH_SECONDS)
+
+def serialize_matches(matches):
+    return [{
+        "restaurant_id": restaurant_id,
+        "name": data.get("name"),
+        "location": data.get("address"),
+        "coordinates": data.get("coordinates"),
+        "distance_km": distance_km
+    } for distance_km, restaurant_id, data in matches]
+
+@app.route("/api/geo/within", methods=['GET'])
+def restaurants_within():
+    #Restaurants within radius_km of a location, nearest first.
+    #Query params: location ("latitude,longitude" or an address), radius_km (default 5)
+    try:
+        location = resolve_location(request.args.get("location"))
+        if not location:
+            return jsonify({"code": 400, "message": "Missing or invalid location."}), 400
+        try:
+            radius_km = float(request.args.get("radius_km", 5.0))
+        except ValueError:
+            return jsonify({"code": 400, "message": "radius_km must be a number."}), 400
+
+        matches = restaurant_index.within(location[0], location[1], radius_km)
+        return jsonify({
+            "code": 200,
+            "data": {
+                "location": f"{location[0]},{location[1]}",
+                "radius_km": radius_km,
+                "restaurants": serialize_matches(matches)
+            }
+        }), 200
+    except Exception as e:
+        print(f"Error querying restaurants within radius: {str(e)}")
+        return jsonify({"code": 500, "message": f"An error occurred: {str(e)}"}), 500
+
+@app.route("/api/geo/nearest", methods=['GET'])
+def restaurants_nearest():
+    #The k restaurants closest to a location, nearest first.
+    #Query params: location ("latitude,longitude" or an address), k (default 5)
+    try:
+        location = resolve_location(request.args.get("location"))
+        if not location:
+            return jsonify({"code": 400, "message": "Missing or invalid location."}), 400
+        try:
+            k = int(request.args.get("k", 5))
+        except ValueError:
+            return jsonify({"code": 400, "message": "k must be an integer."}), 400
+
+        matches = restaurant_index.nearest(location[0], location[1], max(k, 0))
+        return jsonify({
+            "code": 200,
+            "data": {
+                "location": f"{location[0]},{location[1]}",
+                "k": k,
+                "restaurants": serialize_matches(matches)
+            }
+        }), 200
+    except Exception as e:
+        print(f"Error querying nearest restaurants: {str(e)}")
+        return jsonify({"code": 500, "message": f"An error occurred: {str(e)}"}), 500
+
+@app.route("/api/geo/index/restaurants/<int:restaurant_id>", methods=['PUT'])
+def upsert_indexed_restaurant(restaurant_id):
+    #Push a restaurant change into the index without waiting for the next sync.
+    #Body: {"name": ..., "address": ..., "coordinates": "lat,lon" (optional)}
+    try:
+        data = request.get_json() or {}
+        if not data.get("address") and not data.get("coordinates"):
+            return jsonify({"code": 400, "message": "Missing address or coordinates."}), 400
+
+        index_restaurant(restaurant_id, data.get("name"), data.get("address"), data.get("coordinates"))
+        if restaurant_id not in restaurant_index:
+            return jsonify({"code": 400, "message": "Could not geocode restaurant address."}), 400
+        return jsonify({"code": 200, "message": f"Restaurant {restaurant_id} indexed."}), 200
+    except Exception as e:
+        print(f"Error indexing restaurant {restaurant_id}: {str(e)}")
+        return jsonify({"code": 500, "message": f"An error occurred: {str(e)}"}), 500
+
+@app.route("/api/geo/index/restaurants/<int:restaurant_id>", methods=['DELETE'])
+def remove_indexed_restaurant(restaurant_id):
+    if not restaurant_index.remove(restaurant_id):
+        return jsonify({"code": 404, "message": f"Restaurant {restaurant_id} is not indexed."}), 404
+    return jsonify({"code": 200, "message": f"Restaurant {restaurant_id} removed from index."}), 200
+
+@app.route("/api/geo/index/sync", methods=['POST'])
+def sync_index():
+    try:
+        return jsonify({"code": 200, "data": sync_restaurant_index()}), 200
+    except Exception as e:
+        print(f"Error syncing restaurant index: {str(e)}")
+        return jsonify({"code": 500, "message": f"An error occurred: {str(e)}"}), 500
+
+def sync_geospatial_rows(driver_id, nearby_restaurants):
+    #Diff the driver's stored geospatial rows against the nearby orders just computed.
+    #New and changed rows go out in a single upsert keyed on (driver_id, order_id),
+    #rows for orders no longer nearby in a single delete.
+    #:return: Counts of rows added, updated, removed and unchanged.
+    desired = {}
+    for restaurant in nearby_restaurants:
+        # Rounded to the metre so tiny GPS jitter does not rewrite every row
+        distance = str(round(restaurant["distance_km"], 3))
+        for order in restaurant["orders"]:
+            desired[order["order_id"]] = {
+                "driver_id": driver_id,
+                "restaurant_id": restaurant["restaurant_id"],
+                "order_id": order["order_id"],
+                "distance": distance  # Distance from driver to restaurant
+            }
+
+    response = supabase.table("geospatial").select("order_id,restaurant_id,distance").eq("driver_id", driver_id).execute()
+    existing = {row["order_id"]: row for row in response.data or []}
+
+    added = [row for order_id, row in desired.items() if order_id not in existing]
+    updated = [
+        row for order_id, row in desired.items()
+        if order_id in existing and (
+            existing[order_id].get("restaurant_id") != row["restaurant_id"]
+            or existing[order_id].get("distance") != row["distance"]
+        )
+    ]
+    removed = [order_id for order_id in existing if order_id not in desired]
+
+    if added or updated:
+        supabase.table("geospatial").upsert(added + updated, on_conflict="driver_id,order_id").execute()
+    if removed:
+        supabase.table("geospatial").delete().eq("driver_id", driver_id).in_("order_id", removed).execute()
+
+    changes = {
+        "added": len(added),
+        "updated": len(updated),
+        "removed": len(removed),
+        "unchanged": len(desired) - len(added) - len(updated)
+    }
+    print(f"Geospatial rows for driver {driver_id}: {changes}")
+    return changes
+
+def build_nearby_record(restaurant, restaurant_coordinates, restaurant_distance_km, resolved_addresses):
+    #Build the response record for one nearby restaurant, or None if none of its orders can be located.
+    #Customers without stored coordinates are looked up in resolved_addresses (geocoded during this request).
+    filtered_orders = []
+    for order in restaurant.get("orders", []):
+        customer = order.get("customer", {})
+        customer_location = customer.get("location")
+        customer_coordinates = customer.get("coordinates") or resolved_addresses.get(customer_location)
+        if not customer_coordinates:
+            print(f"Skipping customer at {customer_location} due to invalid address.")
+            continue  # Skip customers with invalid addresses
+
+        # Add the order to the filtered list (no distance calculation for customers)
+        filtered_orders.append({
+            "order_id": order.get("order_id"),
+            "item_name": order.get("item_name"),
+            "customer": {
+                "id": customer.get("id"),
+                "name": customer.get("name"),
+                "location": customer_location,
+                "coordinates": customer_coordinates  # Include customer coordinates
+            }
+        })
+
+    # Only restaurants with valid orders are returned
+    if not filtered_orders:
+        return None
+    return {
+        "restaurant_id": restaurant.get("restaurant_id"),
+        "name": restaurant.get("name"),
+        "location": restaurant.get("location"),
+        "coordinates": restaurant_coordinates,  # Include restaurant coordinates
+        "distance_km": restaurant_distance_km,  # Include distance from driver to restaurant
+        "orders": filtered_orders
+    }
+
+def resolve_nearby_restaurants(driver_lat, driver_lon, restaurants, max_distance_km):
+    #Yield (position, record) for every nearby restaurant with orders, as soon as the restaurant and all of
+    #its customers are located. position is the restaurant's index in the input list, so callers that
+    #collect everything can restore the input order.
+    #Restaurants with stored or indexed coordinates come out first; the rest follow as their geocoding finishes.
+
+    # Restaurants already in the spatial index are answered with one radius query instead of a scan
+    indexed_nearby = {
+        restaurant_id: distance_km
+        for distance_km, restaurant_id, _ in restaurant_index.within(driver_lat, driver_lon, max_distance_km)
+    }
+
+    located_restaurants = []  # (position, restaurant, coordinates, distance_km, is_nearby)
+    unindexed_restaurants = []  # (position, restaurant, coordinates)
+    needs_geocoding = {}  # restaurant address -> [(position, restaurant)]
+    for position, restaurant in enumerate(restaurants):
+        name = restaurant.get("name")
+        indexed = restaurant_index.get(restaurant.get("restaurant_id"))
+        if restaurant.get("coordinates"):
+            # Precomputed at write time, no geocoding needed
+            index_restaurant(restaurant.get("restaurant_id"), name, restaurant.get("location"), restaurant["coordinates"])
+            unindexed_restaurants.append((position, restaurant, restaurant["coordinates"]))
+        elif indexed and indexed[2].get("address") == restaurant.get("location"):
+            distance_km = indexed_nearby.get(restaurant.get("restaurant_id"))
+            located_restaurants.append((position, restaurant, indexed[2].get("coordinates"), distance_km, distance_km is not None))
+        elif restaurant.get("location"):
+            # Rows not backfilled yet still have to be geocoded here
+            print(f"No stored coordinates for restaurant {name}, geocoding on the read path")
+            needs_geocoding.setdefault(restaurant.get("location"), []).append((position, restaurant))
         else:
-            print(f"Geocoding failed for address: {address}")
-            
-            # Check if we have hardcoded coordinates for this address
-            if address in hardcoded_locations:
-                print(f"Using hardcoded coordinates for {address}: {hardcoded_locations[address]}")
-                return hardcoded_locations[address]
-            
-            # Final fallback to 30 Victoria St coordinates
-            print(f"Using final fallback (30 Victoria St) coordinates for {address}")
-            return "1.29548985,103.8520116901307"  
-        
+            print(f"Skipping restaurant {name} due to invalid address.")
+
+    # Distances for restaurants with known coordinates are computed in one vectorised pass
+    if unindexed_restaurants:
+        distances, in_range = within_radius(
+            driver_lat, driver_lon,
+            to_points([coordinates for _, _, coordinates in unindexed_restaurants]),
+            max_distance_km
+        )
+        for (position, restaurant, coordinates), distance_km, is_nearby in zip(unindexed_restaurants, distances, in_range):
+            located_restaurants.append((position, restaurant, coordinates, float(distance_km), bool(is_nearby)))
+
+    resolved_addresses = {}  # address -> coordinates, for everything geocoded during this request
+    waiting = {}  # position -> (restaurant, coordinates, distance_km, customer addresses still unresolved)
+    waiting_on = {}  # customer address -> positions of the restaurants waiting for it
+
+    def locate(position, restaurant, coordinates, distance_km):
+        # Returns the record straight away if every customer is located, otherwise parks the restaurant
+        unresolved = {
+            order.get("customer", {}).get("location")
+            for order in restaurant.get("orders", [])
+            if not order.get("customer", {}).get("coordinates")
+            and order.get("customer", {}).get("location")
+            and order.get("customer", {}).get("location") not in resolved_addresses
+        }
+        if not unresolved:
+            return build_nearby_record(restaurant, coordinates, distance_km, resolved_addresses)
+        waiting[position] = (restaurant, coordinates, distance_km, unresolved)
+        for address in unresolved:
+            waiting_on.setdefault(address, []).append(position)
+        return None
+
+    for position, restaurant, coordinates, distance_km, is_nearby in located_restaurants:
+        print(f"Distance to restaurant {restaurant.get('name')}: {distance_km} km")
+        if is_nearby:
+            record = locate(position, restaurant, coordinates, distance_km)
+            if record:
+                yield position, record
+
+    # Restaurant and customer addresses are geocoded together (deduplicated and concurrent).
+    # Customers of restaurants located in one round are geocoded in the next.
+    requested = set()
+    batch = list(needs_geocoding) + list(waiting_on)
+    while batch:
+        requested.update(batch)
+        for address, coordinates in geocode_many(batch):
+            resolved_addresses[address] = coordinates
+
+            for position, restaurant in needs_geocoding.pop(address, []):
+                name = restaurant.get("name")
+                print(f"Geocoded restaurant {name}: {coordinates}")
+                if not coordinates:
+                    print(f"Skipping restaurant {name} due to invalid address.")
+                    continue  # Skip restaurants with invalid addresses
+                index_restaurant(restaurant.get("restaurant_id"), name, address, coordinates)
+                distance_km = calculate_distance(driver_lat, driver_lon, *coordinates.split(","))
+                print(f"Distance to restaurant {name}: {distance_km} km")
+                if distance_km <= max_distance_km:
+                    record = locate(position, restaurant, coordinates, distance_km)
+                    if record:
+                        yield position, record
+
+            for position in waiting_on.pop(address, []):
+                print(f"Geocoded customer at {address}: {coordinates}")
+                restaurant, restaurant_coordinates, distance_km, unresolved = waiting[position]
+                unresolved.discard(address)
+                if not unresolved:
+                    del waiting[position]
+                    record = build_nearby_record(restaurant, restaurant_coordinates, distance_km, resolved_addresses)
+                    if record:
+                        yield position, record
+
+        batch = [address for address in waiting_on if address not in requested]
+
+def sync_nearby_geospatial(driver_id, nearby_restaurants):
+    # Bring the driver's geospatial rows in line with the result (one read, at most one upsert and one delete)
+    try:
+        return sync_geospatial_rows(driver_id, nearby_restaurants)
     except Exception as e:
-        print(f"Error during geocoding: {str(e)}")
-        
-        # Check if we have hardcoded coordinates for this address
-        if address in hardcoded_locations:
-            print(f"Using hardcoded coordinates for {address}: {hardcoded_locations[address]}")
-            return hardcoded_locations[address]
-            
-        # Final fallback to 30 Victoria St coordinates
-        print(f"Using final fallback (30 Victoria St) coordinates for {address}")
-        return "1.29548985,103.8520116901307"  
-    
-def calculate_distance(lat1, lon1, lat2, lon2):
-    #Calculate the distance between two GPS coordinates using the Haversine formula.
-    #Returns the distance in kilometers.
-    R = 6371.0  # Earth radius in kilometers
-    lat1, lon1, lat2, lon2 = map(radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
+        print(f"Error syncing geospatial records for driver {driver_id}: {str(e)}")
+        return None
+
+def stream_nearby_restaurants(driver, records):
+    #NDJSON body for the streaming mode of /api/nearby-restaurants, one event per line:
+    #  {"type": "driver", "data": {...}}           first, so the client can place the driver immediately
+    #  {"type": "restaurant", "data": {...}}       one per nearby restaurant, as soon as it is resolved
+    #  {"type": "summary", "data": {...}}          last, after the geospatial rows are synced
+    #  {"type": "error", "message": "..."}         instead of the summary if processing fails part way
+    yield json.dumps({"type": "driver", "data": driver}) + "\n"
+
+    nearby_restaurants = []
+    try:
+        for _, record in records:
+            nearby_restaurants.append(record)
+            yield json.dumps({"type": "restaurant", "data": record}) + "\n"
+    except Exception as e:
+        print(f"Error streaming nearby restaurants: {str(e)}")
+        yield json.dumps({"type": "error", "message": "An error occurred while processing the request."}) + "\n"
+        return
+
+    geospatial_changes = sync_nearby_geospatial(driver.get("id"), nearby_restaurants)
+    yield json.dumps({
+        "type": "summary",
+        "data": {"restaurants": len(nearby_restaurants), "geospatial": geospatial_changes}
+    }) + "\n"
+
+def wants_stream():
+    # Streaming is opt-in: ?stream=1 or an Accept: application/x-ndjson header
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return True
+    return "application/x-ndjson" in request.headers.get("Accept", "")
 
 @app.route("/api/nearby-restaurants", methods=['POST'])
 def find_nearby_restaurants():
     
     #Find restaurants within a specified radius of the driver's location.
     #Return detailed information about nearby restaurants and orders, including coordinates for all entities.
-    #Store results in Supabase for nearby restaurants and orders (avoiding duplicates based on order_id).
+    #Store results in Supabase for nearby restaurants and orders (diffed against the driver's existing rows).
+    #With ?stream=1 (or Accept: application/x-ndjson) each restaurant is sent as an NDJSON line as soon as it is resolved.
     try:
         # Parse the request data
         request_data = request.get_json()
@@ -124,19 +635,10 @@ def find_nearby_restaurants():
 
         driver_id = driver.get("id")
         live_location = driver.get("location")  # Format: "latitude,longitude"
-        # Check if live_location is already in "latitude,longitude" format
-        try:
-            # Attempt to split into latitude and longitude
-            driver_lat, driver_lon = live_location.split(",")
-            float(driver_lat)  # Ensure it's a valid number
-            float(driver_lon)
-        except (ValueError, AttributeError):
-            # If not in "latitude,longitude" format, assume it's an address and geocode it
-            print(f"Live location is not in coordinates format. Geocoding address: {live_location}")
-            geocoded_location = geocode_address(live_location)
-            if not geocoded_location:
-                return jsonify({"code": 400, "message": "Invalid driver live_location."}), 400
-            driver_lat, driver_lon = geocoded_location.split(",")
+        driver_location = resolve_location(live_location)
+        if not driver_location:
+            return jsonify({"code": 400, "message": "Invalid driver live_location."}), 400
+        driver_lat, driver_lon = driver_location
             
         max_distance_km = 5.0  # Default distance limit
 
@@ -145,89 +647,26 @@ def find_nearby_restaurants():
 
         print(f"Driver location: {driver_lat}, {driver_lon}")
 
-        # Delete existing records for the driver
-        try:
-            supabase.table("geospatial").delete().eq("driver_id", driver_id).execute()
-            print(f"Deleted existing records for driver {driver_id}.")
-        except Exception as e:
-            print(f"Error deleting existing records for driver {driver_id}: {str(e)}")
-            return jsonify({"code": 500, "message": "Failed to clean up old geospatial data."}), 500
-
-        # Process restaurants and filter nearby orders
-        nearby_restaurants = []
-        for restaurant in restaurants:
-            restaurant_id = restaurant.get("restaurant_id")
-            name = restaurant.get("name")
-            location_name = restaurant.get("location")
-            orders = restaurant.get("orders", [])
-
-            # Geocode the restaurant's address
-            restaurant_coordinates = geocode_address(location_name)
-            time.sleep(1)  # Avoid rate limiting
-            print(f"Geocoded restaurant {name}: {restaurant_coordinates}")
-            if not restaurant_coordinates:
-                print(f"Skipping restaurant {name} due to invalid address.")
-                continue  # Skip restaurants with invalid addresses
-
-            restaurant_lat, restaurant_lon = restaurant_coordinates.split(",")
-            restaurant_distance_km = calculate_distance(driver_lat, driver_lon, restaurant_lat, restaurant_lon)
-            print(f"Distance to restaurant {name}: {restaurant_distance_km} km")
-
-            if restaurant_distance_km <= max_distance_km:
-                # Geocode customer addresses and include their coordinates
-                filtered_orders = []
-                for order in orders:
-                    customer = order.get("customer", {})
-                    customer_location = customer.get("location")
-                    customer_coordinates = geocode_address(customer_location)
-                    time.sleep(1)  # Avoid rate limiting
-                    print(f"Geocoded customer at {customer_location}: {customer_coordinates}")
-                    if not customer_coordinates:
-                        print(f"Skipping customer at {customer_location} due to invalid address.")
-                        continue  # Skip customers with invalid addresses
-
-                    # Add the order to the filtered list (no distance calculation for customers)
-                    filtered_orders.append({
-                        "order_id": order.get("order_id"),
-                        "item_name": order.get("item_name"),
-                        "customer": {
-                            "id": customer.get("id"),
-                            "name": customer.get("name"),
-                            "location": customer_location,
-                            "coordinates": customer_coordinates  # Include customer coordinates
-                        }
-                    })
-
-                # Add the restaurant to the nearby list if it has valid orders
-                if filtered_orders:
-                    nearby_restaurants.append({
-                        "restaurant_id": restaurant_id,
-                        "name": name,
-                        "location": location_name,
-                        "coordinates": restaurant_coordinates,  # Include restaurant coordinates
-                        "distance_km": restaurant_distance_km,  # Include distance from driver to restaurant
-                        "orders": filtered_orders
-                    })
-
-                    # Insert the record if it doesn't exist
-                    for order in filtered_orders:
-                        try:
-                            supabase.table("geospatial").insert({
-                                "driver_id": driver_id,
-                                "restaurant_id": restaurant_id,
-                                "order_id": order["order_id"],
-                                "distance": str(restaurant_distance_km)  # Distance from driver to restaurant
-                            }).execute()
-                        except Exception as e:
-                            print(f"Error inserting into Supabase: {str(e)}")
+        records = resolve_nearby_restaurants(driver_lat, driver_lon, restaurants, max_distance_km)
+        if wants_stream():
+            response = Response(stream_with_context(stream_nearby_restaurants(driver, records)), mimetype="application/x-ndjson")
+            response.headers["Cache-Control"] = "no-cache"
+            response.headers["X-Accel-Buffering"] = "no"  # ask proxies not to buffer the chunks
+            return response
 
+        # Non-streaming callers get every restaurant at once, in input order
+        nearby_restaurants = [record for _, record in sorted(records, key=lambda r: r[0])]
         print(f"Nearby restaurants: {nearby_restaurants}")  # Log the final result
+
+        geospatial_changes = sync_nearby_geospatial(driver_id, nearby_restaurants)
+
         # Include the full driver object in the response
         response_data = {
             "code": 200,
             "data": {
                 "driver": driver,  # Include the full driver object from the input
-                "restaurants": nearby_restaurants
+                "restaurants": nearby_restaurants,
+                "geospatial": geospatial_changes
             }
         }
 
@@ -237,6 +676,37 @@ def find_nearby_restaurants():
         print(f"Error finding nearby restaurants: {str(e)}")
         return jsonify({"code": 500, "message": "An error occurred while processing the request."}), 500
     
+@app.route("/api/geo/distance-matrix", methods=['POST'])
+def distance_matrix():
+    """
+    Score several drivers against several restaurants at once.
+    Body: {"origins": ["lat,lon", ...], "destinations": ["lat,lon", ...]}
+    Returns distances[i][j] in km from origins[i] to destinations[j].
+    """
+    try:
+        data = request.get_json() or {}
+        origins = data.get("origins") or []
+        destinations = data.get("destinations") or []
+        if not origins or not destinations:
+            return jsonify({"code": 400, "message": "Missing origins or destinations."}), 400
+
+        try:
+            matrix = haversine_matrix(to_points(origins), to_points(destinations))
+        except ValueError:
+            return jsonify({"code": 400, "message": "Coordinates must be in 'latitude,longitude' format."}), 400
+
+        return jsonify({
+            "code": 200,
+            "data": {
+                "origins": origins,
+                "destinations": destinations,
+                "distances_km": matrix.tolist()
+            }
+        }), 200
+    except Exception as e:
+        print(f"Error computing distance matrix: {str(e)}")
+        return jsonify({"code": 500, "message": f"An error occurred: {str(e)}"}), 500
+
 # delete by id
 @app.route("/api/delete-geospatial/<string:order_id>", methods=['DELETE'])
 def delete_geospatial(order_id):
@@ -275,6 +745,10 @@ def delete_geospatial(order_id):
     
 # Main entry point
 if __name__ == '__main__':
+    # Build the restaurant spatial index in the background and keep it in sync
+    threading.Thread(target=run_restaurant_index_sync, daemon=True).start()
+    # Geocode new and changed restaurant / customer addresses into stored coordinates
+    threading.Thread(target=run_coordinate_sync, daemon=True).start()
     port = int(os.environ.get('PORT', 5013))
     print(f"Starting geo service on port {port}...")
     app.run(host='0.0.0.0', port=port, debug=True)
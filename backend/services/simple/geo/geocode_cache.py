@@ -0,0 +1,101 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinel returned by get() when the address has never been looked up (or expired).
+# A cached failed lookup is returned as None instead.
+MISS = object()
+
+
+def normalize_address(address):
+    """Normalise an address into a cache key: lower case, single spaces, no trailing punctuation."""
+    return re.sub(r"\s+", " ", str(address or "")).strip(" ,.").lower()
+
+
+class GeocodeCache:
+    """
+    Two tier geocode cache.
+    Tier 1 is a bounded in-memory LRU, tier 2 is a SQLite file that survives container restarts.
+    Failed lookups are cached as None with a shorter TTL (negative caching).
+    """
+
+    def __init__(self, path=None, max_size=None, ttl=None, negative_ttl=None):
+        # Defaults come from the environment (TTLs are in seconds)
+        path = path or os.getenv('GEOCODE_CACHE_PATH', '/app/data/geocode_cache.db')
+        self.max_size = max_size or int(os.getenv('GEOCODE_CACHE_SIZE', 2048))
+        self.ttl = ttl or int(os.getenv('GEOCODE_CACHE_TTL', 30 * 24 * 3600))
+        self.negative_ttl = negative_ttl or int(os.getenv('GEOCODE_CACHE_NEGATIVE_TTL', 600))
+        self._memory = OrderedDict()  # key -> (coordinates or None, expires_at)
+        self._lock = threading.Lock()
+        self._db = self._open_db(path)
+
+    def _open_db(self, path):
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS geocode_cache ("
+                " address_key TEXT PRIMARY KEY,"
+                " coordinates TEXT,"
+                " expires_at REAL NOT NULL)"
+            )
+            # Drop anything that expired while the service was down
+            db.execute("DELETE FROM geocode_cache WHERE expires_at < ?", (time.time(),))
+            db.commit()
+            print(f"Geocode cache opened at {path}")
+            return db
+        except Exception as e:
+            # Fall back to memory-only caching rather than failing the service
+            print(f"Error opening geocode cache at {path}, using memory only: {str(e)}")
+            return None
+
+    def get(self, address):
+        """Return cached coordinates, None for a cached failure, or MISS."""
+        key = normalize_address(address)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    return entry[0]
+                del self._memory[key]
+
+            if self._db is None:
+                return MISS
+            row = self._db.execute(
+                "SELECT coordinates, expires_at FROM geocode_cache WHERE address_key = ?", (key,)
+            ).fetchone()
+            if not row or row[1] <= now:
+                return MISS
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def set(self, address, coordinates):
+        """Cache a lookup result. Pass None to record a failed lookup."""
+        key = normalize_address(address)
+        expires_at = time.time() + (self.ttl if coordinates else self.negative_ttl)
+        with self._lock:
+            self._remember(key, coordinates, expires_at)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO geocode_cache (address_key, coordinates, expires_at) VALUES (?, ?, ?)",
+                    (key, coordinates, expires_at)
+                )
+                self._db.commit()
+            except Exception as e:
+                print(f"Error writing geocode cache entry for {address}: {str(e)}")
+
+    def _remember(self, key, coordinates, expires_at):
+        # Caller holds the lock
+        self._memory[key] = (coordinates, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
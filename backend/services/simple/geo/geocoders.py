@@ -0,0 +1,218 @@
+import csv
+import re
+from array import array
+from bisect import bisect_left
+import requests
+from geocode_cache import MISS
+
+# Long forms -> the abbreviation used as the gazetteer key
+STREET_ABBREVIATIONS = {
+    "road": "rd",
+    "street": "st",
+    "avenue": "ave",
+    "drive": "dr",
+    "crescent": "cres",
+    "lane": "ln",
+    "place": "pl",
+    "boulevard": "blvd",
+    "terrace": "ter",
+    "close": "cl",
+    "upper": "upp",
+}
+POSTAL_CODE = re.compile(r"\b(\d{6})\b")
+UNIT_NUMBER = re.compile(r"#\s*\w+\s*-\s*\w+")
+
+
+def normalize_street(address):
+    """Reduce an address to a comparable street key, e.g. '313 Orchard Road, Singapore 238895' -> '313 orchard rd'."""
+    text = UNIT_NUMBER.sub(" ", str(address or "").lower())
+    text = POSTAL_CODE.sub(" ", text)
+    words = re.sub(r"[^a-z0-9]+", " ", text).split()
+    words = [STREET_ABBREVIATIONS.get(word, word) for word in words if word not in ("singapore", "sg", "blk", "block")]
+    return " ".join(words)
+
+
+class Geocoder:
+    """
+    Interface for geocoding backends.
+    geocode() returns "latitude,longitude" or None; peek() answers only if no network call is needed,
+    returning MISS otherwise.
+    """
+    name = "geocoder"
+
+    def geocode(self, address):
+        raise NotImplementedError
+
+    def peek(self, address):
+        return MISS
+
+
+class GazetteerGeocoder(Geocoder):
+    """
+    Offline geocoder backed by a local gazetteer CSV (postal_code, street, latitude, longitude).
+    Lookups try exact match, postal code, normalised street name and finally street-name prefix; a prefix
+    only answers when it names a single place. Build the file with build_gazetteer.py.
+    """
+    name = "gazetteer"
+
+    def __init__(self, path):
+        # Coordinates live in two flat float arrays; every key maps to a row number
+        self._lat = array("d")
+        self._lon = array("d")
+        self._exact = {}
+        self._postal = {}
+        self._streets = {}
+        self._sorted_streets = []
+        self.load(path)
+
+    def __len__(self):
+        return len(self._lat)
+
+    def load(self, path):
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                for record in csv.DictReader(f):
+                    try:
+                        lat, lon = float(record["latitude"]), float(record["longitude"])
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    row = len(self._lat)
+                    self._lat.append(lat)
+                    self._lon.append(lon)
+
+                    street = (record.get("street") or "").strip()
+                    postal_code = (record.get("postal_code") or "").strip()
+                    if street:
+                        self._exact.setdefault(street, row)
+                        self._streets.setdefault(normalize_street(street), row)
+                    if postal_code:
+                        self._postal.setdefault(postal_code.zfill(6), row)
+            self._sorted_streets = sorted(self._streets)
+            print(f"Loaded {len(self._lat)} gazetteer entries from {path}")
+        except FileNotFoundError:
+            print(f"Gazetteer file not found at {path}, offline geocoding disabled")
+
+    def _coordinates(self, row):
+        return f"{self._lat[row]},{self._lon[row]}"
+
+    def geocode(self, address):
+        if not address:
+            return None
+        address = str(address).strip()
+
+        # 1. Exact match on the street as written in the gazetteer
+        row = self._exact.get(address)
+        if row is not None:
+            return self._coordinates(row)
+
+        # 2. Singapore postal codes identify a building on their own
+        postal_code = POSTAL_CODE.search(address)
+        if postal_code and postal_code.group(1) in self._postal:
+            return self._coordinates(self._postal[postal_code.group(1)])
+
+        # 3. Normalised street name ("313 Orchard Road" == "313 orchard rd")
+        key = normalize_street(address)
+        row = self._streets.get(key)
+        if row is not None:
+            return self._coordinates(row)
+
+        # 4. Prefix match on the normalised street name (partial addresses). A single word such as
+        #    "tampines" names an area rather than an address, and a prefix matching several places is
+        #    ambiguous: neither resolves, rather than picking whichever street sorts first
+        if len(key) >= 4 and " " in key:
+            matches = set()
+            i = bisect_left(self._sorted_streets, key)
+            while i < len(self._sorted_streets) and self._sorted_streets[i].startswith(key):
+                matches.add(self._coordinates(self._streets[self._sorted_streets[i]]))
+                if len(matches) > 1:
+                    return None
+                i += 1
+            if matches:
+                return matches.pop()
+        return None
+
+    def peek(self, address):
+        # Never needs the network, so a miss here is a definite answer
+        return self.geocode(address)
+
+
+class NominatimGeocoder(Geocoder):
+    """Remote geocoder using the public OpenStreetMap Nominatim API, rate limited by a shared token bucket."""
+    name = "nominatim"
+    url = "https://nominatim.openstreetmap.org/search"
+
+    def __init__(self, bucket, timeout=10):
+        self.bucket = bucket
+        self.timeout = timeout
+
+    def geocode(self, address):
+        # Raises on transport errors so callers can tell "no match" from "could not ask"
+        self.bucket.acquire()
+        params = {
+            "q": address,
+            "format": "json",
+            "limit": 1,
+            "countrycodes": "sg"  # Restrict results to Singapore only
+        }
+        headers = {
+            "User-Agent": "FeastFinder/1.0 (your-delivery@example.com)"
+        }
+        response = requests.get(self.url, params=params, headers=headers, timeout=self.timeout)
+        data = response.json()
+
+        if not data:
+            return None
+        lat = float(data[0]["lat"])
+        lon = float(data[0]["lon"])
+        return f"{lat},{lon}"
+
+
+class CachingGeocoder(Geocoder):
+    """Wraps a (remote) geocoder with a GeocodeCache, including negative caching of failed lookups."""
+
+    def __init__(self, inner, cache):
+        self.inner = inner
+        self.cache = cache
+        self.name = f"cached-{inner.name}"
+
+    def geocode(self, address):
+        cached = self.cache.get(address)
+        if cached is not MISS:
+            return cached
+
+        try:
+            coordinates = self.inner.geocode(address)
+        except Exception as e:
+            # Transient errors (timeouts, throttling) are not cached so the next request can retry
+            print(f"Error during {self.inner.name} geocoding of {address}: {str(e)}")
+            return None
+
+        self.cache.set(address, coordinates)
+        return coordinates
+
+    def peek(self, address):
+        return self.cache.get(address)
+
+
+class ChainGeocoder(Geocoder):
+    """Tries each geocoder in order (e.g. local gazetteer first, remote provider only on a miss)."""
+
+    def __init__(self, *geocoders):
+        self.geocoders = geocoders
+        self.name = "+".join(g.name for g in geocoders)
+
+    def geocode(self, address):
+        for geocoder in self.geocoders:
+            coordinates = geocoder.geocode(address)
+            if coordinates:
+                return coordinates
+        return None
+
+    def peek(self, address):
+        for geocoder in self.geocoders:
+            coordinates = geocoder.peek(address)
+            if coordinates is MISS:
+                return MISS  # this backend would have to go to the network
+            if coordinates:
+                return coordinates
+        return None  # every backend already knows it has no match
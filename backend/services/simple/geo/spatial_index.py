@@ -0,0 +1,137 @@
+import heapq
+import threading
+from math import cos, floor, radians
+from distance import haversine_many
+
+KM_PER_DEGREE = 111.32  # km per degree of latitude (and of longitude at the equator)
+
+
+class SpatialIndex:
+    """
+    In-memory grid index of points keyed by id.
+    Space is cut into cells of cell_size_deg x cell_size_deg degrees, so radius and
+    k-nearest queries only visit the cells around the query point instead of every point.
+    """
+
+    def __init__(self, cell_size_deg=0.01):
+        self.cell_size = cell_size_deg  # 0.01 deg is roughly 1.1 km in Singapore
+        self._cells = {}   # (row, col) -> set of ids
+        self._points = {}  # id -> (lat, lon, cell, data)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, item_id):
+        return item_id in self._points
+
+    def _cell(self, lat, lon):
+        return floor(lat / self.cell_size), floor(lon / self.cell_size)
+
+    def upsert(self, item_id, lat, lon, data=None):
+        """Insert a point or move an existing one."""
+        lat, lon = float(lat), float(lon)
+        cell = self._cell(lat, lon)
+        with self._lock:
+            self._discard(item_id)
+            self._points[item_id] = (lat, lon, cell, data)
+            self._cells.setdefault(cell, set()).add(item_id)
+
+    def remove(self, item_id):
+        with self._lock:
+            return self._discard(item_id)
+
+    def _discard(self, item_id):
+        # Caller holds the lock
+        existing = self._points.pop(item_id, None)
+        if existing is None:
+            return False
+        members = self._cells.get(existing[2])
+        members.discard(item_id)
+        if not members:
+            del self._cells[existing[2]]
+        return True
+
+    def get(self, item_id):
+        """Return (lat, lon, data) for an id, or None."""
+        with self._lock:
+            entry = self._points.get(item_id)
+        return entry[:2] + (entry[3],) if entry else None
+
+    def ids(self):
+        with self._lock:
+            return list(self._points)
+
+    def _measure(self, lat, lon, ids):
+        # Exact haversine distances for a set of candidate ids: [(distance_km, id, data)]
+        ids = list(ids)
+        if not ids:
+            return []
+        entries = [self._points[i] for i in ids]
+        distances = haversine_many(lat, lon, [(e[0], e[1]) for e in entries])
+        return [(float(d), i, e[3]) for d, i, e in zip(distances, ids, entries)]
+
+    def within(self, lat, lon, radius_km):
+        """All points within radius_km of (lat, lon), nearest first: [(distance_km, id, data)]."""
+        lat, lon = float(lat), float(lon)
+        # Bounding box of the search circle, in cells
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = radius_km / (KM_PER_DEGREE * max(cos(radians(lat)), 0.01))
+        min_row, min_col = self._cell(lat - lat_span, lon - lon_span)
+        max_row, max_col = self._cell(lat + lat_span, lon + lon_span)
+
+        with self._lock:
+            candidates = set()
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    candidates.update(self._cells.get((row, col), ()))
+            matches = [m for m in self._measure(lat, lon, candidates) if m[0] <= radius_km]
+        return sorted(matches, key=lambda m: m[0])
+
+    def nearest(self, lat, lon, k):
+        """
+        The k points closest to (lat, lon), nearest first: [(distance_km, id, data)].
+        Rings of cells are walked outwards from the query point; once they have cost more cell lookups
+        than measuring every point would (e.g. the only remaining point is a far-away outlier), the
+        remaining search is a single brute-force pass over all points.
+        """
+        if k <= 0:
+            return []
+        lat, lon = float(lat), float(lon)
+        centre_row, centre_col = self._cell(lat, lon)
+        # Lower bound (km) on the distance to anything outside the rings visited so far
+        km_per_ring = self.cell_size * KM_PER_DEGREE * min(1.0, max(cos(radians(lat)), 0.01))
+
+        with self._lock:
+            best = []  # max-heap of the k closest so far, stored as (-distance, id, data)
+            seen = 0
+            ring = 0
+            cells_visited = 0
+            max_cells = max(64, 4 * len(self._points))
+            while seen < len(self._points):
+                if cells_visited > max_cells:
+                    return heapq.nsmallest(k, self._measure(lat, lon, self._points), key=lambda m: m[0])
+                # Collect the ids in the square ring at Chebyshev distance `ring` from the centre
+                ring_ids = []
+                for row in range(centre_row - ring, centre_row + ring + 1):
+                    if abs(row - centre_row) == ring:
+                        cols = range(centre_col - ring, centre_col + ring + 1)
+                    else:
+                        cols = (centre_col - ring, centre_col + ring)
+                    for col in cols:
+                        ring_ids.extend(self._cells.get((row, col), ()))
+                seen += len(ring_ids)
+                cells_visited += max(1, 8 * ring)
+
+                for distance, item_id, data in self._measure(lat, lon, ring_ids):
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, item_id, data))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, item_id, data))
+
+                # Anything not visited yet is at least `ring * km_per_ring` away
+                if len(best) == k and -best[0][0] <= ring * km_per_ring:
+                    break
+                ring += 1
+
+        return sorted(((-d, i, data) for d, i, data in best), key=lambda m: m[0])
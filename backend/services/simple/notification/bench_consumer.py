@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+Throughput of the notification consumer: inline processing vs. the DeliveryDispatcher worker pool.
+
+SMS go through the real send path to the offline StubTransport, which takes --sms-latency per send,
+and Supabase writes are stubbed out, so the numbers show how many deliveries per second the consumer
+sustains when every SMS is a slow network call. The broker is simulated in-process: the main thread
+plays the connection thread, handing out deliveries while the channel has prefetch credit left and
+running the acks that workers schedule with add_callback_threadsafe, exactly like
+BlockingConnection.process_data_events would.
+
+Usage (inside the notification container, or from backend/services so that common/ is importable):
+    PYTHONPATH=. python simple/notification/bench_consumer.py --messages 400 --workers 1 4 8 16
+"""
+
+import argparse
+import os
+import queue
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+# Dummy credentials: the Supabase client is created at import time but never used by the benchmark
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "bench.bench")
+os.environ["SMS_TRANSPORT"] = "stub"
+
+import notification  # noqa: E402
+from sms_transport import ConcurrentSender, StubTransport  # noqa: E402
+
+
+class SimulatedConnection:
+    """Stands in for the BlockingConnection and its channel."""
+
+    def __init__(self, prefetch):
+        self.prefetch = prefetch
+        self.unacked = set()
+        self.acked = 0
+        self.is_open = True
+        self._callbacks = queue.Queue()
+
+    def add_callback_threadsafe(self, callback):
+        self._callbacks.put(callback)
+
+    def basic_ack(self, delivery_tag):
+        self.unacked.discard(delivery_tag)
+        self.acked += 1
+
+    def run(self, on_message, messages):
+        body = b'{"message_type": "delivery.order.accepted", "user_phone": "6591234567", "order_id": "bench"}'
+        next_tag = 1
+        while self.acked < messages:
+            # Deliver while the prefetch window allows it
+            while next_tag <= messages and len(self.unacked) < self.prefetch:
+                self.unacked.add(next_tag)
+                method = SimpleNamespace(delivery_tag=next_tag, routing_key="delivery.order.accepted")
+                on_message(self, method, SimpleNamespace(message_id=None, headers=None), body)
+                next_tag += 1
+            # Then wait for acks from the workers, as the I/O loop does
+            try:
+                callback = self._callbacks.get(timeout=1)
+            except queue.Empty:
+                continue
+            callback()
+
+
+def run(workers, prefetch, messages):
+    connection = SimulatedConnection(prefetch)
+    executor = None
+    if workers > 0:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        on_message = notification.DeliveryDispatcher(connection, connection, executor)
+    else:
+        on_message = notification.rabbitmq_callback
+
+    start = time.perf_counter()
+    connection.run(on_message, messages)
+    elapsed = time.perf_counter() - start
+    if executor:
+        executor.shutdown()
+
+    name = f"{workers} workers" if workers else "inline"
+    print(f"{name:>12} (prefetch {prefetch:3d}): {messages / elapsed:8.1f} msg/s   {elapsed:6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the notification consumer against a stub SMS backend.")
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--sms-latency", type=float, default=0.05, help="Seconds per stub SMS send")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="SMS sender in-flight cap")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--prefetch", type=int, help="Default: twice the worker count")
+    args = parser.parse_args()
+
+    stub_path = os.path.join(tempfile.mkdtemp(), "sms_stub.jsonl")
+    notification.sms_sender = ConcurrentSender(StubTransport(stub_path, latency=args.sms_latency), max_in_flight=args.max_in_flight)
+    notification.save_notification_to_db = lambda message, msg_type, status: None
+    notification.logging.disable(notification.logging.CRITICAL)
+
+    run(0, args.prefetch or 1, args.messages)
+    for workers in args.workers:
+        run(workers, args.prefetch or workers * 2, args.messages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+
+
+class Coalescer:
+    """
+    Holds items per key for a fixed window and hands each group to on_flush(key, items) exactly once.
+
+    The window starts with the first item for a key, so no item waits longer than `window` seconds.
+    add(..., flush_now=True) releases a group early (e.g. a terminal state nothing can supersede), and
+    once more than max_held items are waiting the oldest groups are released to make room.
+    """
+
+    def __init__(self, window, on_flush, max_held=100, name="coalescer"):
+        self.window = window
+        self.on_flush = on_flush
+        self.max_held = max_held
+        self.name = name
+
+        self._groups = {}  # key -> [deadline, items]; insertion order is deadline order
+        self._held = 0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def add(self, key, item, flush_now=False):
+        ready = []
+        with self._cond:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = [time.monotonic() + self.window, []]
+                self._cond.notify()
+            group[1].append(item)
+            self._held += 1
+
+            if flush_now:
+                ready.append(self._pop(key))
+            while self._held > self.max_held and self._groups:
+                ready.append(self._pop(next(iter(self._groups))))
+        for key, items in ready:
+            self._flush(key, items)
+
+    def held(self):
+        with self._cond:
+            return self._held
+
+    def _pop(self, key):
+        # Caller holds the lock
+        _, items = self._groups.pop(key)
+        self._held -= len(items)
+        return key, items
+
+    def _flush(self, key, items):
+        try:
+            self.on_flush(key, items)
+        except Exception as e:
+            logging.error(f"{self.name}: flushing {len(items)} items for {key} failed: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                now = time.monotonic()
+                ready = []
+                for key, (deadline, _) in list(self._groups.items()):
+                    if deadline > now:
+                        break
+                    ready.append(self._pop(key))
+                if not ready:
+                    timeout = None
+                    if self._groups:
+                        timeout = next(iter(self._groups.values()))[0] - now
+                    self._cond.wait(timeout)
+                    continue
+            for key, items in ready:
+                self._flush(key, items)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        """Stop the window thread and release every group still held."""
+        with self._cond:
+            self._stopping = True
+            ready = [self._pop(key) for key in list(self._groups)]
+            self._cond.notify()
+        for key, items in ready:
+            self._flush(key, items)
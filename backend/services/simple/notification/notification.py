@@ -1,15 +1,23 @@
 import os
-import json
+import sys
 import threading
 import pika
 import time
 import logging
+import atexit
+import signal
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from dotenv import load_dotenv
-from twilio.rest import Client
 from datetime import datetime
 from supabase import create_client, Client as SupabaseClient
+from write_behind import WriteBehindBuffer
+from sms_transport import create_sender, ThrottledError
+from coalesce import Coalescer
+from common.events import DeliveryStatusEvent, DeliveryOrderConfirmation, decode_event
 
 # Load environment variables
 load_dotenv()
@@ -20,6 +28,68 @@ RABBITMQ_PORT = int(os.environ.get("RABBITMQ_PORT", 5672))
 RABBITMQ_EXCHANGE = "notification_topic"
 RABBITMQ_EXCHANGE_TYPE = "topic"
 
+# Queue -> routing key, as declared by rabbitmq/amqp_setup.py
+QUEUES = {
+    "Order_Confirmation": "order.confirmation",
+    "Reservation_Confirmation": "reservation.confirmation",
+    "Reservation_Cancellation": "reservation.cancellation",
+    "Reallocation_Notice": "reallocation.notice",
+    "Reallocation_Confirmation": "reallocation.confirmation",
+    "Waitlist_Notification": "waitlist.notification",
+    "Delivery_Order_Accepted" : "delivery.order.accepted",
+    "Delivery_Order_Pickedup" : "delivery.order.pickedup",
+    "Delivery_Order_Delivered" : "delivery.order.delivered",
+    "Delivery_Order_Confirmation" : "delivery.order.confirmation"
+}
+
+# Each consumer group gets its own connection, channel, workers and prefetch, so a backlog of bulk
+# notifications never delays delivery updates. NOTIFICATION_CONSUMER_GROUPS picks the groups this process
+# runs, e.g. "delivery" in one container and "booking,bulk" in another
+CONSUMER_GROUPS = {
+    "delivery": ["Delivery_Order_Confirmation", "Delivery_Order_Accepted", "Delivery_Order_Pickedup", "Delivery_Order_Delivered"],
+    "booking": ["Order_Confirmation", "Reservation_Confirmation", "Reservation_Cancellation", "Reallocation_Confirmation"],
+    "bulk": ["Reallocation_Notice", "Waitlist_Notification"],
+}
+NOTIFICATION_CONSUMER_GROUPS = [
+    group.strip() for group in os.environ.get("NOTIFICATION_CONSUMER_GROUPS", ",".join(CONSUMER_GROUPS)).split(",") if group.strip()
+]
+
+# Failed sends are retried through delay queues (see amqp_setup.py): attempt n waits in the tier for
+# NOTIFICATION_RETRY_DELAYS[n - 1] seconds, and a message that still fails after NOTIFICATION_MAX_RETRIES
+# retries goes to the dead-letter queue. While the provider throttles us, sends are deferred to the
+# shortest tier for NOTIFICATION_THROTTLE_COOLDOWN seconds instead of being attempted
+NOTIFICATION_RETRY_DELAYS = [int(delay) for delay in os.environ.get("NOTIFICATION_RETRY_DELAYS", "5,20,80").split(",") if delay.strip()]
+NOTIFICATION_MAX_RETRIES = int(os.environ.get("NOTIFICATION_MAX_RETRIES", len(NOTIFICATION_RETRY_DELAYS)))
+NOTIFICATION_THROTTLE_COOLDOWN = float(os.environ.get("NOTIFICATION_THROTTLE_COOLDOWN", NOTIFICATION_RETRY_DELAYS[0]))
+DEAD_LETTER_EXCHANGE = "notification_dead"
+DEAD_LETTER_QUEUE = "Notification_Dead"
+RETRY_ATTEMPT_HEADER = "x-retry-attempt"
+DEFERRALS_HEADER = "x-deferrals"
+
+# What happens to a delivery once it has been processed
+DONE = "done"  # sent, or nothing to send: ack
+RETRY = "retry"  # the send failed: retry after a delay, or dead-letter
+DEFER = "defer"  # the provider is throttling us: try again later without counting an attempt
+
+# Message ids remembered to drop duplicate deliveries (the publishers' outbox relays at least once)
+NOTIFICATION_DEDUP_SIZE = int(os.environ.get("NOTIFICATION_DEDUP_SIZE", 10000))
+
+# Deliveries are handled by a pool of workers (0 = one at a time on the connection thread). The prefetch
+# limit caps how many unacked messages the broker hands this channel, i.e. the work queued for the pool.
+# These are the defaults for every consumer group; NOTIFICATION_<GROUP>_WORKERS / _PREFETCH override them
+NOTIFICATION_WORKERS = int(os.environ.get("NOTIFICATION_WORKERS", 8))
+NOTIFICATION_PREFETCH = int(os.environ.get("NOTIFICATION_PREFETCH", max(1, NOTIFICATION_WORKERS) * 2))
+
+# Delivery status updates for the same order that arrive within the window are sent as one SMS about the
+# latest state (0 = off, needs the worker pool). Held messages stay unacked, so they get their own prefetch
+NOTIFICATION_COALESCE_WINDOW = float(os.environ.get("NOTIFICATION_COALESCE_WINDOW", 0))  # seconds
+NOTIFICATION_COALESCE_MAX_HELD = int(os.environ.get("NOTIFICATION_COALESCE_MAX_HELD", 100))
+
+# Notification rows are written behind the consumer in bulk inserts; rows that cannot be written are kept on disk
+NOTIFICATION_DB_BATCH_SIZE = int(os.environ.get("NOTIFICATION_DB_BATCH_SIZE", 50))
+NOTIFICATION_DB_FLUSH_INTERVAL = float(os.environ.get("NOTIFICATION_DB_FLUSH_INTERVAL", 1.0))  # seconds
+NOTIFICATION_SPILL_PATH = os.environ.get("NOTIFICATION_SPILL_PATH", "notification_spill.jsonl")
+
 logging.basicConfig(level=logging.INFO)
 
 app = Flask(__name__)
@@ -38,13 +108,8 @@ supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_KEY')
 supabase = create_client(supabase_url, supabase_key)
 
-# Twilio configuration
-TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
-TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
-TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
-
-# Twilio client
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+# SMS sender (Twilio by default, SMS_TRANSPORT=stub for offline runs), shared by all consumer workers
+sms_sender = create_sender()
 
 # Message templates for different event types
 MESSAGE_TEMPLATES = {
@@ -64,7 +129,7 @@ MESSAGE_TEMPLATES = {
     "delivery.order.delivered": "Hello {customer_name}! Your order (ID: {order_id}) has been delivered. Thank you for your purchase and we hope to see you soon!"
 }
 
-# Sends an SMS via Twilio
+# Sends an SMS through the configured transport
 def send_sms(phone, message):
     try:
         # change to string
@@ -80,97 +145,323 @@ def send_sms(phone, message):
         # add back +
         formatted_phone = f"+{digits_only}"
             
-        # send via Twilio
-        sms = client.messages.create(
-            body=message,
-            from_=TWILIO_PHONE_NUMBER,
-            to=formatted_phone
-        )
+        # send via the provider, within its in-flight and rate limits
+        sid = sms_sender.send(formatted_phone, message)
         
-        logging.info(f"SMS sent successfully to {phone} (SID: {sms.sid})")
-        return {"status": "success", "twilio_sid": sms.sid}
+        logging.info(f"SMS sent successfully to {phone} via {sms_sender.name} (SID: {sid})")
+        return {"status": "success", "sid": sid}
+    except ThrottledError as e:
+        logging.warning(f"SMS provider {sms_sender.name} is throttling us: {e}")
+        return {"status": "throttled", "error": str(e)}
     except Exception as e:
         logging.error(f"Failed to send SMS to {phone}: {e}")
         return {"status": "failed", "error": str(e)}
 
+# Bulk insert a batch of notification rows (called by the write-behind buffer)
+def insert_notifications(rows):
+    response = supabase.table('notification').insert(rows).execute()
+    if not response.data:
+        raise RuntimeError("Supabase returned no rows for the notification insert")
+    logging.info(f"Saved {len(response.data)} notifications to Supabase")
+
+notification_buffer = WriteBehindBuffer(
+    insert_notifications,
+    max_rows=NOTIFICATION_DB_BATCH_SIZE,
+    max_delay=NOTIFICATION_DB_FLUSH_INTERVAL,
+    spill_path=NOTIFICATION_SPILL_PATH,
+    name="notification-writer",
+).start()
+atexit.register(notification_buffer.close)
+
 # Save the notification to DB
 def save_notification_to_db(message, msg_type, status):
+    #Specify the data that is to be saved into DB
+    notification_data = {
+        "message": message,
+        "status": status,
+        "type": msg_type,
+    }
+    notification_buffer.add(notification_data)
+
+def retry_attempt(properties):
+    headers = getattr(properties, "headers", None) or {}
+    return int(headers.get(RETRY_ATTEMPT_HEADER, 0))
+
+def delivery_id(properties):
+    """Identifies one delivery attempt: retried copies keep the message_id but not their attempt counters"""
+    message_id = getattr(properties, "message_id", None)
+    if not message_id:
+        return None
+    headers = getattr(properties, "headers", None) or {}
+    return f"{message_id}:{headers.get(RETRY_ATTEMPT_HEADER, 0)}:{headers.get(DEFERRALS_HEADER, 0)}"
+
+provider_throttled_until = 0.0
+
+def throttle_provider(seconds):
+    global provider_throttled_until
+    provider_throttled_until = max(provider_throttled_until, time.monotonic() + seconds)
+
+def provider_throttled():
+    return time.monotonic() < provider_throttled_until
+
+seen_message_ids = OrderedDict()
+seen_message_ids_lock = threading.Lock()
+
+def is_duplicate(message_id):
+    """Return True if message_id was already handled (see remember_delivery)"""
+    if not message_id or NOTIFICATION_DEDUP_SIZE <= 0:
+        return False
+    with seen_message_ids_lock:
+        if message_id in seen_message_ids:
+            seen_message_ids.move_to_end(message_id)
+            return True
+        return False
+
+def remember_delivery(message_id):
+    """
+    Remember a delivery once its DONE outcome has been acked (LRU, NOTIFICATION_DEDUP_SIZE ids). Recording it
+    any earlier would drop the broker's redelivery of a message whose retry or ack was lost with the connection
+    """
+    if not message_id or NOTIFICATION_DEDUP_SIZE <= 0:
+        return
+    with seen_message_ids_lock:
+        seen_message_ids[message_id] = True
+        seen_message_ids.move_to_end(message_id)
+        if len(seen_message_ids) > NOTIFICATION_DEDUP_SIZE:
+            seen_message_ids.popitem(last=False)
+
+# Template placeholders, the event field each one is filled from and the text used when it is empty
+TEMPLATE_FIELDS = {
+    "username": ("user_name", "there"),
+    "reservation_id": ("reservation_id", "N/A"),
+    "order_id": ("order_id", "N/A"),
+    "refund_amount": ("refund_amount", "N/A"),
+    "table_no": ("table_no", "N/A"),
+    "restaurant_name": ("restaurant_name", "The restaurant"),
+    "booking_time": ("booking_time", "N/A"),
+    "driver_name": ("driver_name", "Driver"),
+    "customer_name": ("customer_name", "Customer"),
+}
+
+def template_context(event):
+    context = {"msg_type": event.message_type}
+    for placeholder, (field, default) in TEMPLATE_FIELDS.items():
+        value = getattr(event, field, None)
+        context[placeholder] = default if value is None else value
+
+    # Format booking_time if available
+    booking_time = context["booking_time"]
+    if booking_time != "N/A" and booking_time:
+        try:
+            booking_dt = datetime.fromisoformat(booking_time.replace('Z', '+00:00'))
+            # Format as a readable date/time
+            context["booking_time"] = booking_dt.strftime("%A, %B %d, %Y at %I:%M %p")
+        except Exception as e:
+            logging.warning(f"Could not format booking time: {e}")
+    return context
+
+def process_message(properties, body):
+    """Decode one delivery and send its notification. Returns DONE, RETRY or DEFER; never raises"""
+    message_id = delivery_id(properties)
+    if is_duplicate(message_id):
+        logging.info(f"Skipping duplicate message {message_id}")
+        return DONE
     try:
-        #Specify the data that is to be saved into DB
-        notification_data = {
-            "message": message,
-            "status": status,
-            "type": msg_type,
-        }
-        
-        response = supabase.table('notification').insert(notification_data).execute()
-        
-        if not response.data:
-            logging.error("Failed to save notification to Supabase")
-        else:
-            logging.info(f"Notification saved to Supabase: {response.data[0].get('id')}")
-            
+        logging.info(f"Received message: {body}")
+        event = decode_event(body, getattr(properties, "content_type", None))
     except Exception as e:
-        logging.error(f"Error saving notification to Supabase: {e}")
+        logging.error(f"Could not decode RabbitMQ message: {e}")
+        return DONE  # retrying will not make it readable
+    return send_notification(event, retry_attempt(properties))
 
-def rabbitmq_callback(ch, method, properties, body):
+def send_notification(event, attempt=0):
+    """Send the SMS for one notification event and record it. Returns DONE, RETRY or DEFER; never raises"""
     try:
-        logging.info(f"Received message: {body}")
-        data = json.loads(body)
-        
-        msg_type = data.get("message_type")
-        user_phone = data.get("user_phone")
-        table_no = data.get("table_no", "N/A")
-        username = data.get("user_name", "there")
-        reservation_id = data.get("reservation_id", "N/A")
-        refund_amount = data.get("refund_amount", "N/A")
-        restaurant_name = data.get("restaurant_name", "The restaurant")
-        booking_time = data.get("booking_time", "N/A")
-        order_id= data.get("order_id", "N/A")
-
-        driver_name = data.get("driver_name", "Driver") 
-        customer_name = data.get("customer_name", "Customer") 
-        
-        # Format booking_time if available
-        if booking_time != "N/A" and booking_time:
-            try:
-                booking_dt = datetime.fromisoformat(booking_time.replace('Z', '+00:00'))
-                # Format as a readable date/time
-                booking_time = booking_dt.strftime("%A, %B %d, %Y at %I:%M %p")
-            except Exception as e:
-                logging.warning(f"Could not format booking time: {e}")
+        msg_type = event.message_type
+        user_phone = event.user_phone
 
         if not user_phone or not msg_type:
             logging.warning("Missing required fields in RabbitMQ message")
-            return
+            return DONE
 
         # Format the message based on the event type
         message_template = MESSAGE_TEMPLATES.get(msg_type, "Notification: {msg_type}")
-        formatted_message = message_template.format(
-            username=username,
-            reservation_id=reservation_id,
-            order_id= order_id,
-            refund_amount=refund_amount,
-            table_no=table_no,
-            restaurant_name=restaurant_name,
-            booking_time=booking_time,
-
-            driver_name=driver_name,  
-            customer_name=customer_name,  
-        )
+        formatted_message = message_template.format(**template_context(event))
+
+        if provider_throttled():
+            logging.info(f"Deferring {msg_type} event while the SMS provider is throttling us")
+            return DEFER
 
-        logging.info(f"Processing {msg_type} event...")
+        logging.info(f"Processing {msg_type} event (attempt {attempt + 1})...")
         sms_result = send_sms(user_phone, formatted_message)
 
-        # Save the notification to the database
-        save_notification_to_db(formatted_message, msg_type, sms_result["status"] == "success")
+        if sms_result["status"] == "throttled":
+            throttle_provider(NOTIFICATION_THROTTLE_COOLDOWN)
+            return DEFER
+
+        # Save the notification to the database once its outcome is final
+        final = sms_result["status"] == "success" or attempt >= NOTIFICATION_MAX_RETRIES
+        if final:
+            save_notification_to_db(formatted_message, msg_type, sms_result["status"] == "success")
 
         if sms_result["status"] == "success":
             logging.info(f"Notification sent successfully for {msg_type}")
-        else:
-            logging.error(f"Failed to send notification for {msg_type}: {sms_result.get('error')}")
+            return DONE
+        logging.error(f"Failed to send notification for {msg_type} (attempt {attempt + 1}): {sms_result.get('error')}")
+        return RETRY
     except Exception as e:
         logging.error(f"Error processing RabbitMQ message: {e}")
+        return RETRY
+
+def schedule_retry(channel, routing_key, properties, body, outcome):
+    """Republish a failed or deferred message to its retry tier, or dead-letter it once its retries are used up"""
+    headers = dict(getattr(properties, "headers", None) or {})
+    attempt = retry_attempt(properties)
+    if outcome == DEFER:
+        headers[DEFERRALS_HEADER] = int(headers.get(DEFERRALS_HEADER, 0)) + 1
+        exchange = f"notification_retry_{NOTIFICATION_RETRY_DELAYS[0]}s"
+    else:
+        attempt += 1
+        headers[RETRY_ATTEMPT_HEADER] = attempt
+        if attempt > NOTIFICATION_MAX_RETRIES:
+            exchange = DEAD_LETTER_EXCHANGE
+        else:
+            delay = NOTIFICATION_RETRY_DELAYS[min(attempt, len(NOTIFICATION_RETRY_DELAYS)) - 1]
+            exchange = f"notification_retry_{delay}s"
+
+    channel.basic_publish(
+        exchange=exchange,
+        routing_key=routing_key,
+        body=body,
+        properties=pika.BasicProperties(
+            content_type=getattr(properties, "content_type", None) or "application/json",
+            delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
+            message_id=getattr(properties, "message_id", None),
+            headers=headers,
+        ),
+    )
+    logging.info(f"Moved {routing_key} message to {exchange} ({RETRY_ATTEMPT_HEADER}={attempt})")
+
+def rabbitmq_callback(ch, method, properties, body):
+    # Inline mode: the message is acked only once it has been processed (or moved to a retry queue)
+    outcome = process_message(properties, body)
+    if outcome != DONE:
+        schedule_retry(ch, method.routing_key, properties, body, outcome)
+    ch.basic_ack(delivery_tag=method.delivery_tag)
+    if outcome == DONE:
+        remember_delivery(delivery_id(properties))
+
+# Delivery states in the order they happen; a later state supersedes the earlier ones
+DELIVERY_STATES = [
+    "delivery.order.confirmation",
+    "delivery.order.accepted",
+    "delivery.order.pickedup",
+    "delivery.order.delivered",
+]
+
+def send_coalesced_delivery_update(order_id, held):
+    """
+    Send one SMS for the latest of the held (event, properties, settle) delivery updates, then settle all of
+    them with the outcome. Retried updates come back from the retry tier together and are coalesced again.
+    """
+    outcome = RETRY
+    try:
+        held_in_order = sorted(held, key=lambda item: DELIVERY_STATES.index(item[0].message_type))
+        latest = held_in_order[-1][0]
+        combined = {}
+        for event, _, _ in held_in_order:
+            # the latest state wins, earlier updates fill in missing fields
+            combined.update((name, value) for name, value in event.to_dict().items() if value is not None)
+        combined = type(latest).from_dict(combined)
+        if len(held) > 1:
+            logging.info(f"Coalesced {len(held)} delivery updates for order {order_id} into {latest.message_type}")
+        attempt = max(retry_attempt(properties) for _, properties, _ in held)
+        outcome = send_notification(combined, attempt)
+    finally:
+        for _, _, settle in held:
+            settle(outcome)
+
+class DeliveryDispatcher:
+    """
+    on_message_callback that hands deliveries to a worker pool.
+    pika channels are not thread-safe, so workers never touch the channel: each ack (and retry publish) is
+    scheduled back onto the connection's thread with add_callback_threadsafe and sent from there.
+    With a coalescer, delivery status updates are held per order_id instead and sent as one message.
+    """
+
+    def __init__(self, connection, channel, executor, coalescer=None):
+        self.connection = connection
+        self.channel = channel
+        self.executor = executor
+        self.coalescer = coalescer
+
+    def __call__(self, ch, method, properties, body):
+        if self.coalescer and self._hold(method.delivery_tag, method.routing_key, properties, body):
+            return
+        self.executor.submit(self._work, method.delivery_tag, method.routing_key, properties, body)
+
+    def _hold(self, delivery_tag, routing_key, properties, body):
+        try:
+            event = decode_event(body, getattr(properties, "content_type", None))
+        except Exception:
+            return False  # process_message logs it
+        if not isinstance(event, (DeliveryOrderConfirmation, DeliveryStatusEvent)) or not event.order_id:
+            return False
+
+        settle = functools.partial(self._settle, delivery_tag, routing_key, properties, body)
+        if is_duplicate(delivery_id(properties)):
+            logging.info(f"Skipping duplicate message {properties.message_id}")
+            settle(DONE)
+            return True
+        # Nothing supersedes the final state, so there is no point waiting out the window
+        final = event.message_type == DELIVERY_STATES[-1]
+        self.coalescer.add(str(event.order_id), (event, properties, settle), flush_now=final)
+        return True
+
+    def _work(self, delivery_tag, routing_key, properties, body):
+        outcome = RETRY
+        try:
+            outcome = process_message(properties, body)
+        finally:
+            self._settle(delivery_tag, routing_key, properties, body, outcome)
+
+    def _settle(self, delivery_tag, routing_key, properties, body, outcome):
+        try:
+            self.connection.add_callback_threadsafe(
+                functools.partial(self._settle_on_connection_thread, delivery_tag, routing_key, properties, body, outcome)
+            )
+        except Exception as e:
+            # The connection is gone, so the broker redelivers the message to the next consumer
+            logging.warning(f"Could not ack delivery {delivery_tag}: {e}")
+
+    def _settle_on_connection_thread(self, delivery_tag, routing_key, properties, body, outcome):
+        if not self.channel.is_open:
+            return
+        if outcome != DONE:
+            schedule_retry(self.channel, routing_key, properties, body, outcome)
+        self.channel.basic_ack(delivery_tag=delivery_tag)
+        if outcome == DONE:
+            remember_delivery(delivery_id(properties))
+
+# Retry tiers and the dead-letter queue, as declared by amqp_setup.py
+def declare_retry_topology(channel):
+    for delay in NOTIFICATION_RETRY_DELAYS:
+        retry_exchange = f"notification_retry_{delay}s"
+        retry_queue = f"Notification_Retry_{delay}s"
+        channel.exchange_declare(exchange=retry_exchange, exchange_type="fanout", durable=True)
+        channel.queue_declare(
+            queue=retry_queue,
+            durable=True,
+            arguments={
+                "x-message-ttl": delay * 1000,
+                "x-dead-letter-exchange": RABBITMQ_EXCHANGE,  # back to the original queue via its routing key
+            },
+        )
+        channel.queue_bind(exchange=retry_exchange, queue=retry_queue)
+
+    channel.exchange_declare(exchange=DEAD_LETTER_EXCHANGE, exchange_type="fanout", durable=True)
+    channel.queue_declare(queue=DEAD_LETTER_QUEUE, durable=True)
+    channel.queue_bind(exchange=DEAD_LETTER_EXCHANGE, queue=DEAD_LETTER_QUEUE)
 
 # Connect to RabbitMQ
 def connect_to_rabbitmq():
@@ -192,16 +483,41 @@ def connect_to_rabbitmq():
             exchange_type=RABBITMQ_EXCHANGE_TYPE,
             durable=True
         )
+        declare_retry_topology(channel)
         
         return connection, channel
     except Exception as e:
         logging.error(f"Error connecting to RabbitMQ: {e}")
         return None, None
 
-def start_rabbitmq_consumer():
+def group_setting(group, name, default):
+    return os.environ.get(f"NOTIFICATION_{group.upper()}_{name}", default)
+
+def start_rabbitmq_consumer(group):
+    queue_names = CONSUMER_GROUPS[group]
+    workers = int(group_setting(group, "WORKERS", NOTIFICATION_WORKERS))
+    prefetch = int(group_setting(group, "PREFETCH", NOTIFICATION_PREFETCH))
+
+    # The pool outlives reconnects; work from a dropped channel finishes but its acks are discarded
+    executor = None
+    if workers > 0:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"notification-{group}")
+
+    coalescer = None
+    coalesce_window = float(group_setting(group, "COALESCE_WINDOW", NOTIFICATION_COALESCE_WINDOW))
+    has_delivery_queues = any(QUEUES[queue_name] in DELIVERY_STATES for queue_name in queue_names)
+    if executor and coalesce_window > 0 and has_delivery_queues:
+        coalescer = Coalescer(
+            coalesce_window,
+            lambda order_id, held: executor.submit(send_coalesced_delivery_update, order_id, held),
+            max_held=NOTIFICATION_COALESCE_MAX_HELD,
+            name=f"{group}-coalescer",
+        ).start()
+        prefetch += NOTIFICATION_COALESCE_MAX_HELD
+
     while True:
         try:
-            logging.info("Connecting to RabbitMQ...")
+            logging.info(f"Connecting to RabbitMQ for the {group} consumer group...")
             connection, channel = connect_to_rabbitmq()
             
             if not connection or not channel:
@@ -209,21 +525,16 @@ def start_rabbitmq_consumer():
                 time.sleep(5)
                 continue
 
-            queues = {
-                "Order_Confirmation": "order.confirmation",
-                "Reservation_Confirmation": "reservation.confirmation",
-                "Reservation_Cancellation": "reservation.cancellation",
-                "Reallocation_Notice": "reallocation.notice",
-                "Reallocation_Confirmation": "reallocation.confirmation",
-                "Waitlist_Notification": "waitlist.notification",
-                "Delivery_Order_Accepted" : "delivery.order.accepted",
-                "Delivery_Order_Pickedup" : "delivery.order.pickedup",
-                "Delivery_Order_Delivered" : "delivery.order.delivered",
-                "Delivery_Order_Confirmation" : "delivery.order.confirmation"
-            }
-
-            for queue_name, routing_key in queues.items():
-                logging.info(f"Consuming from queue: {queue_name}")
+            # global_qos applies the limit to the whole channel rather than to each of the queue consumers
+            channel.basic_qos(prefetch_count=prefetch, global_qos=True)
+            if executor:
+                on_message = DeliveryDispatcher(connection, channel, executor, coalescer)
+            else:
+                on_message = rabbitmq_callback
+
+            for queue_name in queue_names:
+                routing_key = QUEUES[queue_name]
+                logging.info(f"Consuming from queue: {queue_name} ({group})")
                 channel.queue_declare(queue=queue_name, durable=True)
                 channel.queue_bind(
                     exchange=RABBITMQ_EXCHANGE,
@@ -232,11 +543,11 @@ def start_rabbitmq_consumer():
                 )
                 channel.basic_consume(
                     queue=queue_name,
-                    on_message_callback=rabbitmq_callback,
-                    auto_ack=True,
+                    on_message_callback=on_message,
+                    auto_ack=False,
                 )
 
-            logging.info("Waiting for messages...")
+            logging.info(f"Waiting for {group} messages (workers: {workers}, prefetch: {prefetch}, coalesce window: {coalesce_window if coalescer else 0}s)...")
             channel.start_consuming()
         except pika.exceptions.ConnectionClosedByBroker:
             logging.warning("Connection closed by broker. Reconnecting...")
@@ -250,7 +561,13 @@ def start_rabbitmq_consumer():
             time.sleep(5)
 
 if __name__ == '__main__':
-    # Start RabbitMQ consumer in a separate thread
-    threading.Thread(target=start_rabbitmq_consumer, daemon=True).start()
+    # docker stop sends SIGTERM; exit normally so atexit flushes the buffered notification rows
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # Start one RabbitMQ consumer thread per consumer group
+    for group in NOTIFICATION_CONSUMER_GROUPS:
+        if group not in CONSUMER_GROUPS:
+            logging.error(f"Unknown consumer group {group}, expected one of {', '.join(CONSUMER_GROUPS)}")
+            continue
+        threading.Thread(target=start_rabbitmq_consumer, args=(group,), name=f"consumer-{group}", daemon=True).start()
     port = int(os.environ.get('PORT', 5005))
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,141 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from common.rate_limit import TokenBucket
+
+# Messages per second each provider accepts from us (0 = no limit)
+DEFAULT_RATE_LIMITS = {
+    "twilio": 10.0,
+    "stub": 0.0,
+}
+
+
+class ThrottledError(Exception):
+    """The provider is rate limiting us (e.g. HTTP 429); the message should be deferred, not retried now."""
+
+
+class SmsTransport:
+    """
+    Interface for SMS backends.
+    send() delivers one message and returns the provider's message id; it raises if the send failed, with
+    ThrottledError when the provider is throttling us.
+    """
+    name = "sms"
+
+    def send(self, to, body):
+        raise NotImplementedError
+
+
+class TwilioTransport(SmsTransport):
+    name = "twilio"
+
+    def __init__(self, account_sid, auth_token, from_number):
+        # only needed when Twilio is the configured backend
+        from twilio.rest import Client
+        from twilio.base.exceptions import TwilioRestException
+        self.client = Client(account_sid, auth_token)
+        self.from_number = from_number
+        self._rest_exception = TwilioRestException
+
+    def send(self, to, body):
+        try:
+            sms = self.client.messages.create(body=body, from_=self.from_number, to=to)
+        except self._rest_exception as e:
+            if e.status == 429:
+                raise ThrottledError(str(e)) from e
+            raise
+        return sms.sid
+
+
+class StubTransport(SmsTransport):
+    """
+    Offline backend for local runs and load tests: every message is appended to a JSONL file after a
+    simulated provider latency, and configurable fractions of sends fail or are throttled.
+    """
+    name = "stub"
+
+    def __init__(self, path="sms_stub.jsonl", latency=0.0, error_rate=0.0, throttle_rate=0.0):
+        self.path = path
+        self.latency = latency  # seconds per send
+        self.error_rate = error_rate  # 0.0 - 1.0
+        self.throttle_rate = throttle_rate  # 0.0 - 1.0
+        self._lock = threading.Lock()
+
+    def send(self, to, body):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        roll = random.random()
+        if roll < self.throttle_rate:
+            raise ThrottledError("Simulated SMS provider throttling")
+        if roll < self.throttle_rate + self.error_rate:
+            raise RuntimeError("Simulated SMS provider error")
+
+        sid = f"STUB{uuid.uuid4().hex}"
+        record = json.dumps({"sid": sid, "to": to, "body": body, "sent_at": time.time()})
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(record + "\n")
+        return sid
+
+
+class ConcurrentSender:
+    """
+    Sends through a transport with at most max_in_flight requests outstanding and, if rate is set,
+    no more than rate messages per second (a token bucket shared by every caller of this provider).
+    send() blocks the calling thread; submit() runs the send on the sender's own threads.
+    """
+
+    def __init__(self, transport, max_in_flight=10, rate=0.0, burst=1):
+        self.transport = transport
+        self.name = transport.name
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix=f"sms-{transport.name}")
+
+    def send(self, to, body):
+        if self.bucket:
+            self.bucket.acquire()
+        with self._slots:
+            return self.transport.send(to, body)
+
+    def submit(self, to, body):
+        return self._executor.submit(self.send, to, body)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def create_transport(name):
+    if name == "twilio":
+        return TwilioTransport(
+            os.getenv("TWILIO_ACCOUNT_SID"),
+            os.getenv("TWILIO_AUTH_TOKEN"),
+            os.getenv("TWILIO_PHONE_NUMBER"),
+        )
+    if name == "stub":
+        return StubTransport(
+            path=os.getenv("SMS_STUB_PATH", "sms_stub.jsonl"),
+            latency=float(os.getenv("SMS_STUB_LATENCY", 0)),
+            error_rate=float(os.getenv("SMS_STUB_ERROR_RATE", 0)),
+            throttle_rate=float(os.getenv("SMS_STUB_THROTTLE_RATE", 0)),
+        )
+    raise ValueError(f"Unknown SMS transport: {name}")
+
+
+def create_sender():
+    """Build the sender configured by SMS_TRANSPORT (twilio or stub), SMS_MAX_IN_FLIGHT and SMS_RATE_LIMIT_<NAME>."""
+    name = os.getenv("SMS_TRANSPORT", "twilio").lower()
+    transport = create_transport(name)
+    rate = float(os.getenv(f"SMS_RATE_LIMIT_{name.upper()}", DEFAULT_RATE_LIMITS.get(name, 0.0)))
+    burst = float(os.getenv(f"SMS_RATE_BURST_{name.upper()}", max(1.0, rate)))
+    return ConcurrentSender(
+        transport,
+        max_in_flight=int(os.getenv("SMS_MAX_IN_FLIGHT", 10)),
+        rate=rate,
+        burst=burst,
+    )
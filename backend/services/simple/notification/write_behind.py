@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class WriteBehindBuffer:
+    """
+    Collects rows in memory and writes them in bulk from a background thread.
+
+    add() never touches the network: a flush runs when max_rows rows are waiting or the oldest row has
+    waited max_delay seconds, and once more at shutdown. A flush that fails appends its rows to a JSONL
+    spill file; the spilled rows are written again after the next successful flush.
+    """
+
+    def __init__(self, flush_fn, max_rows=50, max_delay=1.0, spill_path=None, name="write-behind"):
+        self.flush_fn = flush_fn  # called with a list of rows, raises on failure
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.spill_path = spill_path
+        self.name = name
+
+        self._rows = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._full = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def add(self, row):
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+            if len(self._rows) >= self.max_rows:
+                self._full.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._rows)
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of rows written (0 if the write failed)."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows, self._oldest = self._rows, [], None
+                self._full.clear()
+            if not rows:
+                return 0
+            try:
+                self.flush_fn(rows)
+            except Exception as e:
+                logging.error(f"{self.name}: bulk write of {len(rows)} rows failed: {e}")
+                self._spill(rows)
+                return 0
+            self._replay_spill()
+            return len(rows)
+
+    def _spill(self, rows):
+        if not self.spill_path:
+            logging.error(f"{self.name}: no spill file configured, dropping {len(rows)} rows")
+            return
+        try:
+            directory = os.path.dirname(self.spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            logging.warning(f"{self.name}: spilled {len(rows)} rows to {self.spill_path}")
+        except OSError as e:
+            logging.error(f"{self.name}: could not spill {len(rows)} rows to {self.spill_path}: {e}")
+
+    def _replay_spill(self):
+        # Runs under _flush_lock, right after a write succeeded
+        if not self.spill_path:
+            return
+        replaying = f"{self.spill_path}.replay"
+        try:
+            # A leftover .replay file means the process died mid-replay; finish that one first
+            if not os.path.exists(replaying):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replaying)
+            with open(replaying, encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            logging.error(f"{self.name}: could not read spill file {self.spill_path}: {e}")
+            return
+
+        for i in range(0, len(rows), self.max_rows):
+            chunk = rows[i:i + self.max_rows]
+            try:
+                self.flush_fn(chunk)
+            except Exception as e:
+                logging.error(f"{self.name}: replay of spilled rows failed: {e}")
+                self._spill(rows[i:])
+                break
+        else:
+            logging.info(f"{self.name}: replayed {len(rows)} spilled rows")
+        os.remove(replaying)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            with self._lock:
+                oldest = self._oldest
+            timeout = self.max_delay if oldest is None else max(0.0, oldest + self.max_delay - time.monotonic())
+            self._full.wait(timeout)
+            with self._lock:
+                due = self._rows and (len(self._rows) >= self.max_rows or time.monotonic() - self._oldest >= self.max_delay)
+            if due:
+                self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        """Stop the background thread and flush what is left; registered with atexit by the service."""
+        self._stopping.set()
+        self._full.set()
+        if self._thread is not None:
+            self._thread.join(5)
+        self.flush()
@@ -174,6 +174,8 @@ def cancel_reservation(reservation_id):
         user_id = reservation.get('user_id')
         payment_id = reservation.get('payment_id')
         order_id = reservation.get('order_id')
+        booking_time = reservation.get('time')
+        previous_status = reservation.get('status')
 
         
         # Prepare update data to clear the reservation
@@ -200,7 +202,9 @@ def cancel_reservation(reservation_id):
             "table_no": table_no,
             "refund_amount": refund_amount,
             "payment_id": payment_id,
-            "order_id": order_id  
+            "order_id": order_id,
+            "time": booking_time,
+            "status": previous_status
 
         }), 200
     
@@ -307,6 +311,7 @@ def reallocate_confirm_booking(reservation_id):
 
         return jsonify({
             "reservation_id": updated_response.data[0].get("reservation_id"),
+            "restaurant_id": updated_response.data[0].get("restaurant_id"),
             "user_id": updated_response.data[0].get("user_id"),
             "table_no": updated_response.data[0].get("table_no"),
             "status": updated_response.data[0].get("status"),
@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
+import re
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from datetime import datetime
@@ -16,6 +17,10 @@ supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_KEY')
 supabase: Client = create_client(supabase_url, supabase_key)
 
+# Batch lookups are split into `in` queries of this many ids to keep the PostgREST URL short
+BATCH_CHUNK_SIZE = int(os.getenv('RESTAURANT_BATCH_CHUNK_SIZE', 200))
+FIELD_NAME = re.compile(r"^[a-z_][a-z0-9_]*$")
+
 @app.route("/api/restaurant/health", methods=['GET'])
 def health_check():
     return jsonify({
@@ -70,6 +75,56 @@ def get_restaurant(restaurant_id):
             "message": f"An error occurred: {str(e)}"
         }), 500
 
+# retrieve many restaurants at once
+# Body: {"ids": [1, 2, 3], "fields": ["name", "address"]}  (fields is optional, default all columns)
+# Returns {"restaurants": {"<id>": {...}}, "missing": [ids that were not found]}
+@app.route("/api/restaurants/batch", methods=['POST'])
+def get_restaurants_batch():
+    try:
+        data = request.get_json() or {}
+        ids = data.get("ids")
+        fields = data.get("fields")
+
+        if not isinstance(ids, list) or not ids:
+            return jsonify({
+                "code": 400,
+                "message": "ids must be a non-empty list."
+            }), 400
+        if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) and FIELD_NAME.match(f) for f in fields)):
+            return jsonify({
+                "code": 400,
+                "message": "fields must be a list of column names."
+            }), 400
+
+        # The id column is always returned so rows can be keyed by it
+        columns = ",".join(dict.fromkeys(["restaurant_id"] + fields)) if fields else "*"
+
+        # Ids that are not integers can never match, and would make the whole query fail
+        unique_ids = []
+        for restaurant_id in dict.fromkeys(str(i) for i in ids):
+            if restaurant_id.isdigit():
+                unique_ids.append(int(restaurant_id))
+
+        restaurants = {}
+        for start in range(0, len(unique_ids), BATCH_CHUNK_SIZE):
+            chunk = unique_ids[start:start + BATCH_CHUNK_SIZE]
+            response = supabase.table('restaurant').select(columns).in_('restaurant_id', chunk).execute()
+            for row in response.data or []:
+                restaurants[str(row["restaurant_id"])] = row
+
+        return jsonify({
+            "code": 200,
+            "data": {
+                "restaurants": restaurants,
+                "missing": [i for i in dict.fromkeys(str(i) for i in ids) if i not in restaurants]
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            "code": 500,
+            "message": f"An error occurred: {str(e)}"
+        }), 500
+
 # filter restaurants by cuisine
 @app.route("/api/restaurants/cuisine/<string:cuisine>", methods=['GET'])
 def get_restaurants_by_cuisine(cuisine):
@@ -121,6 +176,38 @@ def get_restaurants_by_availability(availability):
             "message": f"An error occurred: {str(e)}"
         }), 500
 
+# Count reservations with a status, optionally only those whose time is in [since, until)
+# count='exact' makes PostgREST return the total in Content-Range, so no reservation rows are downloaded
+def count_reservations(restaurant_id, status, since=None, until=None):
+    query = supabase.table('reservation').select('reservation_id', count='exact')\
+        .eq('restaurant_id', restaurant_id)\
+        .eq('status', status)
+    if since:
+        query = query.gte('time', since)
+    if until:
+        query = query.lt('time', until)
+    return query.limit(1).execute().count or 0
+
+# Count a restaurant's reservations (default status 'Booked'); optional ?since=&until= ISO timestamps
+@app.route("/api/restaurants/<int:restaurant_id>/reservations/count", methods=['GET'])
+def get_reservation_count(restaurant_id):
+    try:
+        status = request.args.get('status', 'Booked')
+        count = count_reservations(restaurant_id, status, request.args.get('since'), request.args.get('until'))
+        return jsonify({
+            "code": 200,
+            "data": {
+                "restaurant_id": restaurant_id,
+                "status": status,
+                "count": count
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            "code": 500,
+            "message": f"An error occurred: {str(e)}"
+        }), 500
+
 # Get restaurant capacity and count existing dine-in reservations
 @app.route("/api/restaurants/capacity/<int:restaurant_id>", methods=['GET'])
 def get_restaurant_capacity(restaurant_id):
@@ -138,8 +225,7 @@ def get_restaurant_capacity(restaurant_id):
         restaurant_capacity = restaurant.get("capacity", 0)
         
         # Count existing reservations for this restaurant that have status 'Booked'
-        reservation_response = supabase.table('reservation').select('*').eq('restaurant_id', restaurant_id).eq('status', 'Booked').execute()
-        reservation_count = len(reservation_response.data) if reservation_response.data else 0
+        reservation_count = count_reservations(restaurant_id, 'Booked')
         
         return jsonify({
             "code": 200,
@@ -1,6 +1,8 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
+import re
+import uuid
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from datetime import datetime
@@ -15,6 +17,10 @@ supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_KEY')
 supabase: Client = create_client(supabase_url, supabase_key)
 
+# Batch lookups are split into `in` queries of this many ids to keep the PostgREST URL short
+BATCH_CHUNK_SIZE = int(os.getenv('USER_BATCH_CHUNK_SIZE', 200))
+FIELD_NAME = re.compile(r"^[a-z_][a-z0-9_]*$")
+
 @app.route("/api/user/health", methods=['GET'])
 def health_check():
     return jsonify({
@@ -45,6 +51,59 @@ def get_user(user_id):
             "message": f"An error occurred: {str(e)}"
         }), 500
 
+# Get many users at once
+# Body: {"ids": ["<uuid>", ...], "fields": ["customer_name", "phone_number"]}  (fields is optional, default all columns)
+# Returns {"users": {id: {...}}, "missing": [ids that were not found]}
+@app.route("/api/user/batch", methods=['POST'])
+def get_users_batch():
+    try:
+        data = request.get_json() or {}
+        ids = data.get("ids")
+        fields = data.get("fields")
+
+        if not isinstance(ids, list) or not ids:
+            return jsonify({
+                "code": 400,
+                "message": "ids must be a non-empty list."
+            }), 400
+        if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) and FIELD_NAME.match(f) for f in fields)):
+            return jsonify({
+                "code": 400,
+                "message": "fields must be a list of column names."
+            }), 400
+
+        # The id column is always returned so rows can be keyed by it
+        columns = ",".join(dict.fromkeys(["id"] + fields)) if fields else "*"
+
+        # Ids that are not valid UUIDs can never match, and would make the whole query fail
+        unique_ids = []
+        for user_id in dict.fromkeys(str(i) for i in ids):
+            try:
+                uuid.UUID(user_id)
+                unique_ids.append(user_id)
+            except ValueError:
+                pass
+
+        users = {}
+        for start in range(0, len(unique_ids), BATCH_CHUNK_SIZE):
+            chunk = unique_ids[start:start + BATCH_CHUNK_SIZE]
+            response = supabase.table('customer_profiles').select(columns).in_('id', chunk).execute()
+            for row in response.data or []:
+                users[str(row["id"])] = row
+
+        return jsonify({
+            "code": 200,
+            "data": {
+                "users": users,
+                "missing": [i for i in dict.fromkeys(str(i) for i in ids) if i not in users]
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            "code": 500,
+            "message": f"An error occurred: {str(e)}"
+        }), 500
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     print(f"Starting user service on port {port}...")
@@ -2,6 +2,7 @@ import { createClient } from '@supabase/supabase-js';
 
 const supabaseUrl = import.meta.env.VITE_SUPABASE_URL;
 const supabaseKey = import.meta.env.VITE_SUPABASE_KEY;
+const API_GATEWAY_URL = import.meta.env.VITE_API_GATEWAY_URL || 'http://localhost:8000';
 
 // Create and export the Supabase client
 export const supabase = createClient(supabaseUrl, supabaseKey);
@@ -81,6 +82,13 @@ export const signUp = async (email, password, userData) => {
     throw error;
   }
   
+  // Geocode the new customer's address now rather than on the geo service's next sync pass.
+  // Best effort: if this fails, the sync still picks the profile up
+  if (userData.user_type === 'customer' && data?.user?.id) {
+    fetch(`${API_GATEWAY_URL}/api/geo/coordinates/customer_profiles/${data.user.id}`, { method: 'POST' })
+      .catch(err => console.warn('Could not geocode the new address:', err));
+  }
+  
   return { data, error: null };
 };
 